@@ -0,0 +1,84 @@
+"""
+Keeps headless startup fast: imports the given modules in a fresh interpreter under -X importtime, then fails when
+their total import time exceeds the budget or when a heavy dependency is pulled in.
+
+Usage (from the repository root)::
+
+    python scripts/check-startup.py
+    python scripts/check-startup.py --budget 0.3 --module ichimoku --forbid pandas
+"""
+import argparse
+import logging
+import os
+import subprocess
+import sys
+
+_SCRIPTS_PATH = os.path.dirname(os.path.abspath(__file__))
+_SOURCES_PATH = os.path.sep.join([os.path.dirname(_SCRIPTS_PATH), 'src'])
+_DEFAULT_CHECKS = [('statarb', ['matplotlib', 'pandas', 'requests', 'intradaygoogle', 'ohlcplot']),
+                   ('ichimoku', ['pandas', 'matplotlib'])]
+
+
+def import_times(module):
+    """
+    Imports module in a fresh interpreter.
+
+    :return: list of (module name, nesting level, self microseconds, cumulative microseconds)
+    """
+    environment = dict(os.environ)
+    environment['PYTHONPATH'] = os.pathsep.join([_SOURCES_PATH, _SCRIPTS_PATH])
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import %s' % module],
+                             env=environment, stderr=subprocess.PIPE, stdout=subprocess.DEVNULL, check=True)
+    times = list()
+    for line in process.stderr.decode().splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+
+        self_time, cumulative_time, name = line[len('import time:'):].split('|')
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+        times.append((name.strip(), level, int(self_time), int(cumulative_time)))
+
+    return times
+
+
+def check(module, forbidden, budget):
+    """
+
+    :param module: module imported
+    :param forbidden: modules that must not be imported along
+    :param budget: maximum total import time in seconds
+    :return: list of failures
+    """
+    times = import_times(module)
+    total = sum(cumulative for name, level, self_time, cumulative in times if level == 0) / 1e6
+    imported = set(name for name, level, self_time, cumulative in times)
+    failures = ['%s imports %s' % (module, name) for name in forbidden
+                if name in imported or any(other.startswith(name + '.') for other in imported)]
+    if total > budget:
+        slowest = sorted(times, key=lambda item: -item[2])[:5]
+        failures.append('%s takes %.3fs to import, budget %.3fs, slowest: %s' % (
+            module, total, budget, ', '.join('%s %.3fs' % (name, self_time / 1e6)
+                                             for name, level, self_time, cumulative in slowest)))
+
+    logging.info('%s: %.3fs, %d modules', module, total, len(times))
+    return failures
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s:%(name)s:%(levelname)s:%(message)s')
+    parser = argparse.ArgumentParser(description='Checks the import time of the headless entry points.',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter
+                                     )
+    parser.add_argument('--budget', type=float, default=0.3, help='maximum import time in seconds')
+    parser.add_argument('--module', default=None, help='single module to check instead of the defaults')
+    parser.add_argument('--forbid', action='append', default=[], help='module that must not be imported')
+    args = parser.parse_args()
+    checks = [(args.module, args.forbid)] if args.module else _DEFAULT_CHECKS
+    failures = list()
+    for module, forbidden in checks:
+        failures.extend(check(module, forbidden, args.budget))
+
+    for failure in failures:
+        logging.error(failure)
+
+    sys.exit(1 if failures else 0)
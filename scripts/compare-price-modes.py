@@ -0,0 +1,126 @@
+import argparse
+import importlib.util
+import logging
+import os
+import sys
+import time
+from datetime import datetime
+from decimal import Decimal
+
+import numpy
+
+import backtest
+
+_RESOLUTION = 3
+# mid prices are half ticks
+_PRICE_RESOLUTION = _RESOLUTION + 1
+_LEGACY_START = datetime(2010, 1, 1, 9, 0, 58)
+
+
+def load_generator():
+    path = os.path.sep.join([os.path.dirname(os.path.abspath(__file__)), 'generate-benchmarks.py'])
+    spec = importlib.util.spec_from_file_location('generate_benchmarks', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def legacy_ohlc_minutes(generator, bid, ask):
+    """
+    Reference path: the tick by tick Decimal generator, fake_ohlc_sample(), fed with the given quotes.
+
+    The legacy generator starts on a whole second, drops the quotes of that first second and labels second bars
+    with the time they close: padding quotes fill the dropped second, so that the first given quote opens the last
+    second of a minute and minute bars hold 60 whole second bars, as in the vectorized generator. A final quote
+    opens the second after the last one, flushing its bar.
+
+    :param generator: generate-benchmarks module, see load_generator()
+    :param bid: int64 array of ticks
+    :param ask: int64 array of ticks
+    :return: list of (open, high, low, close) Decimal tuples
+    """
+    quotes = [(Decimal(tick_bid).scaleb(-_RESOLUTION), Decimal(tick_ask).scaleb(-_RESOLUTION))
+              for tick_bid, tick_ask in zip(bid.tolist(), ask.tolist())]
+    quotes = [quotes[0]] * (generator._SAMPLES_PER_SECOND - 1) + quotes + [quotes[-1]]
+    count_seconds = len(bid) // generator._SAMPLES_PER_SECOND
+    return [bar[1:] for bar in generator.fake_ohlc_sample(_LEGACY_START, None, None, None, sample_unit='minute',
+                                                          count_seconds=count_seconds, quotes=quotes)]
+
+
+def decimal_run(samples, entry_bars, target):
+    """
+    Reference path: the row by row Decimal backtest formerly found in statarb.run().
+
+    :return: (target_reached, exit index, profit, drawdown)
+    """
+    px_ref = px_drawdown = None
+    target_reached = False
+    for index, (px_open, px_high, px_low, px_close) in enumerate(samples):
+        if px_ref:
+            px_drawdown = min(px_drawdown, px_low)
+            if px_low > px_ref + target:
+                target_reached = True
+                break
+
+        if index == entry_bars - 1:
+            px_ref = px_drawdown = px_high
+
+    if target_reached:
+        return True, index, px_close - px_ref, px_drawdown - px_ref
+
+    return False, index, px_low - px_ref, px_drawdown - px_ref
+
+
+def compare(count, minutes, seed):
+    generator = load_generator()
+    mu, sigma = generator.sample_drift_volatility(0, 20)
+    ticks_per_minute = 60 * generator._SAMPLES_PER_SECOND
+    master_seed = numpy.random.SeedSequence(seed)
+    decimal_samples = list()
+    tick_samples = list()
+    decimal_duration = tick_duration = 0.
+    for seed_sequence in master_seed.spawn(count):
+        # both paths consume the same draws
+        start = time.perf_counter()
+        half_ticks = generator.fake_ohlc_minutes(numpy.random.default_rng(seed_sequence), 100., 0, 20, minutes)
+        tick_samples.append(generator.half_ticks_as_price(half_ticks))
+        tick_duration += time.perf_counter() - start
+
+        bid, ask = generator.random_walk_ticks(numpy.random.default_rng(seed_sequence), 100., mu, sigma,
+                                               minutes * ticks_per_minute)
+        start = time.perf_counter()
+        decimal_samples.append(legacy_ohlc_minutes(generator, bid, ask))
+        decimal_duration += time.perf_counter() - start
+
+    mismatches = sum(int(numpy.any(numpy.array(decimal_sample, dtype='float64') != tick_sample))
+                     for decimal_sample, tick_sample in zip(decimal_samples, tick_samples))
+    logging.info('generator: %d / %d samples differ, decimal %.3fs, ticks %.3fs (x%.0f)', mismatches, count,
+                 decimal_duration, tick_duration, decimal_duration / tick_duration)
+
+    start = time.perf_counter()
+    expected = [decimal_run(sample, 10, Decimal('0.05')) for sample in decimal_samples]
+    decimal_duration = time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = backtest.run_target_stop(backtest.stack_samples(tick_samples), backtest.buy_high_after(10), 0.05,
+                                       resolution=_PRICE_RESOLUTION)
+    tick_duration = time.perf_counter() - start
+
+    actual = zip(results['target_reached'], results['exit_index'], results['profit'], results['drawdown'])
+    backtest_mismatches = sum(int(tuple(float(value) for value in reference) != tuple(float(value) for value in result))
+                              for reference, result in zip(expected, actual))
+    logging.info('backtest: %d / %d samples differ, decimal %.3fs, ticks %.3fs (x%.0f)', backtest_mismatches, count,
+                 decimal_duration, tick_duration, decimal_duration / tick_duration)
+    return mismatches + backtest_mismatches
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s:%(name)s:%(levelname)s:%(message)s')
+    parser = argparse.ArgumentParser(description='Compares Decimal and float64 tick prices.',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter
+                                     )
+    parser.add_argument('--count', type=int, default=20, help='number of samples')
+    parser.add_argument('--minutes', type=int, default=60, help='minutes per sample')
+    parser.add_argument('--seed', type=int, default=0, help='master seed')
+    args = parser.parse_args()
+    sys.exit(1 if compare(args.count, args.minutes, args.seed) else 0)
@@ -1,17 +1,26 @@
 import os
 import sys
-import tempfile
 from datetime import datetime, timedelta
 import math
 import argparse
+import itertools
 import logging
 import random
+from concurrent.futures import ProcessPoolExecutor
 
 from decimal import Decimal
 
 import numpy
+import pandas
+
+import instrument
+import resample
+from barstore import BarStore
 
 _RESOLUTION = 3
+_SAMPLE_DURATION_MS = 20
+_SAMPLES_PER_SECOND = 1000 // _SAMPLE_DURATION_MS
+_MINUTES_PER_BENCHMARK = 8 * 60
 
 
 def random_walk_next(prev_value, mu, sigma):
@@ -34,33 +43,46 @@ def random_walk(init_value, mu, sigma):
         spread = random.choice([1, 2, 3])
         bid = max(current_value, 0.0)
         ask = bid + spread * math.pow(10, -_RESOLUTION)
-        logging.debug('walker value = %s', current_value)
         yield round(Decimal(bid), _RESOLUTION), round(Decimal(ask), _RESOLUTION)
 
 
-def fake_track_record_msec(init_time, init_value, annual_mu_pct, annual_sigma_pct):
+def sample_drift_volatility(annual_mu_pct, annual_sigma_pct):
     """
+    Scales annual drift and volatility down to a single tick of _SAMPLE_DURATION_MS.
 
-    :param init_time:
-    :param init_value:
     :param annual_mu_pct: annual drift assuming 365 days in year
     :param annual_sigma_pct:
-    :return:
+    :return: (mu, sigma) per tick
     """
     annual_mu = annual_mu_pct / 100
-    sample_duration_ms = 20
-    count_samples_per_year = 365 * 24 * 60 * 60 * 1000 / sample_duration_ms
+    count_samples_per_year = 365 * 24 * 60 * 60 * 1000 / _SAMPLE_DURATION_MS
     mu = math.pow(1 + annual_mu, 1 / count_samples_per_year) - 1
     annual_sigma = (annual_sigma_pct / 100)
     sigma = annual_sigma / math.sqrt(count_samples_per_year)
+    return mu, sigma
+
+
+def fake_track_record_msec(init_time, init_value, annual_mu_pct, annual_sigma_pct, quotes=None):
+    """
+
+    :param init_time:
+    :param init_value:
+    :param annual_mu_pct: annual drift assuming 365 days in year
+    :param annual_sigma_pct:
+    :param quotes: iterable of (bid, ask) Decimal prices replacing the random walk, when given
+    :return:
+    """
+    if quotes is None:
+        mu, sigma = sample_drift_volatility(annual_mu_pct, annual_sigma_pct)
+        quotes = random_walk(init_value, mu, sigma)
+
     current_time = init_time - timedelta(milliseconds=init_time.microsecond/1000)
-    for bid, ask in random_walk(init_value, mu, sigma):
-        logging.debug('bid ask = %.3f / %.3f', bid, ask)
-        current_time = current_time + timedelta(milliseconds=sample_duration_ms)
+    for bid, ask in quotes:
+        current_time = current_time + timedelta(milliseconds=_SAMPLE_DURATION_MS)
         yield current_time, bid, ask
 
 
-def fake_ohlc_sec(init_time, init_value, mu_pct, sigma_pct):
+def fake_ohlc_sec(init_time, init_value, mu_pct, sigma_pct, quotes=None):
     """
     Generates a sequence of fake second sampled open, high, low, close data.
 
@@ -68,11 +90,12 @@ def fake_ohlc_sec(init_time, init_value, mu_pct, sigma_pct):
     :param init_value: initial price
     :param mu_pct: drift per 100 msec
     :param sigma_pct: std dev per 100 msec
+    :param quotes: see fake_track_record_msec()
     :return:
     """
     prev_second = init_time.second
     px_high = px_low = px_open = px_close = None
-    for current_time, bid, ask in fake_track_record_msec(init_time, init_value, mu_pct, sigma_pct):
+    for current_time, bid, ask in fake_track_record_msec(init_time, init_value, mu_pct, sigma_pct, quotes=quotes):
         current_second = current_time.second
         px_mid = Decimal('0.5') * (bid + ask)
         if current_second != prev_second:
@@ -98,48 +121,212 @@ def fake_ohlc_sec(init_time, init_value, mu_pct, sigma_pct):
             px_close = px_mid
 
 
-def fake_ohlc_sample(init_time, init_value, mu_pct, sigma_pct, sample_unit='minute'):
+def fake_ohlc_sample(init_time, init_value, mu_pct, sigma_pct, sample_unit='minute', count_seconds=None,
+                     quotes=None):
     """
+    Rolls second bars up into bars of one sample_unit, each bar being labelled with the time it closes.
 
     :param init_time:
     :param init_value:
     :param mu_pct:
     :param sigma_pct:
-    :param sample_unit: ('minute', 'hour', 'day')
+    :param sample_unit: ('second', 'minute', 'hour', 'day')
+    :param count_seconds: number of second bars consumed, endless when None, the bar in progress being yielded
+    once they are exhausted
+    :param quotes: see fake_track_record_msec()
     :return:
     """
-    current_sample = None
-    for current_time, px_open, px_high, px_low, px_close in fake_ohlc_sec(init_time, init_value, mu_pct, sigma_pct):
-        if not current_sample:
-            current_sample = getattr(current_time, sample_unit)
-            sample_px_open = sample_px_high = sample_px_low = px_open
+    seconds = fake_ohlc_sec(init_time, init_value, mu_pct, sigma_pct, quotes=quotes)
+    if count_seconds is not None:
+        seconds = itertools.islice(seconds, count_seconds)
+
+    current_sample = current_time = None
+    sample_px_open = sample_px_high = sample_px_low = sample_px_close = None
+    for current_time, px_open, px_high, px_low, px_close in seconds:
+        if getattr(current_time, sample_unit) != current_sample:
+            if current_sample is not None:
+                yield current_time, sample_px_open, sample_px_high, sample_px_low, sample_px_close
 
-        if current_sample != getattr(current_time, sample_unit):
             current_sample = getattr(current_time, sample_unit)
-            yield current_time, sample_px_open, sample_px_high, sample_px_low, px_close
-            sample_px_open = sample_px_high = sample_px_low = px_open
+            sample_px_open, sample_px_high, sample_px_low = px_open, px_high, px_low
 
         else:
             sample_px_high = max(sample_px_high, px_high)
             sample_px_low = min(sample_px_low, px_low)
 
+        sample_px_close = px_close
+
+    if current_sample is not None:
+        yield current_time, sample_px_open, sample_px_high, sample_px_low, sample_px_close
+
+
+def random_walk_ticks(rng, init_value, mu, sigma, count):
+    """
+    Draws a whole block of bid / ask quotes at once.
+
+    Prices are expressed as integer ticks of 10^-_RESOLUTION, so that rounding happens once per quote
+    and all further arithmetic is exact.
+
+    :param rng: numpy.random.Generator
+    :param init_value: initial price
+    :param mu: drift per tick
+    :param sigma: std dev per tick
+    :param count: number of ticks to draw
+    :return: (bid, ask) int64 arrays of ticks
+    """
+    changes = rng.normal(mu, sigma, size=count)
+    spreads = rng.integers(1, 4, size=count)
+    values = init_value * numpy.cumprod(1 + changes)
+    bid = numpy.rint(numpy.maximum(values, 0.) * 10 ** _RESOLUTION).astype(numpy.int64)
+    ask = bid + spreads
+    return bid, ask
+
+
+def resample_ohlc(px_open, px_high, px_low, px_close, bar_size):
+    """
+    Aggregates consecutive groups of bar_size bars into a single OHLC bar.
+
+    :param px_open:
+    :param px_high:
+    :param px_low:
+    :param px_close:
+    :param bar_size: number of input bars per output bar, must divide the input length
+    :return: (open, high, low, close) arrays
+    """
+    bars = resample.aggregate(numpy.arange(0, len(px_open), bar_size), px_open, px_high, px_low, px_close)
+    return bars['open'], bars['high'], bars['low'], bars['close']
+
+
+def check_ohlc(px_open, px_high, px_low, px_close):
+    """
+    Vectorized counterpart of the consistency checks in fake_ohlc_sec.
+
+    :raise RuntimeError: on the first inconsistent bar
+    """
+    bad_high = (px_high < px_low) | (px_high < px_open) | (px_high < px_close)
+    if bad_high.any():
+        index = numpy.argmax(bad_high)
+        bar = (px_open[index], px_high[index], px_low[index], px_close[index])
+        raise RuntimeError('Programming error: inconsistent high: %s' % str(bar))
+
+    bad_low = (px_low > px_high) | (px_low > px_open) | (px_low > px_close)
+    if bad_low.any():
+        index = numpy.argmax(bad_low)
+        bar = (px_open[index], px_high[index], px_low[index], px_close[index])
+        raise RuntimeError('Programming error: inconsistent low: %s' % str(bar))
+
+
+@instrument.timed('generate.fake_ohlc_minutes')
+def fake_ohlc_minutes(rng, init_value, mu_pct, sigma_pct, count_minutes):
+    """
+    Vectorized equivalent of fake_ohlc_sample(..., sample_unit='minute').
+
+    Mid prices are kept as integer half-ticks (bid + ask) and rolled up into second then minute bars.
+
+    :param rng: numpy.random.Generator
+    :param init_value: initial price
+    :param mu_pct: annual drift
+    :param sigma_pct: annual std dev
+    :param count_minutes: number of minute bars to generate
+    :return: int64 array of shape (count_minutes, 4) holding open, high, low, close in half-ticks
+    """
+    mu, sigma = sample_drift_volatility(mu_pct, sigma_pct)
+    count_seconds = count_minutes * 60
+    bid, ask = random_walk_ticks(rng, init_value, mu, sigma, count_seconds * _SAMPLES_PER_SECOND)
+    px_mid = bid + ask
+    seconds = resample_ohlc(px_mid, px_mid, px_mid, px_mid, _SAMPLES_PER_SECOND)
+    check_ohlc(*seconds)
+    minutes = resample_ohlc(*seconds, bar_size=60)
+    check_ohlc(*minutes)
+    instrument.count('bars_processed', count_minutes)
+    return numpy.column_stack(minutes)
+
+
+def half_ticks_as_decimal(values):
+    """
+    Converts half-tick prices to the Decimal values produced by the tick-by-tick pipeline.
+
+    :param values: int64 array of half-ticks
+    :return: object array of Decimal with the same shape
+    """
+    decimals = [Decimal(int(value) * 5).scaleb(-(_RESOLUTION + 1)) for value in values.ravel()]
+    return numpy.array(decimals, dtype=object).reshape(values.shape)
+
+
+def half_ticks_as_price(values):
+    """
+    Converts half-tick prices to float64, each price being the nearest float to its exact decimal value.
+
+    :param values: int64 array of half-ticks
+    :return: float64 array with the same shape
+    """
+    return values / (2 * 10 ** _RESOLUTION)
+
+
+def generate_minutes_benchmark(seed_sequence, path, as_decimal=False, bar_store_path=None):
+    """
+    Generates a single minutes benchmark file from its own seed.
+
+    :param seed_sequence: numpy.random.SeedSequence dedicated to this file
+    :param path: output file
+    :param as_decimal: saves Decimal object arrays instead of float64
+    :param bar_store_path: when set, also writes the bars to this BarStore, the file name being the symbol
+    :return: path
+    """
+    rng = numpy.random.default_rng(seed_sequence)
+    samples = fake_ohlc_minutes(rng, 100., mu_pct=0, sigma_pct=20, count_minutes=_MINUTES_PER_BENCHMARK)
+    if bar_store_path:
+        start_time = numpy.datetime64(datetime(2010, 1, 1, 9))
+        timestamps = start_time + (numpy.arange(len(samples)) + 1) * numpy.timedelta64(1, 'm')
+        bars = pandas.DataFrame(half_ticks_as_price(samples), columns=['open', 'high', 'low', 'close'],
+                                index=pandas.DatetimeIndex(timestamps, name='ts'))
+        symbol = os.path.basename(path)[:-len('.npy')]
+        BarStore(bar_store_path).write_bars(symbol, bars, bar_size=60, seed=str(seed_sequence.entropy),
+                                            spawn_key=list(seed_sequence.spawn_key))
+
+    if as_decimal:
+        numpy.save(path, half_ticks_as_decimal(samples))
+
+    else:
+        numpy.save(path, half_ticks_as_price(samples))
+
+    return path
+
+
+@instrument.timed('generate.generate_minutes_benchmarks')
+def generate_minutes_benchmarks(count=1000, seed=None, workers=1, as_decimal=False, bar_store_path=None):
+    """
+    Generates count benchmark files named ohlc-<seed>-<index>.npy.
+
+    Each file gets a seed spawned from the master seed, so that the output only depends on (seed, index)
+    and not on the number of workers.
+
+    :param count: number of files
+    :param seed: master seed, fresh entropy is drawn when None
+    :param workers: number of processes
+    :param as_decimal: saves Decimal object arrays instead of float64
+    :param bar_store_path: when set, also writes every benchmark to this BarStore
+    :return: list of generated paths
+    """
+    master_seed = numpy.random.SeedSequence(seed)
+    logging.info('generating %d benchmarks with seed %d', count, master_seed.entropy)
+    output_dest = os.sep.join(['data', 'benchmark-minutes'])
+    if not os.path.exists(output_dest):
+        os.makedirs(output_dest)
 
-def generate_minutes_benchmarks(count=1000):
-    for i in range(count):
-        start_time = datetime(2010, 1, 1, 9)
-        output_dest = os.sep.join(['data', 'benchmark-minutes'])
-        samples = list()
-        for index, walker in enumerate(fake_ohlc_sample(start_time, 100., mu_pct=0, sigma_pct=20, sample_unit='minute')):
-            ts, px_open, px_high, px_low, px_close = walker
-            samples.append((px_open, px_high, px_low, px_close))
-            if index == 8 * 60 - 1:
-                break
+    width = len(str(count - 1))
+    paths = [os.sep.join([output_dest, 'ohlc-%d-%0*d.npy' % (master_seed.entropy, width, index)])
+             for index in range(count)]
+    seed_sequences = master_seed.spawn(count)
+    if workers > 1:
+        chunksize = max(1, count // (4 * workers))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(generate_minutes_benchmark, seed_sequences, paths, [as_decimal] * count,
+                                     [bar_store_path] * count, chunksize=chunksize))
 
-        if not os.path.exists(output_dest):
-            os.makedirs(output_dest)
+    return [generate_minutes_benchmark(seed_sequence, path, as_decimal=as_decimal, bar_store_path=bar_store_path)
+            for seed_sequence, path in zip(seed_sequences, paths)]
 
-        with tempfile.NamedTemporaryFile(prefix='ohlc-', suffix='.bin', dir=output_dest, delete=False) as benchmark_file:
-            numpy.save(benchmark_file, numpy.array(samples))
 
 if __name__ == '__main__':
     logging.basicConfig(level=logging.INFO, format='%(asctime)s:%(name)s:%(levelname)s:%(message)s')
@@ -150,6 +337,12 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Experimenting Statistical Arb strategies.',
                                      formatter_class=argparse.ArgumentDefaultsHelpFormatter
                                      )
+    parser.add_argument('--count', type=int, default=1000, help='number of benchmark files')
+    parser.add_argument('--seed', type=int, default=None, help='master seed, random when omitted')
+    parser.add_argument('--workers', type=int, default=1, help='number of processes')
+    parser.add_argument('--decimal', action='store_true', help='save Decimal object arrays instead of float64')
+    parser.add_argument('--bar-store', default=None, help='also write the benchmarks to this bar store')
     args = parser.parse_args()
-    generate_minutes_benchmarks()
-    sys.exit(0)
\ No newline at end of file
+    generate_minutes_benchmarks(count=args.count, seed=args.seed, workers=args.workers, as_decimal=args.decimal,
+                                bar_store_path=args.bar_store)
+    sys.exit(0)
@@ -1,35 +1,60 @@
 import os
 import sys
-import tempfile
 from datetime import datetime, timedelta
 import math
 import argparse
 import logging
 import random
 
-from decimal import Decimal
-
 import numpy
 
+import instrument
+from benchmarkstore import BenchmarkStoreWriter, build_store
+
+_RESOLUTION = 3
+# mid prices are half ticks
+_PRICE_RESOLUTION = _RESOLUTION + 1
+
+
+@instrument.timed('merge.merge_minutes_benchmarks')
+def merge_minutes_benchmarks(seed=None):
+    """
+    Chains every minutes benchmark, in random order, into a single sample of the store.
 
-def merge_minutes_benchmarks():
+    Chunks are streamed to the store one at a time, each one being rescaled so that it starts where the previous
+    one ended and rounded back to the price grid: peak memory stays around a single chunk.
+
+    :param seed: seed of the shuffle
+    """
     data_input_path = os.path.sep.join(['data', 'benchmark-minutes'])
-    chunks = os.listdir(data_input_path)
-    chunk_data_adjusted = None
+    chunks = sorted(os.listdir(data_input_path))
+    if not chunks:
+        raise ValueError('no benchmark chunk in %s' % data_input_path)
 
-    random.shuffle(chunks)
-    for chunk in chunks:
-        chunk_data = numpy.load(os.path.sep.join([data_input_path, chunk]))
-        if chunk_data_adjusted is not None:
+    random.Random(seed).shuffle(chunks)
+    output_dest = os.path.sep.join(['data', 'benchmark-store'])
+    adjustment_factor = 1.
+    with BenchmarkStoreWriter(output_dest) as writer:
+        for chunk in chunks:
+            chunk_data = numpy.load(os.path.sep.join([data_input_path, chunk]), allow_pickle=True)
+            instrument.count('bytes_loaded', chunk_data.nbytes)
+            instrument.count('bars_processed', len(chunk_data))
+            chunk_data_adjusted = numpy.round(chunk_data.astype('float64') * adjustment_factor, _PRICE_RESOLUTION)
+            writer.extend(chunk_data_adjusted)
             adjustment_factor = chunk_data_adjusted[-1][-1] / 100
-            chunk_data_adjusted = numpy.concatenate((chunk_data_adjusted, chunk_data * adjustment_factor), axis=0)
 
-        else:
-            chunk_data_adjusted = chunk_data
+        writer.finish_sample()
+
 
-    output_dest = os.path.sep.join(['data', 'benchmarks'])
-    with tempfile.NamedTemporaryFile(prefix='ohlc-', suffix='.bin', dir=output_dest, delete=False) as benchmark_file:
-        numpy.save(benchmark_file, numpy.array(chunk_data_adjusted))
+@instrument.timed('merge.import_benchmarks')
+def import_benchmarks():
+    """
+    Copies legacy data/benchmarks/*.bin files into the consolidated store, leaving the files in place.
+    """
+    data_input_path = os.path.sep.join(['data', 'benchmarks'])
+    names = sorted(name for name in os.listdir(data_input_path) if name.endswith('.bin'))
+    build_store(os.path.sep.join(['data', 'benchmark-store']),
+                [os.path.sep.join([data_input_path, name]) for name in names])
 
 if __name__ == '__main__':
     logging.basicConfig(level=logging.INFO, format='%(asctime)s:%(name)s:%(levelname)s:%(message)s')
@@ -40,6 +65,14 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Experimenting Statistical Arb strategies.',
                                      formatter_class=argparse.ArgumentDefaultsHelpFormatter
                                      )
+    parser.add_argument('--seed', type=int, default=None, help='seed of the chunks shuffle, random when omitted')
+    parser.add_argument('--import-legacy', action='store_true',
+                        help='import data/benchmarks/*.bin into the store instead of merging')
     args = parser.parse_args()
-    merge_minutes_benchmarks()
+    if args.import_legacy:
+        import_benchmarks()
+
+    else:
+        merge_minutes_benchmarks(seed=args.seed)
+
     sys.exit(0)
\ No newline at end of file
@@ -0,0 +1,315 @@
+"""
+Times the hot paths over a matrix of series lengths and symbol counts, records peak memory and appends the results
+to a JSON history, compared against a baseline to catch regressions.
+
+Usage (from the repository root, src being on the path)::
+
+    PYTHONPATH=src python scripts/perf-suite.py --lengths 1000,100000 --symbols 1,10
+    PYTHONPATH=src python scripts/perf-suite.py --save-baseline
+    PYTHONPATH=src python scripts/perf-suite.py --profile data/perf-profiles
+"""
+import argparse
+import cProfile
+import importlib.util
+import json
+import logging
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy
+import pandas
+
+import ichimoku
+from benchmarkstore import BenchmarkStoreWriter
+
+_SCRIPTS_PATH = os.path.dirname(os.path.abspath(__file__))
+_DEFAULT_LENGTHS = '1000,100000,10000000'
+_DEFAULT_SYMBOLS = '1,10'
+
+
+def load_script(name):
+    path = os.path.sep.join([_SCRIPTS_PATH, name + '.py'])
+    spec = importlib.util.spec_from_file_location(name.replace('-', '_'), path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def fake_ohlc(rng, bars):
+    """
+    Cheap random walk bars on the 4 decimals price grid, used as input by the cases.
+
+    :return: float64 array of shape (bars, 4)
+    """
+    px_close = numpy.round(100. * numpy.cumprod(1 + rng.normal(0, 1e-4, size=bars)), 4)
+    px_open = numpy.concatenate([[100.], px_close[:-1]])
+    spread = numpy.round(numpy.abs(rng.normal(0, 1e-3, size=(2, bars))), 4)
+    px_high = numpy.maximum(px_open, px_close) + spread[0]
+    px_low = numpy.minimum(px_open, px_close) - spread[1]
+    return numpy.column_stack([px_open, px_high, px_low, px_close])
+
+
+def fake_ohlc_df(rng, bars):
+    index = pandas.date_range('2010-01-01 09:01', periods=bars, freq='min', name='ts')
+    return pandas.DataFrame(fake_ohlc(rng, bars), index=index, columns=['open', 'high', 'low', 'close'])
+
+
+def write_benchmark_store(rng, bars, symbols):
+    with BenchmarkStoreWriter(os.path.sep.join(['data', 'benchmark-store'])) as writer:
+        for symbol in range(symbols):
+            writer.append(fake_ohlc(rng, bars))
+
+
+class Case(object):
+    """
+    A timed function: setup(rng, bars, symbols) prepares its input, possibly files in the current folder, and
+    returns the callable timed. Cells above max_cells bars x symbols are skipped.
+    """
+
+    def __init__(self, name, setup, max_cells=10 ** 7):
+        self.name = name
+        self.setup = setup
+        self.max_cells = max_cells
+
+
+def _components_setup(rng, bars, symbols):
+    frames = [fake_ohlc_df(rng, bars) for symbol in range(symbols)]
+    return lambda: [ichimoku.components(frame) for frame in frames]
+
+
+def _rules_setup(rng, bars, symbols):
+    frames = [fake_ohlc_df(rng, bars) for symbol in range(symbols)]
+    return lambda: [ichimoku.long_short_rules_1(frame) for frame in frames]
+
+
+def _fake_ohlc_sample_setup(rng, bars, symbols):
+    generator = load_script('generate-benchmarks')
+
+    def run():
+        for symbol in range(symbols):
+            samples = generator.fake_ohlc_sample(datetime(2010, 1, 1, 9), 100., 0, 20, sample_unit='second')
+            for count, sample in zip(range(bars), samples):
+                pass
+
+    return run
+
+
+def _fake_ohlc_minutes_setup(rng, bars, symbols):
+    generator = load_script('generate-benchmarks')
+    return lambda: [generator.fake_ohlc_minutes(rng, 100., 0, 20, bars) for symbol in range(symbols)]
+
+
+def _merge_setup(rng, bars, symbols):
+    merger = load_script('merge-benchmarks')
+    folder = os.path.sep.join(['data', 'benchmark-minutes'])
+    os.makedirs(folder)
+    for symbol in range(symbols):
+        numpy.save(os.path.sep.join([folder, 'ohlc-0-%d.npy' % symbol]), fake_ohlc(rng, bars))
+
+    def run():
+        if os.path.exists(os.path.sep.join(['data', 'benchmark-store'])):
+            for name in os.listdir(os.path.sep.join(['data', 'benchmark-store'])):
+                os.remove(os.path.sep.join(['data', 'benchmark-store', name]))
+
+        merger.merge_minutes_benchmarks(seed=0)
+
+    return run
+
+
+def _load_setup(rng, bars, symbols):
+    statarb = load_script('statarb')
+    write_benchmark_store(rng, bars, symbols)
+    return lambda: statarb.load_ohlc_sample_minute(2010, 1, 1, 9)
+
+
+def _run_setup(rng, bars, symbols):
+    statarb = load_script('statarb')
+    write_benchmark_store(rng, bars, symbols)
+    return statarb.run
+
+
+CASES = [
+    Case('ichimoku.components', _components_setup),
+    Case('ichimoku.long_short_rules_1', _rules_setup),
+    # the legacy Decimal chain handles 50 ticks per second bar, one at a time
+    Case('generate.fake_ohlc_sample', _fake_ohlc_sample_setup, max_cells=10 ** 4),
+    # 3000 ticks are drawn per minute bar
+    Case('generate.fake_ohlc_minutes', _fake_ohlc_minutes_setup, max_cells=10 ** 5),
+    Case('merge.merge_minutes_benchmarks', _merge_setup),
+    Case('statarb.load_ohlc_sample_minute', _load_setup),
+    Case('statarb.run', _run_setup),
+]
+
+
+def measure(case, bars, symbols, repeat, profile_path=None, seed=0):
+    """
+    Runs one cell of the matrix in a scratch folder.
+
+    :return: dict of timings in seconds and peak traced memory in bytes
+    """
+    rng = numpy.random.default_rng(seed)
+    current_path = os.getcwd()
+    with tempfile.TemporaryDirectory() as scratch_path:
+        os.chdir(scratch_path)
+        # timed code logs at INFO level on every call
+        logging.disable(logging.INFO)
+        try:
+            function = case.setup(rng, bars, symbols)
+            durations = list()
+            for count in range(repeat):
+                start = time.perf_counter()
+                function()
+                durations.append(time.perf_counter() - start)
+
+            tracemalloc.start()
+            function()
+            peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+            if profile_path:
+                profiler = cProfile.Profile()
+                profiler.runcall(function)
+                profiler.dump_stats(os.path.sep.join([profile_path, '%s-%d-%d.prof' % (case.name, bars, symbols)]))
+
+        finally:
+            logging.disable(logging.NOTSET)
+            os.chdir(current_path)
+
+    return {'case': case.name, 'bars': bars, 'symbols': symbols, 'repeat': repeat,
+            'min': min(durations), 'median': statistics.median(durations), 'peak_memory': peak_memory}
+
+
+def environment():
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=_SCRIPTS_PATH,
+                                         stderr=subprocess.DEVNULL).decode().strip()
+
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+
+    return {'timestamp': datetime.now().isoformat(), 'commit': commit, 'python': platform.python_version(),
+            'numpy': numpy.__version__, 'pandas': pandas.__version__, 'machine': platform.machine()}
+
+
+def run_suite(lengths, symbol_counts, cases=None, repeat=3, profile_path=None):
+    """
+
+    :param lengths: series lengths in bars
+    :param symbol_counts: numbers of symbols
+    :param cases: names of the cases to run, all when None
+    :param repeat: timed runs per cell
+    :param profile_path: folder receiving one cProfile dump per cell, none when None
+    :return: dict with the environment and one result per cell
+    """
+    if profile_path and not os.path.exists(profile_path):
+        os.makedirs(profile_path)
+
+    results = list()
+    for case in CASES:
+        if cases and case.name not in cases:
+            continue
+
+        for bars in lengths:
+            for symbols in symbol_counts:
+                if bars * symbols > case.max_cells:
+                    logging.info('%s: %d bars x %d symbols skipped', case.name, bars, symbols)
+                    continue
+
+                result = measure(case, bars, symbols, repeat, profile_path=profile_path)
+                logging.info('%s: %d bars x %d symbols, median %.4fs, peak memory %.1f MB', case.name, bars,
+                             symbols, result['median'], result['peak_memory'] / 2 ** 20)
+                results.append(result)
+
+    return {'environment': environment(), 'results': results}
+
+
+def compare(run, baseline, tolerance=0.2, memory_tolerance=0.2):
+    """
+    Flags cells slower, or using more memory, than the baseline by more than the given relative tolerances.
+
+    :return: list of regression descriptions
+    """
+    reference = dict(((result['case'], result['bars'], result['symbols']), result)
+                     for result in baseline['results'])
+    regressions = list()
+    for result in run['results']:
+        expected = reference.get((result['case'], result['bars'], result['symbols']))
+        if expected is None:
+            continue
+
+        cell = '%s (%d bars x %d symbols)' % (result['case'], result['bars'], result['symbols'])
+        if result['median'] > expected['median'] * (1 + tolerance):
+            regressions.append('%s: median %.4fs vs %.4fs' % (cell, result['median'], expected['median']))
+
+        if result['peak_memory'] > expected['peak_memory'] * (1 + memory_tolerance):
+            regressions.append('%s: peak memory %d vs %d bytes' % (cell, result['peak_memory'],
+                                                                    expected['peak_memory']))
+
+    return regressions
+
+
+def load_json(path, default=None):
+    if not os.path.exists(path):
+        return default
+
+    with open(path) as json_file:
+        return json.load(json_file)
+
+
+def save_json(path, content):
+    folder = os.path.dirname(path)
+    if folder and not os.path.exists(folder):
+        os.makedirs(folder)
+
+    with open(path, 'w') as json_file:
+        json.dump(content, json_file, indent=2)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s:%(name)s:%(levelname)s:%(message)s')
+    parser = argparse.ArgumentParser(description='Times the hot paths and compares them against a baseline.',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter
+                                     )
+    parser.add_argument('--lengths', default=_DEFAULT_LENGTHS, help='comma separated series lengths in bars')
+    parser.add_argument('--symbols', default=_DEFAULT_SYMBOLS, help='comma separated symbol counts')
+    parser.add_argument('--case', action='append', default=None, choices=[case.name for case in CASES],
+                        help='case to run, may be repeated, all when omitted')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per cell')
+    parser.add_argument('--profile', default=None, help='folder receiving cProfile dumps')
+    parser.add_argument('--history', default=os.path.sep.join(['data', 'perf-history.json']),
+                        help='JSON history the run is appended to')
+    parser.add_argument('--baseline', default=os.path.sep.join(['data', 'perf-baseline.json']),
+                        help='JSON baseline compared against')
+    parser.add_argument('--save-baseline', action='store_true', help='replaces the baseline with this run')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='relative slowdown flagged as regression')
+    parser.add_argument('--memory-tolerance', type=float, default=0.2,
+                        help='relative peak memory increase flagged as regression')
+    args = parser.parse_args()
+    history_path = os.path.abspath(args.history)
+    baseline_path = os.path.abspath(args.baseline)
+    profile_path = os.path.abspath(args.profile) if args.profile else None
+    suite_run = run_suite([int(value) for value in args.lengths.split(',')],
+                          [int(value) for value in args.symbols.split(',')],
+                          cases=args.case, repeat=args.repeat, profile_path=profile_path)
+    save_json(history_path, load_json(history_path, default=[]) + [suite_run])
+    if args.save_baseline:
+        save_json(baseline_path, suite_run)
+        sys.exit(0)
+
+    baseline = load_json(baseline_path)
+    if baseline is None:
+        logging.info('no baseline at %s, use --save-baseline to record one', baseline_path)
+        sys.exit(0)
+
+    regressions = compare(suite_run, baseline, tolerance=args.tolerance, memory_tolerance=args.memory_tolerance)
+    for regression in regressions:
+        logging.warning('regression: %s', regression)
+
+    sys.exit(1 if regressions else 0)
@@ -0,0 +1,50 @@
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+
+from signaldaemon import SignalDaemon, log_events, replay_store, socket_lines, tail_lines, ticks_from_lines
+
+
+def make_feed(args):
+    if args.source == 'replay':
+        return replay_store(args.store, symbols=args.symbols, speed=args.speed)
+
+    if args.source == 'file':
+        return ticks_from_lines(tail_lines(args.path, follow=args.follow), flush_timeout=args.flush_timeout / 1000)
+
+    return ticks_from_lines(socket_lines(args.host, args.port), flush_timeout=args.flush_timeout / 1000)
+
+
+async def serve(args):
+    daemon = SignalDaemon(queue_size=args.queue_size,
+                          latency_budget=args.latency_budget / 1000 if args.latency_budget else None)
+    sink = (lambda events: None) if args.quiet else log_events
+    return await daemon.run(make_feed(args), sink=sink)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s:%(name)s:%(levelname)s:%(message)s')
+    parser = argparse.ArgumentParser(description='Emits live Ichimoku rules 1 entry and exit events.',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter
+                                     )
+    parser.add_argument('--source', choices=['replay', 'file', 'socket'], default='replay', help='bar feed')
+    parser.add_argument('--store', default=os.path.sep.join(['data', 'benchmark-store']),
+                        help='benchmark store replayed')
+    parser.add_argument('--symbols', type=int, default=1000, help='number of replayed symbols')
+    parser.add_argument('--speed', type=float, default=None, help='replayed ticks per second, unthrottled if omitted')
+    parser.add_argument('--path', default=None, help='file of timestamp,symbol,open,high,low,close lines')
+    parser.add_argument('--follow', action='store_true', help='keeps reading lines appended to the file')
+    parser.add_argument('--host', default='127.0.0.1', help='feed host')
+    parser.add_argument('--port', type=int, default=9100, help='feed port')
+    parser.add_argument('--flush-timeout', type=float, default=50., help='ms of silence ending a tick (file, socket)')
+    parser.add_argument('--queue-size', type=int, default=16, help='ticks buffered before the feed is paused')
+    parser.add_argument('--latency-budget', type=float, default=None, help='per-tick latency budget in ms')
+    parser.add_argument('--quiet', action='store_true', help='does not log events')
+    args = parser.parse_args()
+    summary = asyncio.run(serve(args))
+    logging.info('summary: %s', json.dumps(summary, indent=2, default=str))
+    over_budget = summary['end_to_end']['over_budget']
+    sys.exit(1 if over_budget else 0)
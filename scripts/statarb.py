@@ -1,89 +1,203 @@
 import argparse
 import logging
 import os
-import random
 import sys
 from datetime import datetime
 from datetime import timedelta
-from decimal import Decimal
 
 import numpy
-import pandas
-
-from matplotlib import pyplot
-from matplotlib.dates import DateFormatter, date2num, num2date
-from matplotlib import finance
 
+import backtest
 import ichimoku
-from intradaygoogle import get_google_finance_intraday
+import instrument
+from benchmarkstore import BenchmarkStore
 
 _RESOLUTION = 3
+# mid prices are half ticks
+_PRICE_RESOLUTION = _RESOLUTION + 1
 
 
 def ohlc_as_df(sample_data):
+    import pandas
+
     return pandas.DataFrame(sample_data, columns=['ts','open','high', 'low', 'close']).set_index('ts')
 
 
-def load_ohlc_sample_minute(year, month, day, hour=9, minute=0):
-    path = os.path.sep.join(('data', 'benchmarks'))
-    samples = [name for name in os.listdir(path) if name.endswith('.bin')]
-    data = numpy.load(os.path.sep.join((path, random.choice(samples))))
-    ts_column = (numpy.arange(data.shape[0]) + 1) * timedelta(minutes=1) + datetime(year, month, day, hour, minute)
-    time_series = numpy.insert(data, 0, ts_column, axis=1)
+@instrument.timed('statarb.load_ohlc_sample_minute')
+def load_ohlc_sample_minute(year, month, day, hour=9, minute=0, symbol=None):
+    """
+    Loads a random benchmark sample starting at the given time, or the bars stored for symbol that day.
+
+    :param symbol: symbol of the bar store, a random benchmark sample when None
+    :return: array of (ts, open, high, low, close) rows
+    """
+    start_time = datetime(year, month, day, hour, minute)
+    if symbol is not None:
+        from barstore import BarStore
+
+        bars = BarStore(os.path.sep.join(('data', 'bars'))).read_bars(
+            symbol, start=start_time, end=datetime(year, month, day) + timedelta(days=1, microseconds=-1),
+            columns=['open', 'high', 'low', 'close'])
+        instrument.count('bytes_loaded', bars.values.nbytes)
+        return numpy.column_stack((bars.index.to_pydatetime(), bars.values))
+
+    data = BenchmarkStore(os.path.sep.join(('data', 'benchmark-store'))).random_sample()
+    instrument.count('bytes_loaded', data.nbytes)
+    ts_column = (numpy.arange(data.shape[0]) + 1) * timedelta(minutes=1) + start_time
+    time_series = numpy.column_stack((ts_column, data.astype(object)))
     return time_series
 
 
+@instrument.timed('statarb.load_ohlc_benchmarks')
+def load_ohlc_benchmarks():
+    """
+    Loads every benchmark sample at once.
+
+    :return: float64 array of shape (sample, bar, 4)
+    """
+    ohlc = BenchmarkStore(os.path.sep.join(('data', 'benchmark-store'))).stacked()
+    instrument.count('bytes_loaded', ohlc.nbytes)
+    return ohlc
+
+
+@instrument.timed('statarb.run_benchmarks')
+def run_benchmarks(entry_bars=10, target=0.05, stop=None):
+    """
+    Runs the strategy over the whole benchmark corpus in one vectorized pass.
+
+    :param entry_bars: buys at the high of this bar
+    :param target: profit target
+    :param stop: optional stop loss
+    :return: pandas.DataFrame indexed by sample, see backtest.results_as_df()
+    """
+    ohlc = load_ohlc_benchmarks()
+    results = backtest.run_target_stop(ohlc, backtest.buy_high_after(entry_bars), target, stop=stop,
+                                       resolution=_PRICE_RESOLUTION)
+    return backtest.results_as_df(results, datetime(2010, 1, 1, 9))
+
+
+@instrument.timed('statarb.run')
 def run():
-    ts = px_low = px_close = px_ref = px_drawdown = None
-    target_reached = False
-    for index, walker in enumerate(load_ohlc_sample_minute(2010, 1, 1, 9)):
-        ts, px_open, px_high, px_low, px_close = walker
-        logging.debug('%s, ohlc values = %.3f, %.3f, %.3f, %.3f', ts, px_open, px_high, px_low, px_close)
-
-        if px_ref:
-            px_drawdown = min(px_drawdown, px_low)
-            px_target = px_ref + Decimal("0.05")
-            if px_low > px_target:
-                target_reached = True
-                break
-
-        if index == 10 - 1:
-            px_ref = px_drawdown = px_high
-            logging.info('bought (%s): %s', ts, px_ref)
-
-    if target_reached:
-        px_sell = px_close
-        profit = px_close - px_ref
-        drawdown = px_drawdown - px_ref
+    sample = load_ohlc_sample_minute(2010, 1, 1, 9)
+    ohlc = backtest.stack_samples([sample[:, 1:]])
+    entry_rule = backtest.buy_high_after(10)
+    results = backtest.run_target_stop(ohlc, entry_rule, 0.05, resolution=_PRICE_RESOLUTION)
+    result = dict((name, values[0]) for name, values in results.items())
+    timestamp = datetime(2010, 1, 1, 9) + (int(result['exit_index']) + 1) * timedelta(minutes=1)
+    entry_index, entry_price = entry_rule(ohlc)
+    logging.info('bought (%s): %s', sample[entry_index[0], 0], entry_price[0])
+    logging.info('sold (%s) at %.4f, profit: %.2f, drawdown: %.2f', timestamp, result['px_sell'],
+                 result['profit'], result['drawdown'])
+    return {'target_reached': bool(result['target_reached']), 'timestamp': timestamp,
+            'px_sell': result['px_sell'], 'profit': result['profit'], 'drawdown': result['drawdown']}
+
+
+@instrument.timed('statarb.signals')
+def signals(sample):
+    """
+    Ichimoku rules 1 trades over a sample, through the array API only.
+
+    :param sample: array of (ts, open, high, low, close) rows, see load_ohlc_sample_minute()
+    :return: (long trades, short trades, long open, short open), see ichimoku.long_short_rules_1()
+    """
+    timestamps = sample[:, 0].astype('datetime64[ns]')
+    high, low, close = [sample[:, column].astype('float64') for column in (2, 3, 4)]
+    bullish, bearish = ichimoku.rules_1_masks(high, low, close)
+    long_trades, long_open = ichimoku.trade_spans(bullish, timestamps)
+    short_trades, short_open = ichimoku.trade_spans(bearish, timestamps)
+    instrument.count('signals_emitted', len(long_trades) + len(short_trades))
+    return long_trades, short_trades, long_open, short_open
+
+
+def plot(sample):
+    from matplotlib import pyplot
+
+    import ohlcplot
+
+    ohlc_df = ohlc_as_df(sample)
+    long_trades, short_trades, _, _ = ichimoku.long_short_rules_1(ohlc_df)
+    components = ichimoku.components(ohlc_df)
+    with instrument.timer('statarb.plot'):
+        ax = ohlcplot.plot_ohlc(ohlc_df)
+        ohlcplot.plot_ichimoku(ax, components)
+        ohlcplot.plot_trades(ax, long_trades, 'g')
+        ohlcplot.plot_trades(ax, short_trades, 'r')
+
+    pyplot.show()
+
+
+def fetch(tickers, period=60, days=1, workers=16, rate=None, cache_path=None):
+    """
+    Downloads intraday bars into the bar store read by load_ohlc_sample_minute(), one symbol per ticker.
+    """
+    from barstore import BarStore
+    from intradaygoogle import get_intraday_many
+
+    store = BarStore(os.path.sep.join(('data', 'bars')))
+    bars_by_ticker = get_intraday_many(tickers, period=period, days=days, workers=workers, rate=rate,
+                                       cache_path=cache_path)
+    for ticker, bars in bars_by_ticker.items():
+        if bars is None or not len(bars):
+            logging.warning('no bars for %s', ticker)
+            continue
+
+        store.append_bars(ticker, bars, bar_size=period)
+        logging.info('%s: %d bars from %s to %s', ticker, len(bars), bars.index[0], bars.index[-1])
+
+
+def trade_pairs(tickers=None, samples=500, formation=0.5, window=120, z_window=None, entry=2., exit=0.5,
+                period=60, days=5):
+    """
+    Screens every pair on the formation bars, then trades the selected ones over the remaining bars.
+
+    :param tickers: downloaded with get_intraday_many(), benchmark samples are used when None
+    :param samples: number of benchmark samples, one instrument each
+    :param formation: fraction of the bars screened
+    :return: list of ((first name, second name), screen t statistic, long trades, short trades, long open, short
+    open), see ichimoku.long_short_rules_1()
+    """
+    import pairs
+
+    if tickers:
+        from intradaygoogle import get_intraday_many
+        closes = pairs.close_panel(get_intraday_many(tickers, period=period, days=days))
+        names = list(closes.columns)
+        index = closes.index.values
+        prices = closes.values
 
     else:
-        px_sell = px_low
-        profit = px_low - px_ref
-        drawdown = px_drawdown - px_ref
-
-    logging.info('sold (%s) at %.4f, profit: %.2f, drawdown: %.2f', ts, px_sell, profit, drawdown)
-    return {'target_reached': target_reached, 'timestamp': ts, 'px_sell': px_sell, 'profit': profit, 'drawdown': drawdown}
-
-
-def plot_ohlc(ohlc_df):
-    quotes_list = list()
-    for ts, row in ohlc_df.iterrows():
-        px_open = row[0]
-        px_high = row[1]
-        px_low = row[2]
-        px_close = row[3]
-        quotes_list.append((date2num(ts), float(px_open), float(px_high), float(px_low), float(px_close)))
-
-    quotes = numpy.array(quotes_list)
-    pyplot.style.use('ggplot')
-    fig, ax = pyplot.subplots(dpi=90)
-    ax.ticklabel_format(useOffset=False)
-    finance.candlestick_ohlc(ax, quotes, width=0.001, colorup='g', colordown='r')
-    ax.xaxis_date()
-    ax.xaxis.set_major_formatter(DateFormatter('%H:%M:%S'))
-    ax.autoscale_view()
-    pyplot.setp(pyplot.gca().get_xticklabels(), rotation=30, ha='right')
-    return ax
+        store = BenchmarkStore(os.path.sep.join(['data', 'benchmark-store']))
+        prices = pairs.store_close_panel(store, numpy.arange(min(samples, len(store))))
+        names = ['S%04d' % sample for sample in range(prices.shape[1])]
+        index = numpy.datetime64('2010-01-01T09:01') + numpy.arange(len(prices)) * numpy.timedelta64(1, 'm')
+
+    log_prices = numpy.log(prices)
+    formation_bars = int(len(log_prices) * formation)
+    selected = pairs.screen(log_prices[:formation_bars])
+    logging.info('%d pairs out of %d pass the screen', len(selected['first']),
+                 prices.shape[1] * (prices.shape[1] - 1) // 2)
+    # warm-up bars of the trading period are taken from the formation period
+    start = max(0, formation_bars - window - (z_window or window) + 2)
+    trades = pairs.pair_trades(log_prices[start:], index[start:], selected['first'], selected['second'], window,
+                               z_window=z_window, entry=entry, exit=exit)
+    trading_start = index[formation_bars] if formation_bars < len(index) else None
+    output = list()
+    for first, second, t_stat, (long_trades, short_trades, long_open, short_open) in zip(
+            selected['first'], selected['second'], selected['t_stat'], trades):
+        if trading_start is not None:
+            traded = long_trades[:, 0] >= trading_start
+            long_trades, long_open = long_trades[traded], long_open[traded]
+            traded = short_trades[:, 0] >= trading_start
+            short_trades, short_open = short_trades[traded], short_open[traded]
+
+        output.append(((names[first], names[second]), t_stat, long_trades, short_trades, long_open, short_open))
+
+    return output
+
+
+def _load_sample(args):
+    day = datetime.strptime(args.date, '%Y-%m-%d')
+    return load_ohlc_sample_minute(day.year, day.month, day.day, 9, symbol=args.symbol)
 
 
 if __name__ == '__main__':
@@ -95,29 +209,67 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Experimenting Statistical Arb strategies.',
                                      formatter_class=argparse.ArgumentDefaultsHelpFormatter
                                      )
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    backtest_parser = subparsers.add_parser('backtest', help='target / stop backtest, without plotting',
+                                            formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    backtest_parser.add_argument('--all', action='store_true', help='runs every benchmark sample instead of one')
+    backtest_parser.add_argument('--entry-bars', type=int, default=10, help='buys at the high of this bar (--all)')
+    backtest_parser.add_argument('--target', type=float, default=0.05, help='profit target (--all)')
+    backtest_parser.add_argument('--stop', type=float, default=None, help='stop loss (--all)')
+    for name, help_text in (('signals', 'Ichimoku rules 1 trades'), ('plot', 'candles, Ichimoku and trades')):
+        sample_parser = subparsers.add_parser(name, help=help_text,
+                                              formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+        sample_parser.add_argument('--symbol', default=None, help='bar store symbol, a random benchmark when omitted')
+        sample_parser.add_argument('--date', default='2010-01-01', help='day of the sample, YYYY-MM-DD')
+
+    fetch_parser = subparsers.add_parser('fetch', help='downloads intraday bars into the bar store',
+                                         formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    fetch_parser.add_argument('tickers', nargs='+', help='ticker symbols')
+    fetch_parser.add_argument('--period', type=int, default=60, help='bar size in seconds')
+    fetch_parser.add_argument('--days', type=int, default=1, help='number of trading days')
+    fetch_parser.add_argument('--workers', type=int, default=16, help='concurrent downloads')
+    fetch_parser.add_argument('--rate', type=float, default=None, help='maximum requests per second')
+    fetch_parser.add_argument('--cache', default=None, help='download cache folder')
+    pairs_parser = subparsers.add_parser('pairs', help='cointegrated pairs and their z-score trades',
+                                         formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    pairs_parser.add_argument('tickers', nargs='*', help='ticker symbols, benchmark samples when omitted')
+    pairs_parser.add_argument('--samples', type=int, default=500, help='number of benchmark samples')
+    pairs_parser.add_argument('--period', type=int, default=60, help='bar size in seconds (tickers)')
+    pairs_parser.add_argument('--days', type=int, default=5, help='number of trading days (tickers)')
+    pairs_parser.add_argument('--formation', type=float, default=0.5, help='fraction of the bars screened')
+    pairs_parser.add_argument('--window', type=int, default=120, help='bars per hedge ratio regression')
+    pairs_parser.add_argument('--z-window', type=int, default=None, help='bars per z-score, --window when omitted')
+    pairs_parser.add_argument('--entry', type=float, default=2., help='absolute z-score opening a trade')
+    pairs_parser.add_argument('--exit', type=float, default=0.5, help='absolute z-score closing a trade')
     args = parser.parse_args()
 
-    ohlc_series = load_ohlc_sample_minute(2010, 1, 1, 9)
-    ohlc_df = ohlc_as_df(ohlc_series)
-    #ohlc_df = get_google_finance_intraday('AAPL', period=15 * 60, days=10)
-    ax = plot_ohlc(ohlc_df)
-    long_trades, short_trades = ichimoku.long_short_rules_1(ohlc_df)
-    components = ichimoku.components(ohlc_df)
-    styles = ['#3399ff', '#004c99', '#c0c0c0', '#808080', '#cccc00']
-    components.plot(ax=ax, style=styles)
+    if args.command == 'backtest':
+        if args.all:
+            results = run_benchmarks(entry_bars=args.entry_bars, target=args.target, stop=args.stop)
+            logging.info('%d samples, target hit rate %.3f, mean profit %.4f, worst drawdown %.4f', len(results),
+                         results['target_reached'].mean(), results['profit'].mean(), results['drawdown'].min())
 
-    for trade_start, trade_end in long_trades:
-        pyplot.axvspan(trade_start, trade_end, facecolor='g', alpha=0.5)
+        else:
+            run()
 
-    for trade_start, trade_end in short_trades:
-        pyplot.axvspan(trade_start, trade_end, facecolor='r', alpha=0.5)
+    elif args.command == 'signals':
+        long_trades, short_trades, long_open, short_open = signals(_load_sample(args))
+        for side, trades, is_open in (('long', long_trades, long_open), ('short', short_trades, short_open)):
+            for (entry, exit), trade_open in zip(trades, is_open):
+                logging.info('%s from %s to %s%s', side, entry, exit, ' (open)' if trade_open else '')
 
-    pyplot.fill_between(components.index, components['senkou-span-a'], components['senkou-span-b'],
-                        where=components['senkou-span-b'] >= components['senkou-span-a'],
-                        color='red', alpha='0.4')
-    pyplot.fill_between(components.index, components['senkou-span-a'], components['senkou-span-b'],
-                        where=components['senkou-span-b'] < components['senkou-span-a'],
-                        color='green', alpha='0.4')
-    pyplot.show()
+    elif args.command == 'plot':
+        plot(_load_sample(args))
+
+    elif args.command == 'fetch':
+        fetch(args.tickers, period=args.period, days=args.days, workers=args.workers, rate=args.rate,
+              cache_path=args.cache)
+
+    elif args.command == 'pairs':
+        for (first, second), t_stat, long_trades, short_trades, long_open, short_open in trade_pairs(
+                args.tickers, samples=args.samples, formation=args.formation, window=args.window,
+                z_window=args.z_window, entry=args.entry, exit=args.exit, period=args.period, days=args.days):
+            logging.info('%s / %s: t statistic %.2f, %d long and %d short trades, %d still open', first, second,
+                         t_stat, len(long_trades), len(short_trades), long_open.sum() + short_open.sum())
 
-    sys.exit(0)
\ No newline at end of file
+    sys.exit(0)
@@ -0,0 +1,76 @@
+"""
+Walk-forward optimization of the Ichimoku rules 1 periods over the bars of a bar store symbol, or over the benchmark
+samples laid end to end as one minute series.
+
+Usage (from the repository root)::
+
+    PYTHONPATH=src python scripts/walk-forward.py --symbol GOOG --train 100000 --test 20000 --workers 8
+"""
+import argparse
+import logging
+import os
+import sys
+
+import numpy
+import pandas
+
+from benchmarkstore import BenchmarkStore
+from ichimoku import parameter_grid
+from ichimoku.walkforward import walk_forward
+
+
+def load_benchmark_series(store_path, start_time=numpy.datetime64('2010-01-01T09:01')):
+    store = BenchmarkStore(store_path)
+    index = pandas.DatetimeIndex(start_time + numpy.arange(len(store.data)) * numpy.timedelta64(1, 'm'))
+    return pandas.DataFrame(numpy.asarray(store.data), index=index, columns=['open', 'high', 'low', 'close'])
+
+
+def load_symbol(symbol, start=None, end=None):
+    from barstore import BarStore
+    return BarStore(os.path.sep.join(('data', 'bars'))).read_bars(symbol, start=start, end=end,
+                                                                  columns=['high', 'low', 'close'])
+
+
+def _periods(text):
+    return [int(value) for value in text.split(',')]
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s:%(name)s:%(levelname)s:%(message)s')
+    parser = argparse.ArgumentParser(description='Walk-forward optimization of the Ichimoku periods.',
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter
+                                     )
+    parser.add_argument('--symbol', default=None, help='bar store symbol, the benchmark store when omitted')
+    parser.add_argument('--start', default=None, help='first day, YYYY-MM-DD (--symbol)')
+    parser.add_argument('--end', default=None, help='last day, YYYY-MM-DD (--symbol)')
+    parser.add_argument('--store', default=os.path.sep.join(['data', 'benchmark-store']), help='benchmark store')
+    parser.add_argument('--train', type=int, required=True, help='bars per train window')
+    parser.add_argument('--test', type=int, required=True, help='bars per test window')
+    parser.add_argument('--step', type=int, default=None, help='bars between folds, --test when omitted')
+    parser.add_argument('--tenkan', type=_periods, default='7,9,12', help='comma separated tenkan periods')
+    parser.add_argument('--kijun', type=_periods, default='22,26,30', help='comma separated kijun periods')
+    parser.add_argument('--senkou', type=_periods, default='44,52,60', help='comma separated senkou periods')
+    parser.add_argument('--displacement', type=_periods, default='22,26,30', help='comma separated displacements')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='number of processes')
+    parser.add_argument('--output', default=os.path.sep.join(['data', 'walk-forward']),
+                        help='folder of the fold report and equity curve')
+    args = parser.parse_args()
+
+    if args.symbol:
+        ohlc = load_symbol(args.symbol, start=args.start, end=args.end)
+
+    else:
+        ohlc = load_benchmark_series(args.store)
+
+    grid = parameter_grid(args.tenkan, args.kijun, args.senkou, args.displacement)
+    logging.info('%d bars, %d parameter combinations', len(ohlc), len(grid))
+    report, equity = walk_forward(ohlc, grid, args.train, args.test, step=args.step, workers=args.workers)
+    os.makedirs(args.output, exist_ok=True)
+    report.to_csv(os.path.sep.join([args.output, 'folds.csv']))
+    equity.to_csv(os.path.sep.join([args.output, 'equity.csv']))
+    with pandas.option_context('display.width', 200, 'display.max_columns', 20):
+        logging.info('folds:\n%s', report)
+
+    logging.info('%d folds, out-of-sample profit %.4f, in-sample profit %.4f', len(report), equity.iloc[-1],
+                 report['train_score'].sum())
+    sys.exit(0)
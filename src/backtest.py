@@ -0,0 +1,122 @@
+"""
+Vectorized backtests of simple entry / profit target / stop strategies over many OHLC samples at once.
+
+Samples are stacked into a float64 array of shape (sample, bar, 4) holding open, high, low, close, shorter samples
+being padded with NaN.
+"""
+import numpy
+
+OPEN, HIGH, LOW, CLOSE = range(4)
+
+
+def to_grid(prices, resolution):
+    """
+    Rounds prices to the nearest float64 of a decimal grid.
+
+    :param prices: float64 array
+    :param resolution: number of decimals, None to leave prices untouched
+    :return: float64 array
+    """
+    if resolution is None:
+        return prices
+
+    return numpy.round(prices, resolution)
+
+
+def stack_samples(samples):
+    """
+    Stacks OHLC arrays of possibly different lengths, padding with NaN.
+
+    :param samples: iterable of arrays of shape (bar, 4), any dtype convertible to float64
+    :return: float64 array of shape (sample, bar, 4)
+    """
+    samples = [numpy.asarray(sample, dtype='float64') for sample in samples]
+    count_bars = max([len(sample) for sample in samples] or [0])
+    output = numpy.full((len(samples), count_bars, 4), numpy.nan)
+    for index, sample in enumerate(samples):
+        output[index, :len(sample)] = sample
+
+    return output
+
+
+def buy_high_after(bars):
+    """
+    Entry rule buying at the high of the bars-th bar.
+
+    :param bars: number of bars to wait for
+    :return: callable(ohlc) -> (entry index, entry price) arrays, one item per sample
+    """
+    def entry_rule(ohlc):
+        entry_index = numpy.full(ohlc.shape[0], bars - 1)
+        return entry_index, ohlc[:, bars - 1, HIGH]
+
+    return entry_rule
+
+
+def run_target_stop(ohlc, entry_rule, target, stop=None, resolution=None):
+    """
+    Buys according to entry_rule, then sells at the close of the first bar whose low exceeds entry + target,
+    at entry - stop (or the open when gapping through it) on the first bar whose low breaches it, or at the low of
+    the last bar otherwise.
+
+    When prices lie on a grid of resolution decimals, passing it rounds every derived price back to that grid:
+    comparisons and results then match exact decimal arithmetic.
+
+    :param ohlc: float64 array of shape (sample, bar, 4)
+    :param entry_rule: callable(ohlc) -> (entry index, entry price), see buy_high_after()
+    :param target: profit target, in price units
+    :param stop: optional stop loss, in price units
+    :param resolution: number of decimals of the price grid, None to skip rounding
+    :return: dict of arrays, one item per sample: 'target_reached', 'exit_index', 'px_sell', 'profit', 'drawdown'
+    """
+    count_samples, count_bars = ohlc.shape[:2]
+    rows = numpy.arange(count_samples)
+    entry_index, entry_price = entry_rule(ohlc)
+    px_low = ohlc[:, :, LOW]
+    after_entry = numpy.arange(count_bars)[numpy.newaxis, :] > entry_index[:, numpy.newaxis]
+    last_index = numpy.maximum((~numpy.isnan(px_low)).sum(axis=1) - 1, 0)
+
+    target_price = to_grid(entry_price + target, resolution)
+    with numpy.errstate(invalid='ignore'):
+        hits = after_entry & (px_low > target_price[:, numpy.newaxis])
+        events = hits.copy()
+        if stop is not None:
+            stop_price = to_grid(entry_price - stop, resolution)
+            events |= after_entry & (px_low < stop_price[:, numpy.newaxis])
+
+    has_event = events.any(axis=1)
+    exit_index = numpy.where(has_event, numpy.argmax(events, axis=1), last_index)
+    target_reached = has_event & hits[rows, exit_index]
+    stopped = has_event & ~target_reached
+
+    px_sell = numpy.where(target_reached, ohlc[rows, exit_index, CLOSE], px_low[rows, exit_index])
+    if stop is not None:
+        px_sell = numpy.where(stopped, numpy.minimum(ohlc[rows, exit_index, OPEN], stop_price), px_sell)
+
+    running_low = numpy.minimum.accumulate(numpy.where(after_entry, px_low, numpy.inf), axis=1)
+    drawdown = numpy.minimum(entry_price, running_low[rows, exit_index]) - entry_price
+    return {'target_reached': target_reached,
+            'exit_index': exit_index,
+            'px_sell': px_sell,
+            'profit': to_grid(px_sell - entry_price, resolution),
+            'drawdown': to_grid(drawdown, resolution)}
+
+
+def results_as_df(results, start_time, bar_duration=numpy.timedelta64(1, 'm'), names=None):
+    """
+
+    :param results: output of run_target_stop()
+    :param start_time: timestamp of the bar preceding the first bar of every sample
+    :param bar_duration:
+    :param names: optional sample labels
+    :return: pandas.DataFrame with columns 'target_reached', 'timestamp', 'px_sell', 'profit', 'drawdown'
+    """
+    import pandas
+
+    timestamps = numpy.datetime64(start_time) + (results['exit_index'] + 1) * bar_duration
+    output = pandas.DataFrame({'target_reached': results['target_reached'],
+                               'timestamp': timestamps,
+                               'px_sell': results['px_sell'],
+                               'profit': results['profit'],
+                               'drawdown': results['drawdown']}, index=names)
+    return output
@@ -0,0 +1,213 @@
+"""
+Columnar on-disk store of timestamped bars, partitioned by symbol and day.
+
+Layout::
+
+    <root>/<symbol>/meta.json
+    <root>/<symbol>/<YYYY-MM-DD>/_timestamp.npy   int64 nanoseconds, sorted
+    <root>/<symbol>/<YYYY-MM-DD>/<column>.npy     one file per column
+
+Reading a time range only opens the day partitions overlapping it, and only the requested column files, which are
+memory-mapped and sliced by binary search on the timestamps.
+"""
+import datetime
+import json
+import os
+import shutil
+
+import numpy
+import pandas
+
+_TIMESTAMP_FILE = '_timestamp.npy'
+_META_FILE = 'meta.json'
+
+
+class BarStore(object):
+
+    def __init__(self, root):
+        self.root = root
+
+    def _folder(self, symbol, day=None):
+        if day is None:
+            return os.path.sep.join([self.root, symbol])
+
+        return os.path.sep.join([self.root, symbol, day.isoformat()])
+
+    def symbols(self):
+        if not os.path.exists(self.root):
+            return []
+
+        return sorted(name for name in os.listdir(self.root)
+                      if os.path.exists(os.path.sep.join([self.root, name, _META_FILE])))
+
+    def days(self, symbol):
+        """
+
+        :param symbol:
+        :return: sorted list of datetime.date having a partition
+        """
+        folder = self._folder(symbol)
+        if not os.path.exists(folder):
+            return []
+
+        return sorted(datetime.date.fromisoformat(name) for name in os.listdir(folder)
+                      if os.path.exists(os.path.sep.join([folder, name, _TIMESTAMP_FILE])))
+
+    def metadata(self, symbol):
+        """
+
+        :param symbol:
+        :return: dict with at least 'columns', 'index_name' and 'bar_size' (seconds, None when unknown), and
+        'dtypes' for symbols written since it was added
+        """
+        with open(os.path.sep.join([self._folder(symbol), _META_FILE])) as meta_file:
+            return json.load(meta_file)
+
+    def _write_metadata(self, symbol, bars_df, metadata):
+        bar_size = metadata.pop('bar_size', None)
+        if bar_size is None and len(bars_df) > 1:
+            bar_size = float(numpy.median(numpy.diff(bars_df.index.values)) / numpy.timedelta64(1, 's'))
+
+        meta = {'symbol': symbol,
+                'columns': [str(column) for column in bars_df.columns],
+                'dtypes': _column_dtypes(bars_df),
+                'index_name': bars_df.index.name,
+                'bar_size': bar_size}
+        meta.update(metadata)
+        with open(os.path.sep.join([self._folder(symbol), _META_FILE]), 'w') as meta_file:
+            json.dump(meta, meta_file, indent=2, default=str)
+
+    def _write_partition(self, symbol, day, day_bars, dtypes=None):
+        folder = self._folder(symbol, day)
+        staging = folder + '.tmp'
+        if os.path.exists(staging):
+            shutil.rmtree(staging)
+
+        os.makedirs(staging)
+        timestamps = day_bars.index.values.astype('datetime64[ns]').view('int64')
+        numpy.save(os.path.sep.join([staging, _TIMESTAMP_FILE]), timestamps)
+        for column in day_bars.columns:
+            values = day_bars[column].values
+            if values.dtype == object:
+                values = values.astype('float64')
+
+            elif dtypes is not None:
+                values = values.astype(dtypes[str(column)], copy=False)
+
+            numpy.save(os.path.sep.join([staging, str(column) + '.npy']), values)
+
+        if os.path.exists(folder):
+            shutil.rmtree(folder)
+
+        os.replace(staging, folder)
+
+    def _read_partition(self, symbol, day, columns, start=None, end=None):
+        folder = self._folder(symbol, day)
+        timestamps = numpy.load(os.path.sep.join([folder, _TIMESTAMP_FILE]), mmap_mode='r')
+        lower = 0 if start is None else numpy.searchsorted(timestamps, start, side='left')
+        upper = len(timestamps) if end is None else numpy.searchsorted(timestamps, end, side='right')
+        values = [numpy.load(os.path.sep.join([folder, column + '.npy']), mmap_mode='r')[lower:upper]
+                  for column in columns]
+        return numpy.array(timestamps[lower:upper]), values
+
+    def write_bars(self, symbol, bars_df, **metadata):
+        """
+        Replaces every bar stored for symbol.
+
+        :param symbol:
+        :param bars_df: pandas.DataFrame indexed by timestamp
+        :param metadata: extra entries saved along, such as bar_size in seconds
+        """
+        folder = self._folder(symbol)
+        if os.path.exists(folder):
+            shutil.rmtree(folder)
+
+        os.makedirs(folder)
+        bars_df = bars_df.sort_index()
+        for day, day_bars in bars_df.groupby(bars_df.index.date):
+            self._write_partition(symbol, day, day_bars)
+
+        self._write_metadata(symbol, bars_df, metadata)
+
+    def append_bars(self, symbol, bars_df, **metadata):
+        """
+        Adds bars to symbol, only rewriting the day partitions they fall in. Bars already stored with the same
+        timestamp are replaced.
+
+        :param symbol:
+        :param bars_df: pandas.DataFrame indexed by timestamp, with the columns already stored, in any order
+        :param metadata: extra entries saved along when the symbol is created
+        :raise ValueError: when the columns differ from the stored ones, or when a column cannot be cast safely to
+        its stored dtype
+        """
+        if not os.path.exists(os.path.sep.join([self._folder(symbol), _META_FILE])):
+            return self.write_bars(symbol, bars_df, **metadata)
+
+        meta = self.metadata(symbol)
+        if sorted(str(column) for column in bars_df.columns) != sorted(meta['columns']):
+            raise ValueError('%s stores columns %s, cannot append %s' % (
+                symbol, meta['columns'], [str(column) for column in bars_df.columns]))
+
+        bars_df = bars_df[meta['columns']]
+        dtypes = meta.get('dtypes')
+        if dtypes is not None:
+            for column, dtype in _column_dtypes(bars_df).items():
+                if not numpy.can_cast(dtype, dtypes[column], casting='same_kind'):
+                    raise ValueError('%s stores %s as %s, cannot append %s' % (symbol, column, dtypes[column], dtype))
+
+        stored_days = set(self.days(symbol))
+        for day, day_bars in bars_df.groupby(bars_df.index.date):
+            if day in stored_days:
+                stored = self.read_bars(symbol, start=day, end=day)
+                day_bars = pandas.concat([stored, day_bars])
+                day_bars = day_bars[~day_bars.index.duplicated(keep='last')].sort_index()
+
+            self._write_partition(symbol, day, day_bars.sort_index(), dtypes=dtypes)
+
+    def read_bars(self, symbol, start=None, end=None, columns=None):
+        """
+
+        :param symbol:
+        :param start: first timestamp included, a datetime.date meaning the start of that day
+        :param end: last timestamp included, a datetime.date meaning the end of that day
+        :param columns: subset of columns to read, all when None
+        :return: pandas.DataFrame indexed by timestamp
+        """
+        meta = self.metadata(symbol)
+        columns = meta['columns'] if columns is None else list(columns)
+        start_ns = end_ns = None
+        days = self.days(symbol)
+        if start is not None:
+            start = pandas.Timestamp(start)
+            start_ns = start.value
+            days = [day for day in days if day >= start.date()]
+
+        if end is not None:
+            if not isinstance(end, datetime.datetime) and isinstance(end, datetime.date):
+                end = pandas.Timestamp(end) + pandas.Timedelta(days=1) - pandas.Timedelta(1, 'ns')
+
+            end = pandas.Timestamp(end)
+            end_ns = end.value
+            days = [day for day in days if day <= end.date()]
+
+        timestamps = list()
+        values = [list() for column in columns]
+        for day in days:
+            day_timestamps, day_values = self._read_partition(symbol, day, columns, start=start_ns, end=end_ns)
+            timestamps.append(day_timestamps)
+            for column_values, day_column_values in zip(values, day_values):
+                column_values.append(day_column_values)
+
+        timestamps = numpy.concatenate(timestamps or [numpy.empty(0, 'int64')])
+        index = pandas.DatetimeIndex(timestamps.view('datetime64[ns]'), name=meta.get('index_name'))
+        data = dict((column, numpy.concatenate(column_values) if column_values else numpy.empty(0))
+                    for column, column_values in zip(columns, values))
+        return pandas.DataFrame(data, index=index, columns=columns)
+
+
+def _column_dtypes(bars_df):
+    """
+    Dtypes as saved by _write_partition(), object columns being stored as float64.
+    """
+    return dict((str(column), 'float64' if dtype == object else str(dtype))
+                for column, dtype in bars_df.dtypes.items())
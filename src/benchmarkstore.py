@@ -0,0 +1,160 @@
+"""
+Consolidated, memory-mapped store of OHLC benchmark samples.
+
+All samples live back to back in a single raw float64 file of shape (bar, 4) holding open, high, low, close,
+next to an index of (start, length) rows, one per sample. Opening the store maps the data file, so that reading
+a sample is a zero-copy slice and does not depend on how many samples are stored.
+"""
+import os
+
+import numpy
+
+_DATA_FILE = 'ohlc.f8'
+_INDEX_FILE = 'index.npy'
+_FIELDS = 4
+
+
+class BenchmarkStoreWriter(object):
+    """
+    Appends samples to a store, creating it when missing. The index is only written by close().
+    """
+
+    def __init__(self, path):
+        self.path = path
+        if not os.path.exists(path):
+            os.makedirs(path)
+
+        index_path = os.path.join(path, _INDEX_FILE)
+        if os.path.exists(index_path):
+            self._index = numpy.load(index_path).tolist()
+
+        else:
+            self._index = list()
+
+        data_path = os.path.join(path, _DATA_FILE)
+        self._offset = sum(length for start, length in self._index)
+        self._sample_length = 0
+        self._data_file = open(data_path, 'r+b' if os.path.exists(data_path) else 'wb')
+        # drops anything written after the last indexed sample
+        self._data_file.truncate(self._offset * _FIELDS * 8)
+        self._data_file.seek(self._offset * _FIELDS * 8)
+
+    def extend(self, rows):
+        """
+        Streams rows into the sample being built, see finish_sample().
+
+        :param rows: array of shape (bar, 4), any dtype convertible to float64
+        """
+        rows = numpy.ascontiguousarray(rows, dtype='float64')
+        self._data_file.write(rows.tobytes())
+        self._sample_length += rows.shape[0]
+
+    def finish_sample(self):
+        """
+        Records the rows streamed since the previous sample as a new sample.
+
+        :return: index of the new sample
+        """
+        if not self._sample_length:
+            raise ValueError('no rows streamed since the previous sample of %s' % self.path)
+
+        self._index.append((self._offset, self._sample_length))
+        self._offset += self._sample_length
+        self._sample_length = 0
+        return len(self._index) - 1
+
+    def append(self, sample):
+        """
+
+        :param sample: array of shape (bar, 4), any dtype convertible to float64
+        :return: index of the new sample
+        """
+        self.extend(sample)
+        return self.finish_sample()
+
+    def close(self):
+        self._data_file.close()
+        index_path = os.path.join(self.path, _INDEX_FILE)
+        with open(index_path + '.tmp', 'wb') as index_file:
+            numpy.save(index_file, numpy.array(self._index, dtype='int64').reshape(-1, 2))
+
+        os.replace(index_path + '.tmp', index_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class BenchmarkStore(object):
+    """
+    Read-only view over a store written by BenchmarkStoreWriter.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.index = numpy.load(os.path.join(path, _INDEX_FILE))
+        count_bars = int(self.index[:, 1].sum())
+        if count_bars:
+            self.data = numpy.memmap(os.path.join(path, _DATA_FILE), dtype='float64', mode='r',
+                                     shape=(count_bars, _FIELDS))
+
+        else:
+            self.data = numpy.empty((0, _FIELDS))
+
+    def __len__(self):
+        return self.index.shape[0]
+
+    def __getitem__(self, sample_index):
+        """
+
+        :param sample_index:
+        :return: zero-copy float64 view of shape (bar, 4)
+        """
+        start, length = self.index[sample_index]
+        return self.data[start:start + length]
+
+    def random_sample(self, rng=None):
+        """
+
+        :param rng: numpy.random.Generator, a fresh one when None
+        :return: zero-copy float64 view of shape (bar, 4)
+        """
+        if rng is None:
+            rng = numpy.random.default_rng()
+
+        return self[rng.integers(len(self))]
+
+    def stacked(self, sample_indices=None):
+        """
+        Samples stacked as expected by the backtest module, padded with NaN.
+
+        :param sample_indices: defaults to every sample
+        :return: float64 array of shape (sample, bar, 4)
+        """
+        if sample_indices is None:
+            sample_indices = numpy.arange(len(self))
+
+        lengths = self.index[numpy.asarray(sample_indices, dtype='int64'), 1]
+        output = numpy.full((len(lengths), int(lengths.max(initial=0)), _FIELDS), numpy.nan)
+        for row, sample_index in enumerate(sample_indices):
+            sample = self[sample_index]
+            output[row, :len(sample)] = sample
+
+        return output
+
+
+def build_store(path, sample_paths):
+    """
+    Consolidates numpy.save files into a store, one sample per file.
+
+    :param path: store directory
+    :param sample_paths: files holding (bar, 4) arrays
+    :return: number of samples written
+    """
+    with BenchmarkStoreWriter(path) as writer:
+        for sample_path in sample_paths:
+            writer.append(numpy.load(sample_path, allow_pickle=True))
+
+    return len(sample_paths)
@@ -12,87 +12,90 @@ at a high probability buying opportunity (opposite applies for sell trades):
 - Lagging line is above price action from 26 periods ago (above the cloud is the additional filter)
 
 - Kumo ahead of price is bullish and rising.
+
+Functions taking a DataFrame import pandas when called: the array API (components_panel, rules_1_masks,
+IchimokuState, trade_spans) works without it.
 """
 import numpy
-import pandas
+
+import instrument
+from ichimoku.panel import components_panel
+from ichimoku.rules import rules_1_masks
+from ichimoku.streaming import IchimokuState, RulesPanelState
+from ichimoku.optimize import parameter_grid, sweep
+from ichimoku.trades import signal_regimes, trade_spans
+from ichimoku.walkforward import walk_forward
 
 
-def tenkan_sen(ohlc_df):
-    rolling = ohlc_df.rolling(window=9)
+def tenkan_sen(ohlc_df, window=9):
+    rolling = ohlc_df.rolling(window=window)
     lowest_low = rolling['low'].min()
     highest_high = rolling['high'].max()
     output = (highest_high + lowest_low) / 2
     return output.astype('float64')
 
 
-def kijun_sen(ohlc_df):
-    rolling = ohlc_df.rolling(window=26)
+def kijun_sen(ohlc_df, window=26):
+    rolling = ohlc_df.rolling(window=window)
     lowest_low = rolling['low'].min()
     highest_high = rolling['high'].max()
     output = (highest_high + lowest_low) / 2
     return output.astype('float64')
 
 
-def senkou_span_a(ts, ks):
-    output = (ts.shift(26) + ks.shift(26)) / 2
+def senkou_span_a(ts, ks, displacement=26):
+    output = (ts.shift(displacement) + ks.shift(displacement)) / 2
     return output
 
 
-def senkou_span_b(ohlc_df):
-    rolling = ohlc_df.rolling(window=52)
+def senkou_span_b(ohlc_df, window=52, displacement=26):
+    rolling = ohlc_df.rolling(window=window)
     lowest_low = rolling['low'].min()
     highest_high = rolling['high'].max()
     output = (highest_high + lowest_low) / 2
-    return output.astype('float64').shift(26)
+    return output.astype('float64').shift(displacement)
 
 
-def components(ohlc_df):
+@instrument.timed('ichimoku.components')
+def components(ohlc_df, tenkan=9, kijun=26, senkou=52, displacement=26):
     """
 
     :param ohlc_df:
+    :param tenkan: tenkan-sen window
+    :param kijun: kijun-sen window
+    :param senkou: senkou-span-b window
+    :param displacement: forward shift of the senkou spans and backward shift of the chikou
     :return: pandas.DataFrame ('tenkan-sen', 'kijun-sen', 'senkou-span-a', 'senkou-span-b', 'chikou') indexed by timestamp
     """
-    extension = ohlc_df.index.values[-1] + numpy.diff(ohlc_df.index.values)[-1] * numpy.arange(start=1, stop=26)
-    ohlc_df_extended = ohlc_df.append(pandas.DataFrame(index=extension))
-    ts = tenkan_sen(ohlc_df_extended)
-    ks = kijun_sen(ohlc_df_extended)
-    ssa = senkou_span_a(ts, ks)
-    ssb = senkou_span_b(ohlc_df_extended)
-    chikou = ohlc_df_extended['close'].astype('float64').shift(-26)
+    import pandas
+
+    instrument.count('bars_processed', len(ohlc_df))
+    extension = ohlc_df.index.values[-1] + numpy.diff(ohlc_df.index.values)[-1] * numpy.arange(start=1, stop=displacement)
+    ohlc_df_extended = ohlc_df.reindex(ohlc_df.index.append(pandas.Index(extension)))
+    ts = tenkan_sen(ohlc_df_extended, window=tenkan)
+    ks = kijun_sen(ohlc_df_extended, window=kijun)
+    ssa = senkou_span_a(ts, ks, displacement=displacement)
+    ssb = senkou_span_b(ohlc_df_extended, window=senkou, displacement=displacement)
+    chikou = ohlc_df_extended['close'].astype('float64').shift(-displacement)
     output = pandas.concat([ts, ks, ssa, ssb, chikou], axis=1)
     output.columns = ['tenkan-sen', 'kijun-sen', 'senkou-span-a', 'senkou-span-b', 'chikou']
     return output
 
 
-def long_short_rules_1(ohlc_df):
+@instrument.timed('ichimoku.long_short_rules_1')
+def long_short_rules_1(ohlc_df, ichimoku_components=None, displacement=26):
     """
 
     :param ohlc_df:
-    :return:
+    :param ichimoku_components: optional precomputed components, as returned by components_panel()
+    :param displacement: displacement the components were computed with
+    :return: (long trades, short trades, long open, short open) where trades are arrays of (entry, exit)
+    timestamps and open are boolean arrays flagging the trades still open on the last bar, see trade_spans()
     """
-    ichimoku_components = components(ohlc_df)
-    mid_prices = (ohlc_df['high'] + ohlc_df['low']) / 2
-    kumo_top = ichimoku_components[['senkou-span-a', 'senkou-span-b']].max(axis=1)
-    kumo_bottom = ichimoku_components[['senkou-span-a', 'senkou-span-b']].min(axis=1)
-
-    prices_above_kumo = (ohlc_df['close'].astype(numpy.float64) - kumo_top) >= 0
-    tenkan_above_kijun = ichimoku_components['tenkan-sen'] >= ichimoku_components['kijun-sen']
-    chikou_above_lagged_price = (mid_prices.astype(numpy.float64) - ichimoku_components['chikou']).shift(26) >= 0
-    kumo_ahead_bullish = (ichimoku_components['senkou-span-a'] - ichimoku_components['senkou-span-b']).shift(-26) >= 0
-    bullish = prices_above_kumo & tenkan_above_kijun & chikou_above_lagged_price & kumo_ahead_bullish
-
-    prices_below_kumo = (ohlc_df['close'].astype(numpy.float64) - kumo_bottom) < 0
-    tenkan_below_kijun = ichimoku_components['tenkan-sen'] < ichimoku_components['kijun-sen']
-    chikou_below_lagged_price = (mid_prices.astype(numpy.float64) - ichimoku_components['chikou']).shift(26) < 0
-    kumo_ahead_bearish = (ichimoku_components['senkou-span-a'] - ichimoku_components['senkou-span-b']).shift(-26) < 0
-    bearish = prices_below_kumo & tenkan_below_kijun & chikou_below_lagged_price & kumo_ahead_bearish
-
-    longs = bullish.map(lambda value: (0, 1)[value])
-    shorts = bearish.map(lambda value: (0, -1)[value])
-    long_diffs = longs.diff()
-    short_diffs = shorts.diff()
-    long_diffs_clean = long_diffs[long_diffs != 0].dropna()
-    short_diffs_clean = short_diffs[short_diffs != 0].dropna()
-    long_trades = numpy.dstack([long_diffs_clean[::2].index.values, long_diffs_clean[1::2].index.values])
-    short_trades = numpy.dstack([short_diffs_clean[::2].index.values, short_diffs_clean[1::2].index.values])
-    return long_trades[0], short_trades[0]
\ No newline at end of file
+    bullish, bearish = rules_1_masks(ohlc_df['high'].values, ohlc_df['low'].values, ohlc_df['close'].values,
+                                     ichimoku_components=ichimoku_components, displacement=displacement)
+    long_trades, long_open = trade_spans(bullish, ohlc_df.index.values)
+    short_trades, short_open = trade_spans(bearish, ohlc_df.index.values)
+    instrument.count('bars_processed', len(ohlc_df))
+    instrument.count('signals_emitted', len(long_trades) + len(short_trades))
+    return long_trades, short_trades, long_open, short_open
@@ -0,0 +1,176 @@
+"""
+Parameter sweeps over the Ichimoku periods (tenkan, kijun, senkou, displacement).
+
+Rolling mid ranges only depend on the window length, so they are cached per window and shared by every
+combination using it. Combinations can be fanned out over a process pool, the input prices being published
+once through shared memory.
+"""
+import itertools
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy
+
+import instrument
+from ichimoku.panel import assemble_components, rolling_mid_range
+from ichimoku.rules import rules_1_masks
+
+DEFAULT_CACHE_BYTES = 512 * 1024 * 1024
+
+_worker_prices = None
+_worker_cache = None
+
+
+class MidRangeCache(object):
+    """
+    Rolling mid ranges keyed by window length, evicted in least recently used order beyond max_bytes.
+    """
+
+    def __init__(self, high, low, max_bytes=DEFAULT_CACHE_BYTES):
+        self.high = high
+        self.low = low
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._mid_ranges = OrderedDict()
+        self._size_bytes = 0
+
+    def get(self, window):
+        mid_range = self._mid_ranges.get(window)
+        if mid_range is not None:
+            self._mid_ranges.move_to_end(window)
+            self.hits += 1
+            return mid_range
+
+        self.misses += 1
+        mid_range = rolling_mid_range(self.high, self.low, window)
+        self._mid_ranges[window] = mid_range
+        self._size_bytes += mid_range.nbytes
+        while self._size_bytes > self.max_bytes and len(self._mid_ranges) > 1:
+            evicted_window, evicted = self._mid_ranges.popitem(last=False)
+            self._size_bytes -= evicted.nbytes
+
+        return mid_range
+
+
+def parameter_grid(tenkan=(9,), kijun=(26,), senkou=(52,), displacement=(26,)):
+    """
+
+    :return: list of (tenkan, kijun, senkou, displacement) tuples, cartesian product of the inputs
+    """
+    return list(itertools.product(tenkan, kijun, senkou, displacement))
+
+
+def long_short_pnl(bullish, bearish, close):
+    """
+    Default sweep score: close to close profit of being long on bullish bars and short on bearish bars.
+
+    :param bullish: boolean array
+    :param bearish: boolean array
+    :param close: float64 array
+    :return: float
+    """
+    position = bullish.astype('int8') - bearish.astype('int8')
+    return float(numpy.nansum(position[:-1] * numpy.diff(close)))
+
+
+def evaluate(cache, close, parameters, score=long_short_pnl):
+    """
+
+    :param cache: MidRangeCache over the high and low prices
+    :param close: float64 array
+    :param parameters: (tenkan, kijun, senkou, displacement)
+    :param score: callable(bullish, bearish, close)
+    :return: score of the rules evaluated with these parameters
+    """
+    tenkan, kijun, senkou, displacement = parameters
+    ichimoku_components = assemble_components(cache.get(tenkan), cache.get(kijun), cache.get(senkou), close,
+                                              displacement=displacement)
+    bullish, bearish = rules_1_masks(cache.high, cache.low, close, ichimoku_components=ichimoku_components,
+                                     displacement=displacement)
+    return score(bullish, bearish, close)
+
+
+def attach_prices(shared_name, shape, max_cache_bytes):
+    """
+    Process pool initializer mapping the prices published by map_grid(), see worker_state().
+    """
+    global _worker_prices, _worker_cache
+    memory = shared_memory.SharedMemory(name=shared_name)
+    prices = numpy.ndarray(shape, dtype='float64', buffer=memory.buf)
+    _worker_prices = (memory, prices)
+    _worker_cache = MidRangeCache(prices[0], prices[1], max_bytes=max_cache_bytes)
+
+
+def worker_state():
+    """
+
+    :return: (close, MidRangeCache) of the current worker process
+    """
+    memory, prices = _worker_prices
+    return prices[2], _worker_cache
+
+
+def map_grid(prices, grid, evaluate_chunk, args=(), workers=2, max_cache_bytes=DEFAULT_CACHE_BYTES):
+    """
+    Fans a parameter grid out to a process pool in one chunk per worker, the prices being published once through
+    shared memory.
+
+    :param prices: float64 array of shape (3, bar) holding high, low and close
+    :param grid: list of parameter combinations
+    :param evaluate_chunk: picklable callable(chunk, *args) returning one result per combination, run in the
+    workers where worker_state() gives the prices
+    :param args: extra arguments of evaluate_chunk
+    :param workers: number of processes
+    :param max_cache_bytes: rolling mid range cache budget, per process
+    :return: list of the results in grid order
+    """
+    memory = shared_memory.SharedMemory(create=True, size=prices.nbytes)
+    try:
+        numpy.ndarray(prices.shape, dtype='float64', buffer=memory.buf)[:] = prices
+        chunk_size = -(-len(grid) // workers)
+        chunks = [grid[start:start + chunk_size] for start in range(0, len(grid), chunk_size)]
+        with ProcessPoolExecutor(max_workers=workers, initializer=attach_prices,
+                                 initargs=(memory.name, prices.shape, max_cache_bytes)) as executor:
+            return list(itertools.chain.from_iterable(
+                executor.map(evaluate_chunk, chunks, *[itertools.repeat(arg) for arg in args])))
+
+    finally:
+        memory.close()
+        memory.unlink()
+
+
+def _evaluate_chunk(chunk, score):
+    close, cache = worker_state()
+    return [evaluate(cache, close, parameters, score=score) for parameters in chunk]
+
+
+@instrument.timed('ichimoku.sweep')
+def sweep(ohlc, grid, score=long_short_pnl, workers=1, max_cache_bytes=DEFAULT_CACHE_BYTES):
+    """
+    Evaluates long_short_rules_1 over many Ichimoku parameter combinations.
+
+    :param ohlc: pandas.DataFrame with 'high', 'low', 'close' columns
+    :param grid: iterable of (tenkan, kijun, senkou, displacement), see parameter_grid()
+    :param score: picklable callable(bullish, bearish, close) returning the value to record
+    :param workers: number of processes
+    :param max_cache_bytes: rolling mid range cache budget, per process
+    :return: pandas.DataFrame with columns 'tenkan', 'kijun', 'senkou', 'displacement', 'score'
+    """
+    import pandas
+
+    # sorting keeps combinations sharing windows together, so that each worker chunk reuses its cache
+    grid = sorted(grid)
+    prices = numpy.stack([ohlc[name].values.astype('float64') for name in ('high', 'low', 'close')])
+    if workers > 1 and len(grid) > 1:
+        scores = map_grid(prices, grid, _evaluate_chunk, args=(score,), workers=workers,
+                          max_cache_bytes=max_cache_bytes)
+
+    else:
+        cache = MidRangeCache(prices[0], prices[1], max_bytes=max_cache_bytes)
+        scores = [evaluate(cache, prices[2], parameters, score=score) for parameters in grid]
+
+    output = pandas.DataFrame(grid, columns=['tenkan', 'kijun', 'senkou', 'displacement'])
+    output['score'] = scores
+    return output
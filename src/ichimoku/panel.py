@@ -0,0 +1,137 @@
+"""
+Ichimoku components for a whole universe at once, over aligned (time x symbol) arrays.
+"""
+import numpy
+
+import instrument
+
+COMPONENT_NAMES = ['tenkan-sen', 'kijun-sen', 'senkou-span-a', 'senkou-span-b', 'chikou']
+
+
+def shift(values, periods):
+    """
+    Shifts along the time axis, filling with NaN (same convention as pandas.DataFrame.shift).
+
+    :param values: float64 array, time along axis 0
+    :param periods: positive to lag, negative to lead
+    :return: new array of the same shape
+    """
+    output = numpy.full(values.shape, numpy.nan)
+    if periods >= 0:
+        output[periods:] = values[:values.shape[0] - periods]
+
+    else:
+        output[:periods] = values[-periods:]
+
+    return output
+
+
+def rolling_extremum(values, window, ufunc):
+    """
+    Sliding window maximum or minimum along axis 0 (van Herk / Gil-Werman).
+
+    The series is cut into blocks of window length: a window always spans the suffix of one block and the prefix
+    of the next, so that two cumulative passes give every extremum in O(n) whatever the window.
+
+    :param values: float64 array, time along axis 0, at least window long
+    :param window:
+    :param ufunc: numpy.maximum or numpy.minimum
+    :return: array of length len(values) - window + 1, where item i covers values[i:i + window]
+    """
+    count = values.shape[0]
+    count_blocks = -(-count // window)
+    padding = numpy.full((count_blocks * window - count,) + values.shape[1:], numpy.nan)
+    blocks = numpy.concatenate((values, padding)).reshape((count_blocks, window) + values.shape[1:])
+    prefix = ufunc.accumulate(blocks, axis=1).reshape((-1,) + values.shape[1:])
+    suffix = ufunc.accumulate(blocks[:, ::-1], axis=1)[:, ::-1].reshape((-1,) + values.shape[1:])
+    return ufunc(suffix[:count - window + 1], prefix[window - 1:count])
+
+
+def rolling_mid_range(high, low, window):
+    """
+    (highest high + lowest low) / 2 over a sliding window along axis 0, NaN until the window is full.
+
+    :param high: float64 array, time along axis 0
+    :param low: float64 array, time along axis 0
+    :param window:
+    :return: float64 array of the same shape
+    """
+    output = numpy.full(high.shape, numpy.nan)
+    if high.shape[0] >= window:
+        highest_high = rolling_extremum(high, window, numpy.maximum)
+        lowest_low = rolling_extremum(low, window, numpy.minimum)
+        output[window - 1:] = (highest_high + lowest_low) / 2
+
+    return output
+
+
+def panel_columns(ohlc_panel_df, field):
+    """
+    Extracts one field from a frame whose columns are a MultiIndex containing ('high', 'low', 'close').
+
+    :param ohlc_panel_df: pandas.DataFrame with MultiIndex columns, either (symbol, field) or (field, symbol)
+    :param field:
+    :return: pandas.DataFrame indexed by timestamp, one column per symbol
+    """
+    for level in range(ohlc_panel_df.columns.nlevels):
+        if field in ohlc_panel_df.columns.get_level_values(level):
+            return ohlc_panel_df.xs(field, axis=1, level=level)
+
+    raise KeyError('field not found in columns: %s' % field)
+
+
+def assemble_components(tenkan_mid, kijun_mid, senkou_mid, close, displacement=26):
+    """
+    Builds the components array out of the rolling mid ranges, extending the time axis by displacement - 1 bars
+    like components() does.
+
+    :param tenkan_mid: rolling mid range over the tenkan-sen window
+    :param kijun_mid: rolling mid range over the kijun-sen window
+    :param senkou_mid: rolling mid range over the senkou-span-b window
+    :param close: float64 array, time along axis 0
+    :param displacement:
+    :return: float64 array of shape (component, time + displacement - 1, ...)
+    :raise ValueError: when displacement is below 1
+    """
+    if displacement < 1:
+        raise ValueError('displacement must be at least 1, got %s' % displacement)
+
+    extension = numpy.full((displacement - 1,) + close.shape[1:], numpy.nan)
+    ts = numpy.concatenate((tenkan_mid, extension))
+    ks = numpy.concatenate((kijun_mid, extension))
+    ssa = shift((ts + ks) / 2, displacement)
+    ssb = shift(numpy.concatenate((senkou_mid, extension)), displacement)
+    chikou = shift(numpy.concatenate((close, extension)), -displacement)
+    return numpy.stack([ts, ks, ssa, ssb, chikou])
+
+
+@instrument.timed('ichimoku.components_panel')
+def components_panel(high, low=None, close=None, tenkan=9, kijun=26, senkou=52, displacement=26):
+    """
+    Batched counterpart of ichimoku.components().
+
+    Accepts either three aligned 2-D float64 arrays or a single frame with MultiIndex columns, in which case
+    the symbols follow the column order of ohlc_panel_df.xs('high', ...).
+
+    :param high: 2-D array (time x symbol) or MultiIndex-column pandas.DataFrame
+    :param low: 2-D array (time x symbol)
+    :param close: 2-D array (time x symbol)
+    :param tenkan: tenkan-sen window
+    :param kijun: kijun-sen window
+    :param senkou: senkou-span-b window
+    :param displacement: forward shift of the senkou spans and backward shift of the chikou
+    :return: float64 array of shape (component, time + displacement - 1, symbol), components ordered as
+    COMPONENT_NAMES
+    """
+    if low is None and close is None:
+        ohlc_panel_df = high
+        high, low, close = [panel_columns(ohlc_panel_df, field).values for field in ('high', 'low', 'close')]
+
+    high = numpy.asarray(high, dtype='float64')
+    low = numpy.asarray(low, dtype='float64')
+    close = numpy.asarray(close, dtype='float64')
+    instrument.count('bars_processed', close.size)
+    return assemble_components(rolling_mid_range(high, low, tenkan),
+                               rolling_mid_range(high, low, kijun),
+                               rolling_mid_range(high, low, senkou),
+                               close, displacement=displacement)
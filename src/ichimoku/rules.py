@@ -0,0 +1,58 @@
+"""
+Fused evaluation of the Ichimoku trading rules over raw NumPy buffers.
+"""
+import numpy
+
+from ichimoku.panel import components_panel
+
+
+def rules_1_masks(high, low, close, ichimoku_components=None, displacement=26):
+    """
+    Bullish and bearish masks of long_short_rules_1, each derived quantity being computed only once.
+
+    Works on 1-D series as well as on (time x symbol) arrays.
+
+    :param high: float64 array, time along axis 0
+    :param low: float64 array, time along axis 0
+    :param close: float64 array, time along axis 0
+    :param ichimoku_components: optional precomputed components, as returned by components_panel() or
+    components().values.T
+    :param displacement: displacement the components are computed with
+    :return: (bullish, bearish) boolean arrays shaped like close
+    """
+    high = numpy.asarray(high, dtype='float64')
+    low = numpy.asarray(low, dtype='float64')
+    close = numpy.asarray(close, dtype='float64')
+    if ichimoku_components is None:
+        ichimoku_components = components_panel(high, low, close, displacement=displacement)
+
+    count = close.shape[0]
+    ts, ks, ssa, ssb, chikou = ichimoku_components
+    extended_count = ssa.shape[0]
+
+    # lagging line: (mid - chikou) observed displacement bars earlier
+    chikou_gap = numpy.full(close.shape, numpy.nan)
+    lagged = count - displacement
+    if lagged > 0:
+        chikou_gap[displacement:] = (high[:lagged] + low[:lagged]) / 2 - chikou[:lagged]
+
+    # kumo ahead: (span a - span b) observed displacement bars later
+    kumo_gap = numpy.full(close.shape, numpy.nan)
+    ahead = max(0, min(count, extended_count - displacement))
+    kumo_gap[:ahead] = ssa[displacement:displacement + ahead] - ssb[displacement:displacement + ahead]
+
+    ssa = ssa[:count]
+    ssb = ssb[:count]
+    ts = ts[:count]
+    ks = ks[:count]
+
+    bullish = close >= numpy.fmax(ssa, ssb)
+    bullish &= ts >= ks
+    bullish &= chikou_gap >= 0
+    bullish &= kumo_gap >= 0
+
+    bearish = close < numpy.fmin(ssa, ssb)
+    bearish &= ts < ks
+    bearish &= chikou_gap < 0
+    bearish &= kumo_gap < 0
+    return bullish, bearish
@@ -0,0 +1,244 @@
+"""
+Incremental Ichimoku components, updated bar by bar in O(1) amortized time.
+"""
+from collections import deque, namedtuple
+
+import numpy
+
+IchimokuValues = namedtuple('IchimokuValues', ['tenkan_sen', 'kijun_sen', 'senkou_span_a', 'senkou_span_b', 'chikou'])
+
+
+class RollingExtremum(object):
+    """
+    Sliding window maximum (or minimum) backed by a monotonic deque.
+
+    Like pandas rolling windows and panel.rolling_extremum(), a NaN makes the extremum NaN as long as it is in the
+    window.
+    """
+
+    def __init__(self, window, is_max=True):
+        self.window = window
+        self.is_max = is_max
+        self._candidates = deque()
+        self._count = 0
+        self._last_nan = None
+
+    def update(self, value):
+        """
+
+        :param value: latest observation
+        :return: extremum over the last window observations, None until the window is full
+        """
+        candidates = self._candidates
+        if value != value:
+            self._last_nan = self._count
+
+        elif self.is_max:
+            while candidates and candidates[-1][1] <= value:
+                candidates.pop()
+
+            candidates.append((self._count, value))
+
+        else:
+            while candidates and candidates[-1][1] >= value:
+                candidates.pop()
+
+            candidates.append((self._count, value))
+
+        if candidates and candidates[0][0] <= self._count - self.window:
+            candidates.popleft()
+
+        self._count += 1
+        if self._count < self.window:
+            return None
+
+        if self._last_nan is not None and self._last_nan >= self._count - self.window:
+            return float('nan')
+
+        return candidates[0][1]
+
+
+class RollingMidRange(object):
+    """
+    (highest high + lowest low) / 2 over a sliding window.
+    """
+
+    def __init__(self, window):
+        self._highest = RollingExtremum(window, is_max=True)
+        self._lowest = RollingExtremum(window, is_max=False)
+
+    def update(self, px_high, px_low):
+        highest_high = self._highest.update(px_high)
+        lowest_low = self._lowest.update(px_low)
+        if highest_high is None:
+            return None
+
+        return (highest_high + lowest_low) / 2
+
+
+class IchimokuState(object):
+    """
+    Streaming counterpart of ichimoku.components().
+
+    Each call to update() returns the row components() would produce for the new bar, except for the chikou span
+    which looks into the future: the returned chikou is the value of the bar displacement periods back, that is the
+    current close.
+    """
+
+    def __init__(self, tenkan=9, kijun=26, senkou=52, displacement=26):
+        self.displacement = displacement
+        self._tenkan = RollingMidRange(tenkan)
+        self._kijun = RollingMidRange(kijun)
+        self._senkou = RollingMidRange(senkou)
+        self._pending_span_a = deque(maxlen=displacement)
+        self._pending_span_b = deque(maxlen=displacement)
+        self.count = 0
+
+    @classmethod
+    def from_frame(cls, ohlc_df, **periods):
+        """
+        Warm start from historical bars.
+
+        :param ohlc_df: pandas.DataFrame with 'open', 'high', 'low', 'close' columns
+        :param periods: keyword arguments forwarded to the constructor
+        :return: IchimokuState ready for the next bar
+        """
+        state = cls(**periods)
+        columns = [ohlc_df[name].astype('float64').values for name in ('open', 'high', 'low', 'close')]
+        for px_open, px_high, px_low, px_close in zip(*columns):
+            state.update(px_open, px_high, px_low, px_close)
+
+        return state
+
+    def update(self, px_open, px_high, px_low, px_close):
+        """
+
+        :param px_open:
+        :param px_high:
+        :param px_low:
+        :param px_close:
+        :return: IchimokuValues, NaN where not enough bars have been seen yet
+        """
+        px_high = float(px_high)
+        px_low = float(px_low)
+        ts = self._tenkan.update(px_high, px_low)
+        ks = self._kijun.update(px_high, px_low)
+        mid_senkou = self._senkou.update(px_high, px_low)
+
+        span_a = span_b = chikou = float('nan')
+        if len(self._pending_span_a) == self.displacement:
+            span_a = self._pending_span_a[0]
+            span_b = self._pending_span_b[0]
+            chikou = float(px_close)
+
+        self._pending_span_a.append(float('nan') if ts is None or ks is None else (ts + ks) / 2)
+        self._pending_span_b.append(float('nan') if mid_senkou is None else mid_senkou)
+        self.count += 1
+        return IchimokuValues(float('nan') if ts is None else ts,
+                              float('nan') if ks is None else ks,
+                              span_a, span_b, chikou)
+
+
+class RulesPanelState(object):
+    """
+    Incremental long_short_rules_1 over many symbols, every tick updating the symbols it has bars for at once.
+
+    Each symbol keeps ring buffers of its recent highs and lows and of the values the rules need displacement bars
+    later, so that an update costs O(window) vectorized work across symbols. The masks of a bar are those
+    rules_1_masks() gives for it once the following bar is known, since the offline kumo ahead term is not
+    available on the last bar of a series.
+    """
+
+    def __init__(self, symbols=0, tenkan=9, kijun=26, senkou=52, displacement=26):
+        self.windows = (tenkan, kijun, senkou)
+        self.displacement = displacement
+        self._depth = max(self.windows)
+        self._high = numpy.full((self._depth, symbols), numpy.nan)
+        self._low = numpy.full((self._depth, symbols), numpy.nan)
+        # span a, span b and mid price, consumed displacement bars later
+        self._pending = numpy.full((3, displacement, symbols), numpy.nan)
+        self.count = numpy.zeros(symbols, dtype='int64')
+
+    @property
+    def symbols(self):
+        return len(self.count)
+
+    def add_symbols(self, count):
+        """
+
+        :param count: number of symbols to add
+        :return: column of the first new symbol
+        """
+        first = self.symbols
+        self._high = numpy.concatenate((self._high, numpy.full((self._depth, count), numpy.nan)), axis=1)
+        self._low = numpy.concatenate((self._low, numpy.full((self._depth, count), numpy.nan)), axis=1)
+        self._pending = numpy.concatenate((self._pending, numpy.full((3, self.displacement, count), numpy.nan)),
+                                          axis=2)
+        self.count = numpy.concatenate((self.count, numpy.zeros(count, dtype='int64')))
+        return first
+
+    def _mid_range(self, columns, counts, window):
+        rows = (counts[numpy.newaxis, :] - numpy.arange(window)[:, numpy.newaxis]) % self._depth
+        output = (self._high[rows, columns].max(axis=0) + self._low[rows, columns].min(axis=0)) / 2
+        output[counts < window - 1] = numpy.nan
+        return output
+
+    def _aligned_mid_range(self, high, low, count, window):
+        """
+        Fast path for symbols sharing the same bar count: the window is one or two slices of the ring, rows not
+        written yet holding NaN.
+        """
+        end = count % self._depth + 1
+        start = end - window
+        if start >= 0:
+            return (high[start:end].max(axis=0) + low[start:end].min(axis=0)) / 2
+
+        highest_high = numpy.maximum(high[start:].max(axis=0), high[:end].max(axis=0))
+        lowest_low = numpy.minimum(low[start:].min(axis=0), low[:end].min(axis=0))
+        return (highest_high + lowest_low) / 2
+
+    def update(self, columns, px_high, px_low, px_close):
+        """
+
+        :param columns: int64 array of the symbols having a new bar, each at most once
+        :param px_high: float64 array aligned with columns
+        :param px_low: float64 array aligned with columns
+        :param px_close: float64 array aligned with columns
+        :return: (bullish, bearish) boolean arrays aligned with columns
+        """
+        columns = numpy.asarray(columns, dtype='int64')
+        px_high = numpy.asarray(px_high, dtype='float64')
+        px_low = numpy.asarray(px_low, dtype='float64')
+        px_close = numpy.asarray(px_close, dtype='float64')
+        counts = self.count[columns]
+        self._high[counts % self._depth, columns] = px_high
+        self._low[counts % self._depth, columns] = px_low
+        if len(counts) and (counts == counts[0]).all():
+            every_symbol = len(columns) == self.symbols and (columns == numpy.arange(self.symbols)).all()
+            high = self._high if every_symbol else self._high[:, columns]
+            low = self._low if every_symbol else self._low[:, columns]
+            ts, ks, senkou_mid = [self._aligned_mid_range(high, low, int(counts[0]), window)
+                                  for window in self.windows]
+
+        else:
+            ts, ks, senkou_mid = [self._mid_range(columns, counts, window) for window in self.windows]
+
+        # values stored displacement bars ago, NaN until then
+        slots = counts % self.displacement
+        span_a, span_b, lagged_mid = self._pending[:, slots, columns]
+        span_a[counts < self.displacement] = numpy.nan
+        self._pending[:, slots, columns] = ((ts + ks) / 2, senkou_mid, (px_high + px_low) / 2)
+        self.count[columns] = counts + 1
+
+        chikou_gap = lagged_mid - px_close
+        kumo_gap = (ts + ks) / 2 - senkou_mid
+        bullish = px_close >= numpy.fmax(span_a, span_b)
+        bullish &= ts >= ks
+        bullish &= chikou_gap >= 0
+        bullish &= kumo_gap >= 0
+
+        bearish = px_close < numpy.fmin(span_a, span_b)
+        bearish &= ts < ks
+        bearish &= chikou_gap < 0
+        bearish &= kumo_gap < 0
+        return bullish, bearish
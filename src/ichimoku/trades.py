@@ -0,0 +1,38 @@
+"""
+Conversion of boolean regime signals into trades.
+
+A trade spans the bars of one regime: it enters on the first bar of the regime and exits on its last bar, whether
+the regime ends before the last bar of the signal or is still active on it. The latter trades are reported as open,
+their exit being where they are marked rather than where they are closed.
+"""
+import numpy
+
+
+def signal_regimes(signal):
+    """
+    Run-length encodes a boolean signal into its True regimes, in linear time.
+
+    :param signal: boolean array-like
+    :return: (entries, exits, is_open) where entries and exits are int64 bar indices of the first and last bars of
+    every regime, and is_open a boolean array flagging the regimes still active on the last bar
+    """
+    signal = numpy.asarray(signal, dtype=bool)
+    padded = numpy.concatenate(([False], signal, [False]))
+    changes = numpy.flatnonzero(padded[1:] != padded[:-1])
+    entries = changes[::2]
+    exits = changes[1::2] - 1
+    is_open = exits == len(signal) - 1
+    return entries, exits, is_open
+
+
+def trade_spans(signal, index):
+    """
+
+    :param signal: boolean array-like
+    :param index: labels of the bars, typically timestamps
+    :return: (trades, is_open) where trades is an array of shape (count trades, 2) holding (entry, exit) labels,
+    see signal_regimes()
+    """
+    entries, exits, is_open = signal_regimes(signal)
+    index = numpy.asarray(index)
+    return numpy.column_stack((index[entries], index[exits])), is_open
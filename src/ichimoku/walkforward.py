@@ -0,0 +1,137 @@
+"""
+Walk-forward optimization of the Ichimoku periods: parameters are picked on a train window and scored on the test
+window that follows, fold after fold.
+
+Components at a bar only depend on earlier bars, so the rules are evaluated once per parameter combination over
+the whole series and every fold reads slices of that single pass: the default score is additive, so that the score
+of any window is a difference of the cumulated per-bar profits sampled at the fold bounds. Combinations are fanned
+out over a process pool sharing the prices and the rolling mid range cache of ichimoku.optimize.
+"""
+import numpy
+
+import instrument
+from ichimoku import optimize
+from ichimoku.panel import assemble_components
+from ichimoku.rules import rules_1_masks
+
+TRAIN_START, TRAIN_END, TEST_START, TEST_END = range(4)
+
+
+def fold_bounds(count, train, test, step=None):
+    """
+    Rolling folds, the test window of each fold starting where its train window ends.
+
+    :param count: number of bars
+    :param train: bars per train window
+    :param test: bars per test window
+    :param step: bars between successive folds, test by default so that test windows tile the series
+    :return: int64 array of shape (fold, 4), see TRAIN_START, TRAIN_END, TEST_START, TEST_END, ends excluded
+    """
+    step = step or test
+    train_starts = numpy.arange(0, count - train - test + 1, step, dtype='int64')
+    return numpy.column_stack((train_starts, train_starts + train, train_starts + train,
+                               train_starts + train + test))
+
+
+def bar_pnl(cache, close, parameters):
+    """
+    Close to close profit of each bar, long on bullish bars and short on bearish bars, see
+    optimize.long_short_pnl().
+
+    :param cache: optimize.MidRangeCache over the high and low prices
+    :param close: float64 array
+    :param parameters: (tenkan, kijun, senkou, displacement)
+    :return: float64 array aligned with close, the last bar earning nothing
+    """
+    tenkan, kijun, senkou, displacement = parameters
+    ichimoku_components = assemble_components(cache.get(tenkan), cache.get(kijun), cache.get(senkou), close,
+                                              displacement=displacement)
+    bullish, bearish = rules_1_masks(cache.high, cache.low, close, ichimoku_components=ichimoku_components,
+                                     displacement=displacement)
+    position = bullish.astype('int8') - bearish.astype('int8')
+    pnl = numpy.zeros(len(close))
+    pnl[:-1] = numpy.nan_to_num(position[:-1] * numpy.diff(close))
+    return pnl
+
+
+def window_scores(cache, close, parameters, bounds):
+    """
+    Train scores only add the profits of bars train_start to train_end - 2: the profit of the last train bar is
+    realized on the close of the first test bar, which must not weigh in the choice of the parameters.
+
+    :return: float64 array of shape (fold, 2), the train and test scores of every fold
+    """
+    cumulated = numpy.concatenate(([0.], numpy.cumsum(bar_pnl(cache, close, parameters))))
+    sampled = cumulated[bounds]
+    return numpy.column_stack((cumulated[bounds[:, TRAIN_END] - 1] - sampled[:, TRAIN_START],
+                               sampled[:, TEST_END] - sampled[:, TEST_START]))
+
+
+def _scores_chunk(chunk, bounds):
+    close, cache = optimize.worker_state()
+    return [window_scores(cache, close, parameters, bounds) for parameters in chunk]
+
+
+@instrument.timed('ichimoku.walk_forward')
+def walk_forward(ohlc, grid, train, test, step=None, workers=1, max_cache_bytes=optimize.DEFAULT_CACHE_BYTES):
+    """
+
+    :param ohlc: pandas.DataFrame with 'high', 'low', 'close' columns, indexed by timestamp
+    :param grid: iterable of (tenkan, kijun, senkou, displacement), see parameter_grid()
+    :param train: bars per train window
+    :param test: bars per test window
+    :param step: bars between successive folds, test by default
+    :param workers: number of processes
+    :param max_cache_bytes: rolling mid range cache budget, per process
+    :return: (report, equity) where report is a pandas.DataFrame with one row per fold holding its windows, the
+    parameters picked on train and their train and test scores, and equity the stitched out-of-sample profit, a
+    pandas.Series over the test bars
+    """
+    import pandas
+
+    grid = sorted(grid)
+    prices = numpy.stack([ohlc[name].values.astype('float64') for name in ('high', 'low', 'close')])
+    bounds = fold_bounds(prices.shape[1], train, test, step=step)
+    if not len(bounds):
+        raise ValueError('%d bars cannot hold a %d bars train window and a %d bars test window' % (
+            prices.shape[1], train, test))
+
+    instrument.count('bars_processed', prices.shape[1] * len(grid))
+    cache = optimize.MidRangeCache(prices[0], prices[1], max_bytes=max_cache_bytes)
+    if workers > 1 and len(grid) > 1:
+        scores = optimize.map_grid(prices, grid, _scores_chunk, args=(bounds,), workers=workers,
+                                   max_cache_bytes=max_cache_bytes)
+
+    else:
+        scores = [window_scores(cache, prices[2], parameters, bounds) for parameters in grid]
+
+    # scores: (parameters, fold, train / test), ties going to the first combination in grid order
+    scores = numpy.stack(scores)
+    best = numpy.argmax(scores[:, :, 0], axis=0)
+    folds = numpy.arange(len(bounds))
+
+    equity_pnl = numpy.zeros(bounds[-1, TEST_END] - bounds[0, TEST_START])
+    chosen_pnl = dict()
+    for fold, choice in zip(folds.tolist(), best.tolist()):
+        if choice not in chosen_pnl:
+            chosen_pnl[choice] = bar_pnl(cache, prices[2], grid[choice])
+
+        test_start, test_end = bounds[fold, TEST_START], bounds[fold, TEST_END]
+        offset = test_start - bounds[0, TEST_START]
+        # overlapping test windows, when step < test, are taken from the latest fold
+        equity_pnl[offset:offset + test_end - test_start] = chosen_pnl[choice][test_start:test_end]
+
+    index = ohlc.index
+    report = pandas.DataFrame({'train_start': index[bounds[:, TRAIN_START]],
+                               'train_end': index[bounds[:, TRAIN_END] - 1],
+                               'test_start': index[bounds[:, TEST_START]],
+                               'test_end': index[bounds[:, TEST_END] - 1]})
+    for position, name in enumerate(['tenkan', 'kijun', 'senkou', 'displacement']):
+        report[name] = [grid[choice][position] for choice in best.tolist()]
+
+    report['train_score'] = scores[best, folds, 0]
+    report['test_score'] = scores[best, folds, 1]
+    report.index.name = 'fold'
+    equity = pandas.Series(numpy.cumsum(equity_pnl), index=index[bounds[0, TEST_START]:bounds[-1, TEST_END]],
+                           name='equity')
+    return report, equity
@@ -0,0 +1,220 @@
+"""
+Opt-in, in-process instrumentation: timers and counters aggregated per name.
+
+Instrumentation is off by default, timed() wrappers and count() then cost a single flag check. It is switched on by
+enable(), or at import time by the STATARB_INSTRUMENT environment variable:
+
+    STATARB_INSTRUMENT=summary            logs a summary at exit
+    STATARB_INSTRUMENT=trace.json         also writes a Chrome trace (chrome://tracing, Perfetto) at exit
+
+Only the current process is measured: work done in pool workers is seen as the time spent waiting for them.
+"""
+import atexit
+import functools
+import json
+import logging
+import os
+import threading
+import time
+
+_ENVIRONMENT_VARIABLE = 'STATARB_INSTRUMENT'
+
+
+class Registry(object):
+    """
+    Timings and counters, plus the individual spans when tracing.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.tracing = False
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+        self.timers = dict()
+        self.counters = dict()
+        self.spans = list()
+
+    def reset(self):
+        with self._lock:
+            self.timers = dict()
+            self.counters = dict()
+            self.spans = list()
+            self._origin = time.perf_counter()
+
+    def record(self, name, start, end):
+        duration = end - start
+        with self._lock:
+            stats = self.timers.get(name)
+            if stats is None:
+                self.timers[name] = [1, duration, duration, duration]
+
+            else:
+                stats[0] += 1
+                stats[1] += duration
+                stats[2] = min(stats[2], duration)
+                stats[3] = max(stats[3], duration)
+
+            if self.tracing:
+                self.spans.append((name, start - self._origin, duration, threading.get_ident()))
+
+    def add(self, name, value):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+
+_registry = Registry()
+
+
+def enable(tracing=False):
+    """
+
+    :param tracing: also keeps every span, for write_chrome_trace()
+    """
+    _registry.enabled = True
+    _registry.tracing = tracing
+
+
+def disable():
+    _registry.enabled = False
+    _registry.tracing = False
+
+
+def is_enabled():
+    return _registry.enabled
+
+
+def reset():
+    _registry.reset()
+
+
+class _Timer(object):
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+        self.start = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        _registry.record(self.name, self.start, time.perf_counter())
+
+
+class _NullTimer(object):
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return None
+
+
+_NULL_TIMER = _NullTimer()
+
+
+def timer(name):
+    """
+    Context manager timing its block under name.
+    """
+    if not _registry.enabled:
+        return _NULL_TIMER
+
+    return _Timer(name)
+
+
+def timed(name=None):
+    """
+    Decorator timing every call, under name or the function qualified name. Usable with or without arguments.
+    """
+    def decorate(function):
+        timer_name = name or '%s.%s' % (function.__module__, function.__qualname__)
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _registry.enabled:
+                return function(*args, **kwargs)
+
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+
+            finally:
+                _registry.record(timer_name, start, time.perf_counter())
+
+        return wrapper
+
+    if callable(name):
+        function, name = name, None
+        return decorate(function)
+
+    return decorate
+
+
+def count(name, value=1):
+    """
+    Adds value to the counter name, such as 'bars_processed', 'signals_emitted' or 'bytes_loaded'.
+    """
+    if _registry.enabled:
+        _registry.add(name, value)
+
+
+def summary():
+    """
+
+    :return: dict with 'timers', name to (calls, total, min, max) seconds, and 'counters'
+    """
+    with _registry._lock:
+        return {'timers': dict((name, tuple(stats)) for name, stats in _registry.timers.items()),
+                'counters': dict(_registry.counters)}
+
+
+def format_summary():
+    current = summary()
+    lines = ['%-48s %8s %12s %12s %12s' % ('timer', 'calls', 'total (s)', 'mean (s)', 'max (s)')]
+    for name, (calls, total, shortest, longest) in sorted(current['timers'].items(), key=lambda item: -item[1][1]):
+        lines.append('%-48s %8d %12.6f %12.6f %12.6f' % (name, calls, total, total / calls, longest))
+
+    for name, value in sorted(current['counters'].items()):
+        lines.append('%-48s %8s %12s' % (name, '', value))
+
+    return '\n'.join(lines)
+
+
+def write_chrome_trace(path):
+    """
+    Writes the spans recorded since enable(tracing=True) in the Chrome trace event format, counters being attached
+    as a final counter event.
+    """
+    pid = os.getpid()
+    with _registry._lock:
+        events = [{'name': name, 'ph': 'X', 'ts': start * 1e6, 'dur': duration * 1e6, 'pid': pid, 'tid': tid}
+                  for name, start, duration, tid in _registry.spans]
+        end = max([event['ts'] + event['dur'] for event in events] or [0])
+        if _registry.counters:
+            events.append({'name': 'counters', 'ph': 'C', 'ts': end, 'pid': pid,
+                           'args': dict(_registry.counters)})
+
+    with open(path, 'w') as trace_file:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, trace_file)
+
+
+def _dump_at_exit(trace_path):
+    logging.getLogger(__name__).info('instrumentation summary\n%s', format_summary())
+    if trace_path:
+        write_chrome_trace(trace_path)
+
+
+def _configure_from_environment():
+    setting = os.environ.get(_ENVIRONMENT_VARIABLE)
+    if not setting:
+        return
+
+    trace_path = None if setting.lower() in ('1', 'summary') else setting
+    enable(tracing=trace_path is not None)
+    atexit.register(_dump_at_exit, trace_path)
+
+
+_configure_from_environment()
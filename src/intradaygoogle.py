@@ -1,16 +1,31 @@
 """
 Retrieve intraday stock data from Google Finance.
 """
-import codecs
-import csv
 import datetime
+import io
 import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 
+import numpy
 import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
+import instrument
+from barstore import BarStore
 
-def get_google_finance_intraday(ticker, period=60, days=1):
+_BASE_URL = 'http://www.google.com/finance/getprices'
+_TIMEZONE_PREFIX = 'TIMEZONE_OFFSET='
+# data rows start with an anchor or an offset, header lines such as EXCHANGE%3DNASDAQ or COLUMNS= are dropped
+_ROW_PATTERN = re.compile(r'^(?:[a\d]|%s).*$' % _TIMEZONE_PREFIX, re.MULTILINE)
+_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+
+@instrument.timed('intradaygoogle.get_google_finance_intraday')
+def get_google_finance_intraday(ticker, period=60, days=1, session=None, base_url=_BASE_URL):
     """
     Retrieve intraday stock data from Google Finance.
     Parameters
@@ -21,6 +36,10 @@ def get_google_finance_intraday(ticker, period=60, days=1):
         Interval between stock values in seconds.
     days : int
         Number of days of data to retrieve.
+    session : requests.Session
+        Optional session, reusing its connections.
+    base_url : str
+        Endpoint serving the getprices payload.
     Returns
     -------
     df : pandas.DataFrame
@@ -29,27 +48,229 @@ def get_google_finance_intraday(ticker, period=60, days=1):
         the retrieved price values.
     """
 
-    uri = 'http://www.google.com/finance/getprices?i={period}&p={days}d&f=d,o,h,l,c,v&df=cpct&q={ticker}'.format(
+    uri = '{base_url}?i={period}&p={days}d&f=d,o,h,l,c,v&df=cpct&q={ticker}'.format(
+        base_url=base_url,
         ticker=ticker,
         period=period,
         days=days)
-    page = requests.get(uri)
-    reader = csv.reader(codecs.iterdecode(page.content.splitlines(), 'utf-8'))
-    columns = ['open', 'high', 'low', 'close', 'volume']
-    rows = []
-    times = []
-    for row in reader:
-        if re.match('^[a\d]', row[0]):
-            if row[0].startswith('a'):
-                start_time = datetime.datetime.fromtimestamp(int(row[0][1:]))
-                times.append(start_time)
-            else:
-                times.append(start_time + datetime.timedelta(seconds=period*int(row[0])))
-
-            rows.append(map(float, row[1:]))
-
-    if len(rows):
-        return pd.DataFrame(rows, index=pd.DatetimeIndex(times, name='Date'), columns=columns)
+    page = (session or requests).get(uri)
+    page.raise_for_status()
+    instrument.count('bytes_loaded', len(page.content))
+    return parse_getprices(page.content, period)
+
+
+@instrument.timed('intradaygoogle.parse_getprices')
+def parse_getprices(content, period):
+    """
+    Parse a getprices payload in a single vectorized pass.
+
+    Data rows hold either an anchor 'a<epoch>' or an offset, in periods, from the latest anchor: timestamps are
+    rebuilt as int64 nanoseconds by broadcasting each anchor over the rows following it. TIMEZONE_OFFSET lines
+    shift the subsequent timestamps to the exchange local time.
+    Parameters
+    ----------
+    content : bytes
+        Raw response body.
+    period : int
+        Interval between stock values in seconds.
+    Returns
+    -------
+    df : pandas.DataFrame
+        See get_google_finance_intraday.
+    """
+    text = content.decode('utf-8') if isinstance(content, bytes) else content
+    columns = _COLUMNS
+    header, separator, body = text.partition('DATA=')
+    if not separator:
+        body = header
+
+    for line in header.splitlines():
+        if line.startswith('COLUMNS='):
+            columns = [name.lower() for name in line[len('COLUMNS='):].split(',')[1:]]
+
+    rows = _ROW_PATTERN.findall(body)
+    if not rows:
+        return pd.DataFrame([], index=pd.DatetimeIndex([], name='Date'))
+
+    body = '\n'.join(rows)
+    # anchors become negative numbers and timezone lines rows without date, so that the C parser reads everything
+    body = ('\n' + body).replace('\na', '\n-').replace('\n' + _TIMEZONE_PREFIX, '\n,')
+    frame = pd.read_csv(io.StringIO(body), header=None, names=['date'] + columns, dtype='float64')
+    dates = frame['date'].values
+    values = frame[columns].values
+    is_timezone = numpy.isnan(dates)
+    timezone_minutes = pd.Series(numpy.where(is_timezone, values[:, 0], numpy.nan)).ffill().fillna(0).values
+
+    # rows preceding the first anchor cannot be dated
+    is_anchor = dates < 0
+    anchor_ids = numpy.cumsum(is_anchor) - 1
+    is_row = ~is_timezone & (anchor_ids >= 0)
+    numbers = dates[is_row].astype('int64')
+    row_is_anchor = is_anchor[is_row]
+    anchors = -numbers[row_is_anchor]
+    offsets = numpy.where(row_is_anchor, 0, numbers)
+    seconds = anchors[anchor_ids[is_row]] + period * offsets + 60 * timezone_minutes[is_row].astype('int64')
+    index = pd.DatetimeIndex((seconds * 10 ** 9).astype('datetime64[ns]'), name='Date')
+
+    instrument.count('bars_processed', int(is_row.sum()))
+    if is_row.any():
+        output = pd.DataFrame(values[is_row], index=index, columns=columns)
+        return output[_COLUMNS] if set(_COLUMNS).issubset(columns) else output
 
     else:
-        return pd.DataFrame(rows, index=pd.DatetimeIndex(times, name='Date'))
+        return pd.DataFrame([], index=index)
+
+
+class RateLimiter(object):
+    """
+    Spaces calls to wait() by at least 1 / rate seconds, across threads.
+    """
+
+    def __init__(self, rate):
+        self.interval = 1. / rate if rate else 0.
+        self._lock = threading.Lock()
+        self._next_slot = time.monotonic()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class IntradayCache(object):
+    """
+    On-disk cache of intraday bars, kept in a BarStore under one symbol per (ticker, period), partitioned by day.
+
+    Only completed days are cached: the current day is always fetched again.
+    """
+
+    def __init__(self, path):
+        self.store = BarStore(path)
+
+    @staticmethod
+    def _symbol(ticker, period):
+        return '{ticker}-{period}'.format(ticker=ticker, period=period)
+
+    def days(self, ticker, period):
+        return self.store.days(self._symbol(ticker, period))
+
+    def read(self, ticker, period, days):
+        if not days:
+            return None
+
+        return self.store.read_bars(self._symbol(ticker, period), start=days[0], end=days[-1])
+
+    def write(self, ticker, period, bars, today):
+        completed = bars[bars.index.normalize() < pd.Timestamp(today)]
+        if len(completed):
+            self.store.append_bars(self._symbol(ticker, period), completed, bar_size=period, ticker=ticker)
+
+
+def make_session(pool_size=10, retries=3, backoff_factor=0.5):
+    """
+    Keep-alive session retrying throttled and failed requests.
+    """
+    retry = Retry(total=retries, backoff_factor=backoff_factor, status_forcelist=(429, 500, 502, 503, 504))
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+@instrument.timed('intradaygoogle.get_intraday_cached')
+def get_intraday_cached(ticker, period, days, session, cache=None, limiter=None, base_url=_BASE_URL, today=None):
+    """
+    Retrieve intraday stock data, only fetching the days missing from the cache.
+    Parameters
+    ----------
+    ticker : str
+        Company ticker symbol.
+    period : int
+        Interval between stock values in seconds.
+    days : int
+        Number of trading days of data to retrieve.
+    session : requests.Session
+        Shared session.
+    cache : IntradayCache
+        Optional on-disk cache.
+    limiter : RateLimiter
+        Optional rate limiter shared by concurrent downloads.
+    base_url : str
+        Endpoint serving the getprices payload.
+    today : datetime.date
+        Current day, defaults to the local date.
+    Returns
+    -------
+    df : pandas.DataFrame
+        See get_google_finance_intraday.
+    """
+    today = today or datetime.date.today()
+    cached_days = cache.days(ticker, period) if cache else []
+    # first business day of the requested window, which ends today
+    window_start = numpy.busday_offset(today, -(days - 1), roll='backward')
+    missing_days = days
+    if cached_days and cached_days[0] <= window_start:
+        # business days after the last cached one, up to and including today
+        missing_days = min(days, int(numpy.busday_count(cached_days[-1] + datetime.timedelta(days=1),
+                                                        today + datetime.timedelta(days=1))))
+
+    fetched = None
+    if missing_days > 0:
+        if limiter:
+            limiter.wait()
+
+        fetched = get_google_finance_intraday(ticker, period=period, days=missing_days, session=session,
+                                              base_url=base_url)
+        if cache and len(fetched):
+            cache.write(ticker, period, fetched, today)
+
+    if not cached_days:
+        return fetched
+
+    cached = cache.read(ticker, period, cached_days[-days:])
+    bars = pd.concat([cached, fetched]) if fetched is not None and len(fetched) else cached
+    bars = bars[~bars.index.duplicated(keep='last')]
+    if not len(bars):
+        return bars
+
+    kept_days = sorted(set(bars.index.date))[-days:]
+    return bars[bars.index.normalize() >= pd.Timestamp(kept_days[0])]
+
+
+@instrument.timed('intradaygoogle.get_intraday_many')
+def get_intraday_many(tickers, period=60, days=1, workers=16, rate=None, cache_path=None, base_url=_BASE_URL):
+    """
+    Retrieve intraday stock data for many tickers concurrently.
+    Parameters
+    ----------
+    tickers : list of str
+        Company ticker symbols.
+    period : int
+        Interval between stock values in seconds.
+    days : int
+        Number of trading days of data to retrieve.
+    workers : int
+        Number of concurrent downloads.
+    rate : float
+        Maximum number of requests per second, unlimited when None.
+    cache_path : str
+        Root of the BarStore used as on-disk cache, no caching when None.
+    base_url : str
+        Endpoint serving the getprices payload.
+    Returns
+    -------
+    dfs : dict
+        DataFrame per ticker, see get_google_finance_intraday.
+    """
+    cache = IntradayCache(cache_path) if cache_path else None
+    limiter = RateLimiter(rate) if rate else None
+    with make_session(pool_size=workers) as session:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(get_intraday_cached, ticker, period, days, session, cache=cache,
+                                       limiter=limiter, base_url=base_url) for ticker in tickers]
+            return dict(zip(tickers, [future.result() for future in futures]))
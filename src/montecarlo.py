@@ -0,0 +1,324 @@
+"""
+Monte-Carlo evaluation of strategies over the benchmark store.
+
+Paths are windows of benchmark samples drawn up front from the seed, then evaluated chunk by chunk over a process
+pool. Every worker maps the store instead of receiving prices, chunk results are streamed back in order and folded
+into online statistics, while per-path records are appended to a columnar output.
+"""
+import json
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy
+
+import backtest
+from benchmarkstore import BenchmarkStore
+
+_SCHEMA_FILE = 'schema.json'
+_ROW_BYTES = 4 * 8
+DEFAULT_CHUNK_BYTES = 64 * 1024 * 1024
+
+_worker_store = None
+
+
+class TargetStopStrategy(object):
+    """
+    Picklable wrapper around backtest.run_target_stop() with a buy_high_after() entry.
+    """
+
+    def __init__(self, entry_bars=10, target=0.05, stop=None, resolution=None):
+        self.entry_bars = entry_bars
+        self.target = target
+        self.stop = stop
+        self.resolution = resolution
+
+    def __call__(self, ohlc):
+        return backtest.run_target_stop(ohlc, backtest.buy_high_after(self.entry_bars), self.target,
+                                        stop=self.stop, resolution=self.resolution)
+
+
+class RunningMoments(object):
+    """
+    Count, mean and variance updated batch by batch (Chan et al. pairwise combination).
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.
+        self._m2 = 0.
+
+    def update(self, values):
+        values = values[~numpy.isnan(values)]
+        if not len(values):
+            return
+
+        count = len(values)
+        mean = values.mean()
+        m2 = ((values - mean) ** 2).sum()
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self._m2 += m2 + delta ** 2 * self.count * count / total
+        self.count = total
+
+    @property
+    def variance(self):
+        return self._m2 / (self.count - 1) if self.count > 1 else float('nan')
+
+
+class QuantileSketch(object):
+    """
+    Mergeable quantile sketch with bounded relative error: values are counted in logarithmic buckets, so that any
+    quantile is returned within relative_accuracy of an actual value whatever the number of observations.
+    """
+
+    def __init__(self, relative_accuracy=0.01):
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.positive = dict()
+        self.negative = dict()
+        self.zeros = 0
+        self.count = 0
+
+    def _add_to(self, buckets, magnitudes):
+        keys = numpy.ceil(numpy.log(magnitudes) / self._log_gamma).astype('int64')
+        unique_keys, counts = numpy.unique(keys, return_counts=True)
+        for key, count in zip(unique_keys.tolist(), counts.tolist()):
+            buckets[key] = buckets.get(key, 0) + count
+
+    def update(self, values):
+        values = values[~numpy.isnan(values)]
+        self._add_to(self.positive, values[values > 0])
+        self._add_to(self.negative, -values[values < 0])
+        self.zeros += int((values == 0).sum())
+        self.count += len(values)
+
+    def merge(self, other):
+        for buckets, other_buckets in ((self.positive, other.positive), (self.negative, other.negative)):
+            for key, count in other_buckets.items():
+                buckets[key] = buckets.get(key, 0) + count
+
+        self.zeros += other.zeros
+        self.count += other.count
+
+    def _value(self, key):
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def quantile(self, q):
+        if not self.count:
+            return float('nan')
+
+        rank = q * (self.count - 1)
+        seen = 0
+        for key in sorted(self.negative, reverse=True):
+            seen += self.negative[key]
+            if seen > rank:
+                return -self._value(key)
+
+        seen += self.zeros
+        if seen > rank:
+            return 0.
+
+        for key in sorted(self.positive):
+            seen += self.positive[key]
+            if seen > rank:
+                return self._value(key)
+
+        return float('nan')
+
+
+class ColumnarWriter(object):
+    """
+    Appends records as one raw binary file per column, described by schema.json once closed.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        if not os.path.exists(path):
+            os.makedirs(path)
+
+        self._files = dict()
+        self._dtypes = dict()
+        self.count = 0
+
+    def append(self, columns):
+        """
+
+        :param columns: dict of equal length arrays
+        """
+        for name, values in columns.items():
+            values = numpy.ascontiguousarray(values)
+            if name not in self._files:
+                self._files[name] = open(os.path.sep.join([self.path, name + '.bin']), 'wb')
+                self._dtypes[name] = values.dtype.str
+
+            self._files[name].write(values.astype(self._dtypes[name]).tobytes())
+
+        self.count += len(next(iter(columns.values())))
+
+    def close(self):
+        for column_file in self._files.values():
+            column_file.close()
+
+        with open(os.path.sep.join([self.path, _SCHEMA_FILE]), 'w') as schema_file:
+            json.dump({'count': self.count, 'dtypes': self._dtypes}, schema_file, indent=2)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def read_columns(path, columns=None):
+    """
+
+    :param path: folder written by ColumnarWriter
+    :param columns: subset of columns, all when None
+    :return: dict of memory-mapped arrays
+    """
+    with open(os.path.sep.join([path, _SCHEMA_FILE])) as schema_file:
+        schema = json.load(schema_file)
+
+    names = list(schema['dtypes']) if columns is None else columns
+    return dict((name, numpy.memmap(os.path.sep.join([path, name + '.bin']), dtype=schema['dtypes'][name],
+                                    mode='r', shape=(schema['count'],)) if schema['count'] else
+                 numpy.empty(0, dtype=schema['dtypes'][name]))
+                for name in names)
+
+
+def draw_paths(store, n_paths, rng, path_length=None):
+    """
+
+    :param store: BenchmarkStore
+    :param n_paths:
+    :param rng: numpy.random.Generator
+    :param path_length: number of bars per path, whole samples when None
+    :return: (sample indices, start offsets) int64 arrays
+    """
+    sample_indices = rng.integers(len(store), size=n_paths)
+    if path_length is None:
+        return sample_indices, numpy.zeros(n_paths, dtype='int64')
+
+    lengths = store.index[sample_indices, 1]
+    if (lengths < path_length).any():
+        raise ValueError('benchmark samples shorter than path_length=%d' % path_length)
+
+    offsets = rng.integers(lengths - path_length + 1)
+    return sample_indices, offsets
+
+
+def chunk_bounds(lengths, max_paths, max_bytes):
+    """
+    Splits consecutive paths into chunks holding at most max_paths paths and max_bytes of prices, paths of a
+    chunk being padded to its longest one. A path exceeding max_bytes on its own gets a chunk of its own.
+
+    :param lengths: int64 array of bars per path
+    :param max_paths:
+    :param max_bytes:
+    :return: list of chunk starts, followed by the number of paths
+    """
+    bounds = list()
+    longest = 0
+    for position, length in enumerate(lengths.tolist()):
+        longest = max(longest, length)
+        count = position - bounds[-1] + 1 if bounds else 1
+        if count == 1 or count > max_paths or count * longest * _ROW_BYTES > max_bytes:
+            bounds.append(position)
+            longest = length
+
+    bounds.append(len(lengths))
+    return bounds
+
+
+def _open_store(store_path):
+    global _worker_store
+    _worker_store = BenchmarkStore(store_path)
+
+
+def _evaluate_paths(strategy, sample_indices, offsets, path_length):
+    store = _worker_store
+    if path_length is None:
+        ohlc = store.stacked(sample_indices)
+
+    else:
+        starts = store.index[sample_indices, 0] + offsets
+        ohlc = store.data[starts[:, numpy.newaxis] + numpy.arange(path_length)]
+
+    return strategy(ohlc)
+
+
+def simulate(strategy, n_paths, workers=1, seed=None, store_path=os.path.sep.join(['data', 'benchmark-store']),
+             path_length=None, chunk_size=1000, max_chunk_bytes=DEFAULT_CHUNK_BYTES, records_path=None,
+             quantiles=(0.01, 0.05, 0.25, 0.5)):
+    """
+    Evaluates strategy over n_paths random benchmark paths.
+
+    Results do not depend on the number of workers: paths are drawn from the seed beforehand and chunks are
+    aggregated in order.
+
+    :param strategy: picklable callable(ohlc) returning backtest.run_target_stop() like results
+    :param n_paths: number of paths
+    :param workers: number of processes
+    :param seed: seed of the path draws
+    :param store_path: BenchmarkStore folder
+    :param path_length: bars per path, drawn at a random offset of a random sample, whole samples when None
+    :param chunk_size: maximum number of paths per task
+    :param max_chunk_bytes: maximum size of the prices of a task, see chunk_bounds()
+    :param records_path: folder receiving per-path records, none written when None
+    :param quantiles: drawdown quantiles to report
+    :return: dict of aggregated statistics
+    """
+    rng = numpy.random.default_rng(seed)
+    store = BenchmarkStore(store_path)
+    sample_indices, offsets = draw_paths(store, n_paths, rng, path_length=path_length)
+    # whole samples differ in length, chunks are then cut by the size of their padded prices
+    lengths = store.index[sample_indices, 1] if path_length is None else numpy.full(n_paths, path_length)
+    bounds = chunk_bounds(lengths, chunk_size, max_chunk_bytes)
+    starts = bounds[:-1]
+    chunks = ([strategy] * len(starts),
+              [sample_indices[start:end] for start, end in zip(bounds[:-1], bounds[1:])],
+              [offsets[start:end] for start, end in zip(bounds[:-1], bounds[1:])],
+              [path_length] * len(starts))
+
+    profit = RunningMoments()
+    drawdown = QuantileSketch()
+    target_hits = 0
+    writer = ColumnarWriter(records_path) if records_path else None
+    executor = None
+    try:
+        if workers > 1:
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=_open_store, initargs=(store_path,))
+            chunk_results = executor.map(_evaluate_paths, *chunks)
+
+        else:
+            _open_store(store_path)
+            chunk_results = map(_evaluate_paths, *chunks)
+
+        for start, results in zip(starts, chunk_results):
+            profit.update(results['profit'])
+            drawdown.update(results['drawdown'])
+            target_hits += int(results['target_reached'].sum())
+            if writer:
+                count = len(results['profit'])
+                writer.append({'path': numpy.arange(start, start + count),
+                               'sample': sample_indices[start:start + count],
+                               'offset': offsets[start:start + count],
+                               'target_reached': results['target_reached'],
+                               'exit_index': results['exit_index'],
+                               'profit': results['profit'],
+                               'drawdown': results['drawdown']})
+
+    finally:
+        if executor:
+            executor.shutdown()
+
+        if writer:
+            writer.close()
+
+    return {'paths': n_paths,
+            'profit_mean': float(profit.mean),
+            'profit_std': math.sqrt(profit.variance) if profit.count > 1 else float('nan'),
+            'target_hit_rate': target_hits / n_paths if n_paths else float('nan'),
+            'drawdown_quantiles': dict((q, drawdown.quantile(q)) for q in quantiles)}
@@ -0,0 +1,273 @@
+"""
+Fast OHLC charts.
+
+Time stamps and prices are converted to arrays once, candles are drawn as one LineCollection for the wicks and one
+PolyCollection for the bodies, and series longer than the axes pixel width are aggregated into OHLC bins first.
+Ichimoku overlays and trade spans reuse the same time axis conversion and binning.
+"""
+import numpy
+from matplotlib import pyplot
+from matplotlib.collections import LineCollection, PolyCollection
+from matplotlib.colors import to_rgba
+from matplotlib.dates import DateFormatter, date2num
+from matplotlib.transforms import blended_transform_factory
+
+import instrument
+
+_COMPONENT_STYLES = ['#3399ff', '#004c99', '#c0c0c0', '#808080', '#cccc00']
+
+
+def time_axis(index):
+    """
+    Vectorized conversion of a DatetimeIndex (or datetime64 array) to matplotlib dates.
+    """
+    return date2num(numpy.asarray(index, dtype='datetime64[ns]'))
+
+
+def bin_starts(count, max_bars=None):
+    """
+
+    :param count: number of bars
+    :param max_bars: maximum number of bins, no binning when None
+    :return: index of the first bar of every bin
+    """
+    step = max(1, -(-count // max_bars)) if max_bars else 1
+    return numpy.arange(0, count, step)
+
+
+def decimate_ohlc(x, px_open, px_high, px_low, px_close, starts):
+    """
+    Aggregates consecutive bars into the bins starting at starts.
+
+    :return: (x, open, high, low, close) of the bins
+    """
+    if len(starts) == len(x):
+        return x, px_open, px_high, px_low, px_close
+
+    ends = numpy.append(starts[1:], len(x)) - 1
+    return (x[starts], px_open[starts], numpy.fmax.reduceat(px_high, starts), numpy.fmin.reduceat(px_low, starts),
+            px_close[ends])
+
+
+def pixel_width(ax):
+    return max(1, int(ax.get_window_extent().width))
+
+
+def draw_candles(ax, x, px_open, px_high, px_low, px_close, width, colorup='g', colordown='r', autolim=True):
+    """
+    Draws candles as two collections.
+
+    :param autolim: whether the candles extend the data limits
+
+    :return: (wicks LineCollection, bodies PolyCollection)
+    """
+    rising = (px_close >= px_open)[:, numpy.newaxis]
+    colors = numpy.where(rising, to_rgba(colorup), to_rgba(colordown))
+    wicks = numpy.stack([numpy.column_stack([x, px_low]), numpy.column_stack([x, px_high])], axis=1)
+    bottom = numpy.fmin(px_open, px_close)
+    top = numpy.fmax(px_open, px_close)
+    left = x - width / 2
+    right = x + width / 2
+    bodies = numpy.stack([numpy.column_stack([left, bottom]), numpy.column_stack([left, top]),
+                          numpy.column_stack([right, top]), numpy.column_stack([right, bottom])], axis=1)
+    wick_collection = LineCollection(wicks, colors=colors, linewidths=0.8)
+    body_collection = PolyCollection(bodies, facecolors=colors, edgecolors=colors, linewidths=0.5)
+    ax.add_collection(wick_collection, autolim=autolim)
+    ax.add_collection(body_collection, autolim=autolim)
+    return wick_collection, body_collection
+
+
+class CandleRenderer(object):
+    """
+    Keeps the full resolution arrays and redraws the visible range, binned to the axes width, whenever the x
+    limits change. Overlays added with add_overlay() are redrawn along, over the same bins.
+    """
+
+    def __init__(self, ax, x, px_open, px_high, px_low, px_close, max_bars=None, colorup='g', colordown='r'):
+        self.ax = ax
+        self.x = x
+        self.prices = (px_open, px_high, px_low, px_close)
+        self.max_bars = max_bars
+        self.colors = (colorup, colordown)
+        self.bar_width = 0.8 * float(numpy.median(numpy.diff(x))) if len(x) > 1 else 0.0005
+        self.overlays = list()
+        # first binned bar, upper x limit and bars per bin of the latest drawing
+        self.bins = (None, None, 1)
+        self._collections = ()
+        self._drawing = False
+
+    def draw(self, lower=None, upper=None):
+        if self._drawing:
+            return
+
+        self._drawing = True
+        try:
+            # limits are only taken from the first, full range, drawing
+            autolim = not self._collections
+            for collection in self._collections:
+                collection.remove()
+
+            first = 0 if lower is None else max(0, numpy.searchsorted(self.x, lower) - 1)
+            last = len(self.x) if upper is None else numpy.searchsorted(self.x, upper) + 1
+            x = self.x[first:last]
+            prices = [values[first:last] for values in self.prices]
+            starts = bin_starts(len(x), self.max_bars or pixel_width(self.ax))
+            step = starts[1] - starts[0] if len(starts) > 1 else 1
+            self.bins = (x[0] if len(x) and lower is not None else None, upper, step)
+            x, px_open, px_high, px_low, px_close = decimate_ohlc(x, *prices, starts=starts)
+            colorup, colordown = self.colors
+            self._collections = draw_candles(self.ax, x, px_open, px_high, px_low, px_close, self.bar_width * step,
+                                             colorup=colorup, colordown=colordown, autolim=autolim)
+            for overlay in self.overlays:
+                overlay.draw(*self.bins, autolim=autolim)
+
+        finally:
+            self._drawing = False
+
+    def add_overlay(self, overlay):
+        """
+
+        :param overlay: object with a draw(lower, upper, step, autolim) method, drawn at once over the current bins
+        """
+        self.overlays.append(overlay)
+        overlay.draw(*self.bins, autolim=True)
+
+    def on_xlim_changed(self, ax):
+        lower, upper = ax.get_xlim()
+        self.draw(lower, upper)
+
+
+def _fill_polygons(x, bottom, top, where):
+    """
+    Polygons of the runs where where holds, as drawn by fill_between().
+    """
+    padded = numpy.concatenate(([False], where, [False]))
+    changes = numpy.flatnonzero(padded[1:] != padded[:-1])
+    return [numpy.concatenate((numpy.column_stack((x[start:end], bottom[start:end])),
+                               numpy.column_stack((x[start:end], top[start:end]))[::-1]))
+            for start, end in zip(changes[::2], changes[1::2])]
+
+
+class IchimokuOverlay(object):
+    """
+    Components lines and kumo, binned like the candles: the point of a bin is the value at its first bar.
+    """
+
+    def __init__(self, ax, ichimoku_components, styles=_COMPONENT_STYLES):
+        self.ax = ax
+        self.x = time_axis(ichimoku_components.index)
+        self.values = ichimoku_components.values.astype('float64')
+        self.names = list(ichimoku_components.columns)
+        self.styles = styles
+        self._lines = None
+        self._kumo = ()
+
+    def draw(self, lower=None, upper=None, step=1, autolim=True):
+        """
+
+        :param lower: x of the first binned bar, the first bar when None
+        :param upper: last x drawn, the last bar when None
+        :param step: bars per bin
+        :param autolim: whether the kumo extends the data limits
+        """
+        first = 0 if lower is None else numpy.searchsorted(self.x, lower)
+        last = len(self.x) if upper is None else numpy.searchsorted(self.x, upper) + step
+        starts = numpy.arange(first, min(last, len(self.x)), step)
+        x = self.x[starts]
+        values = self.values[starts]
+        if self._lines is None:
+            self._lines = [self.ax.plot(x, values[:, column], color=color, label=name, linewidth=1)[0]
+                           for column, (name, color) in enumerate(zip(self.names, self.styles))]
+
+        else:
+            # set_data() leaves the data limits alone, unlike plotting anew
+            for column, line in enumerate(self._lines):
+                line.set_data(x, values[:, column])
+
+        for collection in self._kumo:
+            collection.remove()
+
+        span_a = values[:, self.names.index('senkou-span-a')]
+        span_b = values[:, self.names.index('senkou-span-b')]
+        self._kumo = list()
+        with numpy.errstate(invalid='ignore'):
+            for where, color in ((span_b >= span_a, 'red'), (span_b < span_a, 'green')):
+                collection = PolyCollection(_fill_polygons(x, span_a, span_b, where), facecolors=color,
+                                            edgecolors='none', alpha=0.4)
+                self.ax.add_collection(collection, autolim=autolim)
+                self._kumo.append(collection)
+
+
+@instrument.timed('ohlcplot.plot_ohlc')
+def plot_ohlc(ohlc_df, ax=None, max_bars=None, colorup='g', colordown='r', time_format='%H:%M:%S'):
+    """
+
+    :param ohlc_df: pandas.DataFrame indexed by timestamp with 'open', 'high', 'low', 'close' columns
+    :param ax: axes to draw on, a new figure when None
+    :param max_bars: maximum number of candles drawn, the axes width in pixels when None
+    :return: axes, the renderer being attached as ax.candle_renderer
+    """
+    if ax is None:
+        pyplot.style.use('ggplot')
+        fig, ax = pyplot.subplots(dpi=90)
+
+    x = time_axis(ohlc_df.index)
+    prices = [ohlc_df[name].values.astype('float64') for name in ('open', 'high', 'low', 'close')]
+    renderer = CandleRenderer(ax, x, *prices, max_bars=max_bars, colorup=colorup, colordown=colordown)
+    renderer.draw()
+    ax.candle_renderer = renderer
+    ax.ticklabel_format(axis='y', useOffset=False)
+    ax.xaxis_date()
+    ax.xaxis.set_major_formatter(DateFormatter(time_format))
+    ax.autoscale_view()
+    ax.callbacks.connect('xlim_changed', renderer.on_xlim_changed)
+    pyplot.setp(ax.get_xticklabels(), rotation=30, ha='right')
+    return ax
+
+
+@instrument.timed('ohlcplot.plot_ichimoku')
+def plot_ichimoku(ax, ichimoku_components, max_bars=None, styles=_COMPONENT_STYLES):
+    """
+    Draws the components lines and the kumo. On axes drawn by plot_ohlc() they follow the candles bins, also when
+    zooming.
+
+    :param ax:
+    :param ichimoku_components: pandas.DataFrame as returned by ichimoku.components()
+    :param max_bars: maximum number of points per line, the axes width in pixels when None, ignored on plot_ohlc()
+    axes
+    :param styles: one color per component
+    :return: IchimokuOverlay
+    """
+    overlay = IchimokuOverlay(ax, ichimoku_components, styles=styles)
+    renderer = getattr(ax, 'candle_renderer', None)
+    if renderer is not None:
+        renderer.add_overlay(overlay)
+
+    else:
+        starts = bin_starts(len(overlay.x), max_bars or pixel_width(ax))
+        overlay.draw(step=starts[1] - starts[0] if len(starts) > 1 else 1)
+
+    return overlay
+
+
+@instrument.timed('ohlcplot.plot_trades')
+def plot_trades(ax, trades, color, alpha=0.5):
+    """
+    Shades trade spans as a single collection spanning the axes height.
+
+    :param ax:
+    :param trades: array of (entry, exit) timestamps
+    :param color:
+    """
+    if not len(trades):
+        return None
+
+    bounds = time_axis(numpy.asarray(trades).ravel()).reshape(-1, 2)
+    spans = numpy.stack([numpy.column_stack([bounds[:, 0], numpy.zeros(len(bounds))]),
+                         numpy.column_stack([bounds[:, 0], numpy.ones(len(bounds))]),
+                         numpy.column_stack([bounds[:, 1], numpy.ones(len(bounds))]),
+                         numpy.column_stack([bounds[:, 1], numpy.zeros(len(bounds))])], axis=1)
+    collection = PolyCollection(spans, facecolors=color, edgecolors='none', alpha=alpha,
+                                transform=blended_transform_factory(ax.transData, ax.transAxes))
+    ax.add_collection(collection)
+    return collection
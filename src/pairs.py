@@ -0,0 +1,299 @@
+"""
+Pairs trading over a panel of close prices, all candidate pairs at once.
+
+Prices are log closes, shape (bar, instrument), and a pair (first, second) regresses first on second:
+
+    first = alpha + beta * second + spread
+
+- screening: Engle-Granger style, an OLS fit over the whole panel followed by a Dickey-Fuller regression of the
+  spread differences on the lagged spread. Every sum involved is an entry of a handful of (instrument, instrument)
+  cross product matrices, so that all pairs of a 500 names universe are tested from a few matrix products.
+- signals: hedge ratios, spreads and z-scores over rolling windows, taken as differences of cumulative sums instead
+  of one regression per window. Pairs go through in blocks bounded by a memory budget, each block holding a few
+  (bar, pair) arrays.
+
+Entries and exits come out as (entry, exit) timestamp arrays with open trade flags, as returned by
+ichimoku.long_short_rules_1(): long trades buy the spread, that is buy first and sell beta times second, short trades
+do the opposite.
+"""
+import numpy
+
+import instrument
+from ichimoku.trades import trade_spans
+
+# MacKinnon (2010) asymptotic critical values of the Engle-Granger test, 2 variables with a constant
+EG_CRITICAL_VALUES = {0.01: -3.90, 0.05: -3.34, 0.1: -3.04}
+
+_DEFAULT_BLOCK_BYTES = 64 * 1024 * 1024
+# (bar, pair) float64 arrays alive at once while computing a block
+_BLOCK_ARRAYS = 8
+
+
+def store_close_panel(store, sample_indices=None):
+    """
+    Benchmark samples side by side, as many instruments over the length of the shortest sample.
+
+    :param store: BenchmarkStore
+    :param sample_indices: defaults to every sample
+    :return: float64 array of shape (bar, sample)
+    """
+    if sample_indices is None:
+        sample_indices = numpy.arange(len(store))
+
+    sample_indices = numpy.asarray(sample_indices, dtype='int64')
+    length = int(store.index[sample_indices, 1].min())
+    return numpy.column_stack([store[sample_index][:length, 3] for sample_index in sample_indices])
+
+
+def close_panel(bars_by_ticker):
+    """
+    Close prices of get_google_finance_intraday() frames aligned on their timestamps, gaps filled with the last
+    close and bars before the latest first bar dropped.
+
+    :param bars_by_ticker: dict of ticker to bars pandas.DataFrame, as returned by get_intraday_many(), None and
+    empty frames being skipped
+    :return: pandas.DataFrame indexed by timestamp, one column per ticker
+    """
+    import pandas
+
+    closes = dict((ticker, bars['close']) for ticker, bars in bars_by_ticker.items()
+                  if bars is not None and len(bars))
+    return pandas.DataFrame(closes).sort_index().ffill().dropna()
+
+
+def candidate_pairs(count):
+    """
+
+    :param count: number of instruments
+    :return: (first, second) int64 arrays of the count * (count - 1) / 2 pairs, first < second
+    """
+    first, second = numpy.triu_indices(count, k=1)
+    return first.astype('int64'), second.astype('int64')
+
+
+@instrument.timed('pairs.engle_granger')
+def engle_granger(log_prices, first=None, second=None):
+    """
+    Engle-Granger statistics of every pair over the whole panel.
+
+    The Dickey-Fuller regression has neither constant nor lags: delta spread = gamma * lagged spread. Half-lives
+    are in bars, NaN for diverging spreads.
+
+    :param log_prices: float64 array of shape (bar, instrument)
+    :param first: instruments regressed, candidate_pairs() when first and second are None
+    :param second: instruments regressed on
+    :return: dict of 'first', 'second', 'beta', 'alpha', 't_stat', 'half_life' arrays, one item per pair
+    """
+    if first is None:
+        first, second = candidate_pairs(log_prices.shape[1])
+
+    count_bars = len(log_prices)
+    means = log_prices.mean(axis=0)
+    centered = log_prices - means
+    lagged = centered[:-1]
+    deltas = numpy.diff(centered, axis=0)
+    # cross products of every instrument with every other, for the OLS fit then the Dickey-Fuller regression
+    levels = centered.T @ centered
+    lagged_levels = lagged.T @ lagged
+    delta_lagged = deltas.T @ lagged
+    delta_deltas = deltas.T @ deltas
+
+    beta = levels[first, second] / levels[second, second]
+    alpha = means[first] - beta * means[second]
+    lagged_squares = (lagged_levels[first, first] - 2 * beta * lagged_levels[first, second]
+                      + beta ** 2 * lagged_levels[second, second])
+    delta_products = (delta_lagged[first, first] - beta * (delta_lagged[first, second] + delta_lagged[second, first])
+                      + beta ** 2 * delta_lagged[second, second])
+    delta_squares = (delta_deltas[first, first] - 2 * beta * delta_deltas[first, second]
+                     + beta ** 2 * delta_deltas[second, second])
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        gamma = delta_products / lagged_squares
+        residual_variance = (delta_squares - gamma * delta_products) / (count_bars - 2)
+        t_stat = gamma / numpy.sqrt(residual_variance / lagged_squares)
+        half_life = numpy.where((gamma < 0) & (gamma > -1), -numpy.log(2) / numpy.log1p(gamma), numpy.nan)
+
+    instrument.count('bars_processed', count_bars * log_prices.shape[1])
+    return {'first': first, 'second': second, 'beta': beta, 'alpha': alpha, 't_stat': t_stat,
+            'half_life': half_life}
+
+
+def screen(log_prices, critical_value=EG_CRITICAL_VALUES[0.05], min_half_life=None, max_half_life=None,
+           first=None, second=None):
+    """
+    Pairs whose spread looks stationary, sorted by increasing t statistic.
+
+    :param log_prices: float64 array of shape (bar, instrument), typically a formation period preceding the bars
+    traded
+    :param critical_value: pairs with a larger Engle-Granger t statistic are rejected
+    :param min_half_life: optional bound, in bars
+    :param max_half_life: optional bound, in bars
+    :return: dict of arrays, see engle_granger()
+    """
+    statistics = engle_granger(log_prices, first=first, second=second)
+    selected = statistics['t_stat'] < critical_value
+    if min_half_life is not None:
+        selected &= statistics['half_life'] >= min_half_life
+
+    if max_half_life is not None:
+        selected &= statistics['half_life'] <= max_half_life
+
+    selected = numpy.flatnonzero(selected)
+    selected = selected[numpy.argsort(statistics['t_stat'][selected], kind='stable')]
+    return dict((name, values[selected]) for name, values in statistics.items())
+
+
+def _rolling_sums(values, window, out=None):
+    """
+    Sums over the window ending at each bar, NaN over the first window - 1 bars.
+
+    :param values: float64 array of shape (bar, ...)
+    :param out: optional output array, possibly values itself
+    """
+    cumulated = numpy.cumsum(values, axis=0, out=out)
+    # overlapping operands are buffered by numpy, the subtraction reads the cumulative sums before any update
+    cumulated[window:] -= cumulated[:-window]
+    cumulated[:window - 1] = numpy.nan
+    return cumulated
+
+
+def _rolling_moments(log_prices, window):
+    """
+    Per instrument terms of the rolling regressions, computed once for every block of pairs.
+
+    :return: (centered prices, rolling sums, deviations from the rolling mean, window times the rolling sum of
+    squared deviations)
+    """
+    centered = log_prices - log_prices.mean(axis=0)
+    sums = _rolling_sums(centered, window)
+    deviations = centered - sums / window
+    variances = window * _rolling_sums(centered ** 2, window) - sums ** 2
+    return centered, sums, deviations, variances
+
+
+def rolling_spreads(log_prices, first, second, window, z_window=None, _moments=None):
+    """
+    Rolling OLS of first on second over the window ending at each bar, and z-score of the spread against its own
+    mean and standard deviation over z_window bars.
+
+    Rolling sums are taken as differences of cumulative sums, prices being centered on their mean beforehand to
+    keep the differences accurate. Only the cross products depend on the pair, the other sums being per
+    instrument.
+
+    :param log_prices: float64 array of shape (bar, instrument)
+    :param first: int64 array of instruments regressed
+    :param second: int64 array of instruments regressed on
+    :param window: bars per regression
+    :param z_window: bars per z-score, window when None
+    :return: dict of 'beta', 'spread', 'zscore' float64 arrays of shape (bar, pair), NaN until enough bars
+    """
+    z_window = z_window or window
+    centered, sums, deviations, variances = _moments or _rolling_moments(log_prices, window)
+    beta = centered[:, first]
+    beta *= centered[:, second]
+    _rolling_sums(beta, window, out=beta)
+    beta *= window
+    beta -= sums[:, first] * sums[:, second]
+    beta /= variances[:, second]
+    # first - alpha - beta * second, alpha being the difference of the rolling means
+    spread = deviations[:, second]
+    spread *= -beta
+    spread += deviations[:, first]
+
+    # the spread is defined from bar window - 1 on, z-scores from bar window + z_window - 2 on
+    spread_mean = numpy.nan_to_num(spread)
+    spread_variance = spread_mean ** 2
+    _rolling_sums(spread_mean, z_window, out=spread_mean)
+    spread_mean /= z_window
+    _rolling_sums(spread_variance, z_window, out=spread_variance)
+    spread_variance /= z_window
+    spread_variance -= spread_mean ** 2
+    numpy.maximum(spread_variance, 0., out=spread_variance)
+    zscore = spread - spread_mean
+    del spread_mean
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        zscore /= numpy.sqrt(spread_variance, out=spread_variance)
+
+    zscore[:window + z_window - 2] = numpy.nan
+    return {'beta': beta, 'spread': spread, 'zscore': zscore}
+
+
+def iter_rolling_spreads(log_prices, first, second, window, z_window=None, max_bytes=_DEFAULT_BLOCK_BYTES):
+    """
+    rolling_spreads() block after block of pairs, per instrument rolling sums being computed once.
+
+    :param max_bytes: memory budget of a block
+    :return: iterator of (pair slice, rolling_spreads() dict)
+    """
+    block_size = max(1, max_bytes // (_BLOCK_ARRAYS * 8 * max(1, len(log_prices))))
+    moments = _rolling_moments(log_prices, window)
+    for start in range(0, len(first), block_size):
+        block = slice(start, start + block_size)
+        yield block, rolling_spreads(log_prices, first[block], second[block], window, z_window=z_window,
+                                     _moments=moments)
+
+
+def _hysteresis(enter, leave):
+    """
+    Regimes entered on enter and left on leave, carried over bars where neither holds: vectorized along the bars
+    by forward filling the last decisive bar.
+
+    :param enter: boolean array of shape (bar, pair)
+    :param leave: boolean array of shape (bar, pair), enter taking precedence
+    :return: boolean array of shape (bar, pair)
+    """
+    decisive = enter | leave
+    rows = numpy.where(decisive, numpy.arange(len(enter))[:, numpy.newaxis], -1)
+    last_decisive = numpy.maximum.accumulate(rows, axis=0)
+    columns = numpy.arange(enter.shape[1])[numpy.newaxis, :]
+    return (last_decisive >= 0) & enter[numpy.maximum(last_decisive, 0), columns]
+
+
+def spread_regimes(zscore, entry=2., exit=0.5):
+    """
+    Long spread from a z-score below -entry until it rises above -exit, short spread from above entry until it
+    falls below exit. Undefined z-scores close positions.
+
+    :param zscore: float64 array of shape (bar, pair)
+    :return: (long, short) boolean arrays of shape (bar, pair)
+    """
+    undefined = numpy.isnan(zscore)
+    with numpy.errstate(invalid='ignore'):
+        long_regime = _hysteresis(zscore < -entry, (zscore > -exit) | undefined)
+        short_regime = _hysteresis(zscore > entry, (zscore < exit) | undefined)
+
+    return long_regime, short_regime
+
+
+@instrument.timed('pairs.pair_trades')
+def pair_trades(log_prices, index, first, second, window, z_window=None, entry=2., exit=0.5,
+                max_bytes=_DEFAULT_BLOCK_BYTES):
+    """
+    Trades of every pair, computed block after block of pairs.
+
+    :param log_prices: float64 array of shape (bar, instrument)
+    :param index: timestamps of the bars
+    :param first: int64 array of instruments regressed
+    :param second: int64 array of instruments regressed on
+    :param window: bars per hedge ratio regression
+    :param z_window: bars per z-score, window when None
+    :param entry: absolute z-score opening a trade
+    :param exit: absolute z-score closing it
+    :param max_bytes: memory budget of a block of pairs
+    :return: list of (long trades, short trades, long open, short open) per pair, as returned by
+    ichimoku.long_short_rules_1()
+    """
+    index = numpy.asarray(index)
+    trades = list()
+    for block, spreads in iter_rolling_spreads(log_prices, first, second, window, z_window=z_window,
+                                               max_bytes=max_bytes):
+        long_regime, short_regime = spread_regimes(spreads['zscore'], entry=entry, exit=exit)
+        for column in range(long_regime.shape[1]):
+            long_trades, long_open = trade_spans(long_regime[:, column], index)
+            short_trades, short_open = trade_spans(short_regime[:, column], index)
+            trades.append((long_trades, short_trades, long_open, short_open))
+
+        instrument.count('bars_processed', len(log_prices) * long_regime.shape[1])
+
+    instrument.count('signals_emitted', sum(len(long_trades) + len(short_trades)
+                                            for long_trades, short_trades, long_open, short_open in trades))
+    return trades
@@ -0,0 +1,308 @@
+"""
+Aggregation of ticks or fine grained bars into OHLCV bars of any size.
+
+Every kind of bar boils down to a non-decreasing bucket id per input row: the bar it belongs to. Bars then come out
+of a single reduceat pass over the rows where the bucket changes:
+
+- time bars: timestamp // interval, intervals without any row producing no bar
+- tick bars: row number // ticks per bar
+- volume bars: volume traded before the row // volume per bar
+
+Ticks are passed as a single price array, bars as open, high, low, close arrays. Resampler does the same over
+successive chunks of a stream, holding the in-progress bar back until a row of the next bar shows up.
+"""
+import datetime
+
+import numpy
+
+FIELDS = ['timestamp', 'open', 'high', 'low', 'close', 'volume', 'count']
+
+
+def aggregate(starts, px_open, px_high, px_low, px_close, volume=None, counts=None):
+    """
+    Reduces consecutive rows into bars.
+
+    :param starts: int64 array, first row of every bar, increasing and starting at 0
+    :param px_open: float64 array
+    :param px_high: float64 array
+    :param px_low: float64 array
+    :param px_close: float64 array
+    :param volume: optional volume array, summed
+    :param counts: optional number of ticks per row, summed, 1 per row when None
+    :return: dict of 'open', 'high', 'low', 'close', 'volume' and 'count' arrays, one item per bar
+    """
+    ends = numpy.append(starts[1:], len(px_open)) if len(starts) else starts
+    return {'open': px_open[starts],
+            'high': _reduce(numpy.maximum, px_high, starts),
+            'low': _reduce(numpy.minimum, px_low, starts),
+            'close': px_close[ends - 1],
+            'volume': numpy.zeros(len(starts)) if volume is None else _reduce(numpy.add, volume, starts),
+            'count': ends - starts if counts is None else _reduce(numpy.add, counts, starts)}
+
+
+def _reduce(ufunc, values, starts):
+    # reduceat rejects an empty list of indices
+    return ufunc.reduceat(values, starts) if len(starts) else values[:0]
+
+
+def _nanoseconds(value):
+    """
+    Timestamps, durations or plain integers as int64 nanoseconds.
+    """
+    # numpy.timedelta64 derives from numpy.integer
+    if isinstance(value, (numpy.timedelta64, datetime.timedelta)):
+        return int(numpy.timedelta64(value).astype('timedelta64[ns]').astype('int64'))
+
+    if isinstance(value, (int, numpy.integer)):
+        return int(value)
+
+    return int(numpy.datetime64(value, 'ns').astype('int64'))
+
+
+def bucket_starts(buckets):
+    """
+
+    :param buckets: non-decreasing bucket ids
+    :return: int64 array of the rows starting a bucket
+    """
+    if not len(buckets):
+        return numpy.zeros(0, dtype='int64')
+
+    return numpy.concatenate(([0], numpy.flatnonzero(buckets[1:] != buckets[:-1]) + 1))
+
+
+def time_buckets(timestamps, interval, origin=0):
+    """
+
+    :param timestamps: datetime64 array, or int64 nanoseconds
+    :param interval: numpy.timedelta64, or int64 nanoseconds
+    :param origin: bars are aligned on origin + k * interval, the epoch by default
+    :return: int64 bucket ids
+    """
+    nanoseconds = numpy.asarray(timestamps).astype('datetime64[ns]').view('int64')
+    return (nanoseconds - _nanoseconds(origin)) // _nanoseconds(interval)
+
+
+def tick_buckets(count, ticks_per_bar, offset=0):
+    """
+
+    :param count: number of rows
+    :param ticks_per_bar:
+    :param offset: rows seen before these ones
+    """
+    return (numpy.arange(count, dtype='int64') + offset) // ticks_per_bar
+
+
+def volume_buckets(volume, bar_volume, offset=0):
+    """
+    A row belongs to the bar in progress when it trades, so that a bar closes with the row reaching bar_volume.
+
+    :param volume: volume per row
+    :param bar_volume: volume per bar
+    :param offset: volume traded before these rows
+    """
+    traded_before = numpy.cumsum(volume) - volume + offset
+    return (traded_before // bar_volume).astype('int64')
+
+
+def resample(px_open, px_high=None, px_low=None, px_close=None, volume=None, timestamps=None, interval=None,
+             ticks=None, bar_volume=None, origin=0, label='left', counts=None):
+    """
+    Aggregates ticks, or bars, into bars of exactly one kind: interval, ticks or bar_volume.
+
+    :param px_open: prices of ticks, or open of bars
+    :param px_high: high of bars, px_open for ticks
+    :param px_low: low of bars, px_open for ticks
+    :param px_close: close of bars, px_open for ticks
+    :param volume: optional volume per row
+    :param timestamps: datetime64 array, required by time bars
+    :param interval: numpy.timedelta64, for time bars
+    :param ticks: rows per bar, for tick bars
+    :param bar_volume: volume per bar, for volume bars
+    :param origin: alignment of time bars
+    :param label: time bars are labelled by the start ('left') or the end ('right') of their interval, other bars
+    by the timestamp of their first or last row
+    :param counts: ticks per row when resampling bars, 1 per row when None
+    :return: dict of arrays, see FIELDS, 'timestamp' being None without timestamps
+    """
+    if sum(option is not None for option in (interval, ticks, bar_volume)) != 1:
+        raise ValueError('exactly one of interval, ticks and bar_volume is expected')
+
+    px_open = numpy.asarray(px_open)
+    px_high = px_open if px_high is None else numpy.asarray(px_high)
+    px_low = px_open if px_low is None else numpy.asarray(px_low)
+    px_close = px_open if px_close is None else numpy.asarray(px_close)
+    if interval is not None:
+        if timestamps is None:
+            raise ValueError('time bars require timestamps')
+
+        buckets = time_buckets(timestamps, interval, origin=origin)
+
+    elif ticks is not None:
+        buckets = tick_buckets(len(px_open), ticks)
+
+    else:
+        if volume is None:
+            raise ValueError('volume bars require volume')
+
+        buckets = volume_buckets(numpy.asarray(volume), bar_volume)
+
+    starts = bucket_starts(buckets)
+    bars = aggregate(starts, px_open, px_high, px_low, px_close,
+                     volume=None if volume is None else numpy.asarray(volume),
+                     counts=None if counts is None else numpy.asarray(counts))
+    bars['timestamp'] = _labels(buckets, starts, timestamps, interval, origin, label)
+    return bars
+
+
+def interval_labels(buckets, interval, origin=0, label='left'):
+    """
+
+    :param buckets: time bucket ids, see time_buckets()
+    :return: datetime64[ns] array of the start, or end, of the buckets
+    """
+    left = numpy.asarray(buckets, dtype='int64') * _nanoseconds(interval) + _nanoseconds(origin)
+    return (left + (_nanoseconds(interval) if label == 'right' else 0)).view('datetime64[ns]')
+
+
+def _labels(buckets, starts, timestamps, interval, origin, label):
+    if timestamps is None:
+        return None
+
+    if interval is not None:
+        return interval_labels(buckets[starts], interval, origin=origin, label=label)
+
+    timestamps = numpy.asarray(timestamps).astype('datetime64[ns]')
+    if label == 'right':
+        return timestamps[numpy.append(starts[1:], len(timestamps)) - 1]
+
+    return timestamps[starts]
+
+
+def resample_df(ohlcv_df, interval=None, ticks=None, bar_volume=None, origin=0, label='left'):
+    """
+    DataFrame front end of resample(): either bars with 'open', 'high', 'low', 'close' and optionally 'volume' and
+    'count' columns, or ticks with a 'price' column, indexed by timestamp.
+
+    :return: pandas.DataFrame indexed by timestamp with 'open', 'high', 'low', 'close', 'volume', 'count' columns
+    """
+    import pandas
+
+    volume = ohlcv_df['volume'].values if 'volume' in ohlcv_df.columns else None
+    counts = ohlcv_df['count'].values if 'count' in ohlcv_df.columns else None
+    if 'price' in ohlcv_df.columns:
+        prices = [ohlcv_df['price'].values.astype('float64')] * 4
+
+    else:
+        prices = [ohlcv_df[name].values.astype('float64') for name in ('open', 'high', 'low', 'close')]
+
+    bars = resample(*prices, volume=volume, timestamps=ohlcv_df.index.values, interval=interval, ticks=ticks,
+                    bar_volume=bar_volume, origin=origin, label=label, counts=counts)
+    index = pandas.DatetimeIndex(bars.pop('timestamp'), name=ohlcv_df.index.name)
+    return pandas.DataFrame(bars, index=index, columns=FIELDS[1:])
+
+
+class Resampler(object):
+    """
+    Streaming resample(): feed chunks of rows to update(), which returns the bars completed so far. The bar in
+    progress is kept until a row of a later bar arrives, or until flush().
+    """
+
+    def __init__(self, interval=None, ticks=None, bar_volume=None, origin=0, label='left'):
+        if sum(option is not None for option in (interval, ticks, bar_volume)) != 1:
+            raise ValueError('exactly one of interval, ticks and bar_volume is expected')
+
+        self.interval = interval
+        self.ticks = ticks
+        self.bar_volume = bar_volume
+        self.origin = origin
+        self.label = label
+        self._rows = 0
+        self._traded = 0
+        # bucket id and fields of the bar in progress
+        self._pending = None
+
+    def _buckets(self, count, volume, timestamps):
+        if self.interval is not None:
+            return time_buckets(timestamps, self.interval, origin=self.origin)
+
+        if self.ticks is not None:
+            return tick_buckets(count, self.ticks, offset=self._rows)
+
+        return volume_buckets(volume, self.bar_volume, offset=self._traded)
+
+    def update(self, px_open, px_high=None, px_low=None, px_close=None, volume=None, timestamps=None, counts=None):
+        """
+        See resample() for the arguments.
+
+        :return: dict of arrays of the bars completed by these rows, possibly empty
+        """
+        px_open = numpy.asarray(px_open, dtype='float64')
+        px_high = px_open if px_high is None else numpy.asarray(px_high, dtype='float64')
+        px_low = px_open if px_low is None else numpy.asarray(px_low, dtype='float64')
+        px_close = px_open if px_close is None else numpy.asarray(px_close, dtype='float64')
+        volume = numpy.zeros(len(px_open)) if volume is None else numpy.asarray(volume, dtype='float64')
+        if timestamps is None:
+            timestamps = numpy.full(len(px_open), numpy.datetime64('NaT'), dtype='datetime64[ns]')
+
+        timestamps = numpy.asarray(timestamps).astype('datetime64[ns]')
+        buckets = self._buckets(len(px_open), volume, timestamps)
+        self._rows += len(px_open)
+        self._traded += volume.sum()
+        if not len(buckets):
+            return self._empty()
+
+        starts = bucket_starts(buckets)
+        bars = aggregate(starts, px_open, px_high, px_low, px_close, volume=volume,
+                         counts=None if counts is None else numpy.asarray(counts))
+        bars['bucket'] = buckets[starts]
+        bars['first'] = timestamps[starts]
+        bars['last'] = timestamps[numpy.append(starts[1:], len(timestamps)) - 1]
+        if self._pending is not None:
+            if self._pending['bucket'] == bars['bucket'][0]:
+                _merge_first(bars, self._pending)
+
+            else:
+                bars = dict((name, numpy.concatenate(([self._pending[name]], values)))
+                            for name, values in bars.items())
+
+        self._pending = dict((name, values[-1]) for name, values in bars.items())
+        return self._completed(dict((name, values[:-1]) for name, values in bars.items()))
+
+    def flush(self):
+        """
+
+        :return: the bar in progress, as a dict of arrays of length 0 or 1
+        """
+        if self._pending is None:
+            return self._empty()
+
+        bars = dict((name, numpy.array([value])) for name, value in self._pending.items())
+        self._pending = None
+        return self._completed(bars)
+
+    def _empty(self):
+        output = dict((name, numpy.zeros(0)) for name in FIELDS)
+        output['timestamp'] = numpy.zeros(0, dtype='datetime64[ns]')
+        output['count'] = numpy.zeros(0, dtype='int64')
+        return output
+
+    def _completed(self, bars):
+        if self.interval is not None:
+            timestamps = interval_labels(bars['bucket'], self.interval, origin=self.origin, label=self.label)
+
+        else:
+            timestamps = bars['last'] if self.label == 'right' else bars['first']
+
+        output = dict((name, bars[name]) for name in FIELDS[1:])
+        output['timestamp'] = timestamps
+        return output
+
+
+def _merge_first(bars, pending):
+    bars['open'][0] = pending['open']
+    bars['high'][0] = max(bars['high'][0], pending['high'])
+    bars['low'][0] = min(bars['low'][0], pending['low'])
+    bars['volume'][0] += pending['volume']
+    bars['count'][0] += pending['count']
+    bars['first'][0] = pending['first']
@@ -0,0 +1,342 @@
+"""
+Live Ichimoku rules 1 signals over a bar stream.
+
+A feed coroutine pushes ticks, all the bars sharing a timestamp, into a bounded queue: a slow consumer blocks the
+feed instead of letting the backlog grow. Each tick is evaluated in one vectorized update across its symbols, and
+regime changes are pushed as entry and exit events to a second bounded queue drained by the sink.
+
+Feeds yield Tick tuples and exist for:
+
+- replays of the benchmark store, one sample per symbol, at a given number of ticks per second
+- text lines 'timestamp,symbol,open,high,low,close', read from a file being appended to or from a TCP socket, a
+  blank line or a short silence ending the current tick
+"""
+import asyncio
+import logging
+import time
+from collections import namedtuple
+
+import numpy
+
+from benchmarkstore import BenchmarkStore
+from ichimoku.streaming import RulesPanelState
+from montecarlo import QuantileSketch
+
+Tick = namedtuple('Tick', ['timestamp', 'symbols', 'ohlc', 'received'])
+SignalEvent = namedtuple('SignalEvent', ['timestamp', 'symbol', 'side', 'action', 'price'])
+
+
+async def replay_store(store_path, symbols=1000, speed=None, start_time=numpy.datetime64('2010-01-01T09:01'),
+                       bar_duration=numpy.timedelta64(1, 'm')):
+    """
+    Replays benchmark samples as a synchronized multi-symbol feed.
+
+    Symbol i plays sample i modulo the number of samples, shifted by one bar per wrap around so that symbols
+    sharing a sample differ.
+
+    :param store_path: BenchmarkStore folder
+    :param symbols: number of symbols
+    :param speed: ticks per second, as fast as possible when None
+    :param start_time: timestamp of the first tick
+    :param bar_duration: time between ticks
+    """
+    store = BenchmarkStore(store_path)
+    sample_indices = numpy.arange(symbols) % len(store)
+    offsets = numpy.arange(symbols) // len(store)
+    starts = store.index[sample_indices, 0] + offsets
+    length = int((store.index[sample_indices, 1] - offsets).min())
+    names = ['S%04d' % symbol for symbol in range(symbols)]
+    loop = asyncio.get_running_loop()
+    origin = loop.time()
+    for bar in range(length):
+        if speed:
+            delay = origin + bar / speed - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+        yield Tick(start_time + bar * bar_duration, names, numpy.asarray(store.data[starts + bar]),
+                   time.perf_counter())
+
+
+def _parse_line(line):
+    timestamp, symbol, px_open, px_high, px_low, px_close = line.strip().split(',')[:6]
+    return timestamp, symbol, (float(px_open), float(px_high), float(px_low), float(px_close))
+
+
+async def ticks_from_lines(lines, flush_timeout=0.05):
+    """
+    Groups consecutive lines sharing a timestamp into ticks. A tick is complete when a blank line ends it, when the
+    next timestamp shows up, when no line arrives for flush_timeout seconds or when the line source ends.
+
+    Ticks are stamped as received when their first line is read, so that the time spent waiting for the tick to
+    complete counts in its latency.
+
+    :param lines: async iterable of 'timestamp,symbol,open,high,low,close' strings
+    :param flush_timeout: seconds without lines after which the pending tick is emitted, None to wait for the next
+    timestamp or a blank line
+    """
+    current = None
+    received = None
+    symbols = list()
+    rows = list()
+    iterator = lines.__aiter__()
+    next_line = asyncio.ensure_future(iterator.__anext__())
+    try:
+        while True:
+            # the pending read is kept across timeouts instead of being cancelled, which would close the source
+            done, pending = await asyncio.wait({next_line}, timeout=flush_timeout if symbols else None)
+            if not done:
+                yield Tick(numpy.datetime64(current), symbols, numpy.array(rows), received)
+                symbols = list()
+                rows = list()
+                continue
+
+            try:
+                line = next_line.result()
+
+            except StopAsyncIteration:
+                break
+
+            next_line = asyncio.ensure_future(iterator.__anext__())
+            if not line.strip():
+                if symbols:
+                    yield Tick(numpy.datetime64(current), symbols, numpy.array(rows), received)
+                    symbols = list()
+                    rows = list()
+
+                continue
+
+            timestamp, symbol, row = _parse_line(line)
+            if timestamp != current and symbols:
+                yield Tick(numpy.datetime64(current), symbols, numpy.array(rows), received)
+                symbols = list()
+                rows = list()
+
+            if not symbols:
+                received = time.perf_counter()
+
+            current = timestamp
+            symbols.append(symbol)
+            rows.append(row)
+
+    finally:
+        next_line.cancel()
+
+    if symbols:
+        yield Tick(numpy.datetime64(current), symbols, numpy.array(rows), received)
+
+
+async def tail_lines(path, follow=True, poll_interval=0.05):
+    """
+
+    :param path: text file, read from its start
+    :param follow: keeps waiting for appended lines instead of stopping at the end of file
+    :param poll_interval: seconds between checks for appended lines
+    """
+    with open(path) as lines_file:
+        partial = ''
+        while True:
+            line = lines_file.readline()
+            if line.endswith('\n'):
+                yield partial + line
+                partial = ''
+
+            elif line:
+                partial += line
+
+            elif follow:
+                await asyncio.sleep(poll_interval)
+
+            else:
+                if partial:
+                    yield partial
+
+                return
+
+
+async def socket_lines(host, port):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+
+            yield line.decode()
+
+    finally:
+        writer.close()
+
+
+class LatencyStats(object):
+    """
+    Per-tick latencies in seconds: quantiles within 1%, maximum and number of ticks over budget.
+
+    Latencies are buffered and folded into the sketch in batches, keeping the per-tick cost to an append.
+    """
+
+    def __init__(self, budget=None, batch_size=1024):
+        self.budget = budget
+        self.batch_size = batch_size
+        self.sketch = QuantileSketch()
+        self.maximum = 0.
+        self.over_budget = 0
+        self._buffer = list()
+
+    def add(self, latency):
+        self._buffer.append(latency)
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        if not self._buffer:
+            return
+
+        latencies = numpy.array(self._buffer)
+        self._buffer = list()
+        self.sketch.update(latencies)
+        self.maximum = max(self.maximum, float(latencies.max()))
+        if self.budget is not None:
+            self.over_budget += int((latencies > self.budget).sum())
+
+    def report(self, quantiles=(0.5, 0.99, 0.999)):
+        self.flush()
+        output = dict(('p%g' % (100 * q), self.sketch.quantile(q)) for q in quantiles)
+        output.update({'count': self.sketch.count, 'max': self.maximum, 'over_budget': self.over_budget})
+        return output
+
+
+def log_events(events):
+    for event in events:
+        logging.info('%s %s %s %s at %.4f', event.timestamp, event.symbol, event.side, event.action, event.price)
+
+
+class SignalDaemon(object):
+    """
+    Consumes a feed and emits SignalEvent lists, one per tick having regime changes.
+
+    Latencies are measured per tick from the feed handing it over (Tick.received) to its events being queued
+    (end_to_end), and from being dequeued to its events being queued (processing).
+    """
+
+    def __init__(self, queue_size=16, latency_budget=None, **periods):
+        """
+
+        :param queue_size: capacity, in ticks, of the feed and event queues
+        :param latency_budget: end to end latency in seconds, ticks above it are counted and logged
+        :param periods: tenkan, kijun, senkou and displacement, see RulesPanelState
+        """
+        self.queue_size = queue_size
+        self.state = RulesPanelState(**periods)
+        self.columns = dict()
+        self.names = list()
+        self._bullish = numpy.zeros(0, dtype=bool)
+        self._bearish = numpy.zeros(0, dtype=bool)
+        self.end_to_end = LatencyStats(latency_budget)
+        self.processing = LatencyStats()
+        self.ticks = 0
+        self.events = 0
+
+    def _columns(self, symbols):
+        unknown = [symbol for symbol in dict.fromkeys(symbols) if symbol not in self.columns]
+        if unknown:
+            first = self.state.add_symbols(len(unknown))
+            self.columns.update((symbol, first + offset) for offset, symbol in enumerate(unknown))
+            self.names.extend(unknown)
+            self._bullish = numpy.concatenate((self._bullish, numpy.zeros(len(unknown), dtype=bool)))
+            self._bearish = numpy.concatenate((self._bearish, numpy.zeros(len(unknown), dtype=bool)))
+
+        columns = self.columns
+        return numpy.array([columns[symbol] for symbol in symbols], dtype='int64')
+
+    def process(self, tick):
+        """
+        Updates the state with one tick.
+
+        :param tick: Tick
+        :return: list of SignalEvent
+        """
+        columns = self._columns(tick.symbols)
+        ohlc = numpy.asarray(tick.ohlc, dtype='float64')
+        bullish, bearish = self.state.update(columns, ohlc[:, 1], ohlc[:, 2], ohlc[:, 3])
+        events = list()
+        for side, previous, current in (('long', self._bullish, bullish), ('short', self._bearish, bearish)):
+            changed = numpy.flatnonzero(previous[columns] != current)
+            for position in changed.tolist():
+                action = 'entry' if current[position] else 'exit'
+                events.append(SignalEvent(tick.timestamp, self.names[columns[position]], side, action,
+                                          float(ohlc[position, 3])))
+
+            previous[columns] = current
+
+        return events
+
+    async def _produce(self, feed, ticks):
+        async for tick in feed:
+            await ticks.put(tick)
+
+        await ticks.put(None)
+
+    async def _process(self, ticks, events):
+        while True:
+            tick = await ticks.get()
+            if tick is None:
+                break
+
+            dequeued = time.perf_counter()
+            tick_events = self.process(tick)
+            if tick_events:
+                await events.put(tick_events)
+
+            emitted = time.perf_counter()
+            self.processing.add(emitted - dequeued)
+            self.end_to_end.add(emitted - tick.received)
+            if self.end_to_end.budget is not None and emitted - tick.received > self.end_to_end.budget:
+                logging.warning('tick %s over latency budget: %.6fs', tick.timestamp, emitted - tick.received)
+
+            self.ticks += 1
+            self.events += len(tick_events)
+
+        await events.put(None)
+
+    async def _consume(self, events, sink):
+        while True:
+            batch = await events.get()
+            if batch is None:
+                return
+
+            result = sink(batch)
+            if asyncio.iscoroutine(result):
+                await result
+
+    async def run(self, feed, sink=log_events):
+        """
+        The feed, the processing and the sink run as three tasks: the first one failing cancels the other two, which
+        could otherwise wait forever on a queue nobody drains or fills anymore, and its error is raised.
+
+        :param feed: async iterable of Tick
+        :param sink: callable(list of SignalEvent), possibly a coroutine function
+        :return: summary dict
+        """
+        ticks = asyncio.Queue(maxsize=self.queue_size)
+        events = asyncio.Queue(maxsize=self.queue_size)
+        tasks = [asyncio.create_task(self._produce(feed, ticks)),
+                 asyncio.create_task(self._process(ticks, events)),
+                 asyncio.create_task(self._consume(events, sink))]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in tasks:
+                if task.done() and task.exception() is not None:
+                    raise task.exception()
+
+        finally:
+            for task in tasks:
+                task.cancel()
+
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        return self.summary()
+
+    def summary(self):
+        return {'ticks': self.ticks, 'symbols': len(self.names), 'events': self.events,
+                'end_to_end': self.end_to_end.report(), 'processing': self.processing.report()}
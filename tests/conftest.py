@@ -0,0 +1,5 @@
+import os
+import sys
+
+_ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.sep.join([_ROOT_PATH, 'src']), os.path.sep.join([_ROOT_PATH, 'scripts'])]
@@ -0,0 +1,41 @@
+import numpy
+import pandas
+import pytest
+
+from barstore import BarStore
+
+
+def minute_bars(start, count, columns=('open', 'high', 'low', 'close', 'volume')):
+    index = pandas.date_range(start, periods=count, freq='min', name='Date')
+    values = numpy.arange(count * len(columns), dtype='float64').reshape(count, len(columns))
+    return pandas.DataFrame(values, index=index, columns=list(columns))
+
+
+def test_append_reorders_columns(tmp_path):
+    store = BarStore(str(tmp_path))
+    store.write_bars('XYZ', minute_bars('2010-01-04 09:30', 10), bar_size=60)
+    appended = minute_bars('2010-01-05 09:30', 10)
+    store.append_bars('XYZ', appended[['close', 'open', 'high', 'low', 'volume']])
+    bars = store.read_bars('XYZ')
+    assert list(bars.columns) == ['open', 'high', 'low', 'close', 'volume']
+    assert len(bars) == 20
+    numpy.testing.assert_array_equal(bars.iloc[10:].values, appended.values)
+
+
+def test_append_rejects_other_columns(tmp_path):
+    store = BarStore(str(tmp_path))
+    store.write_bars('XYZ', minute_bars('2010-01-04 09:30', 10))
+    with pytest.raises(ValueError):
+        store.append_bars('XYZ', minute_bars('2010-01-05 09:30', 10, columns=('open', 'high', 'low', 'close')))
+
+    assert store.days('XYZ') == [pandas.Timestamp('2010-01-04').date()]
+
+
+def test_append_rejects_unsafe_dtype(tmp_path):
+    store = BarStore(str(tmp_path))
+    store.write_bars('XYZ', minute_bars('2010-01-04 09:30', 10).astype({'volume': 'int64'}))
+    with pytest.raises(ValueError):
+        store.append_bars('XYZ', minute_bars('2010-01-05 09:30', 10))
+
+    store.append_bars('XYZ', minute_bars('2010-01-05 09:30', 10).astype({'volume': 'int32'}))
+    assert store.read_bars('XYZ')['volume'].dtype == numpy.dtype('int64')
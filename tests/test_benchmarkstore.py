@@ -0,0 +1,16 @@
+import numpy
+import pytest
+
+from benchmarkstore import BenchmarkStore, BenchmarkStoreWriter
+
+
+def test_rejects_empty_sample(tmp_path):
+    sample = numpy.arange(12.).reshape(3, 4)
+    with BenchmarkStoreWriter(str(tmp_path)) as writer:
+        writer.append(sample)
+        with pytest.raises(ValueError):
+            writer.finish_sample()
+
+    store = BenchmarkStore(str(tmp_path))
+    assert len(store) == 1
+    numpy.testing.assert_array_equal(store[0], sample)
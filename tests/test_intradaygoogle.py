@@ -0,0 +1,71 @@
+import datetime
+
+import numpy
+import pandas
+import pytest
+
+import intradaygoogle
+from intradaygoogle import IntradayCache, get_intraday_cached, parse_getprices
+
+_HEADER = 'EXCHANGE%3DNASDAQ\nMARKET_OPEN_MINUTE=570\nMARKET_CLOSE_MINUTE=960\nINTERVAL=60\n' \
+          'COLUMNS=DATE,CLOSE,HIGH,LOW,OPEN,VOLUME\n'
+_ROWS = 'TIMEZONE_OFFSET=-240\na1262613600,10.5,10.6,10.4,10.45,1000\n1,10.55,10.6,10.5,10.5,500\n' \
+        '2,10.6,10.7,10.55,10.55,700\n'
+
+
+def test_parses_rows():
+    bars = parse_getprices((_HEADER + 'DATA=\n' + _ROWS).encode(), 60)
+    assert list(bars.columns) == ['open', 'high', 'low', 'close', 'volume']
+    assert list(bars['close']) == [10.5, 10.55, 10.6]
+    assert list(bars['open']) == [10.45, 10.5, 10.55]
+    expected = pandas.DatetimeIndex(['2010-01-04 10:00', '2010-01-04 10:01', '2010-01-04 10:02'],
+                                name='Date').as_unit('ns')
+    pandas.testing.assert_index_equal(bars.index, expected)
+
+
+def test_skips_header_without_data_line():
+    bars = parse_getprices((_HEADER + _ROWS).encode(), 60)
+    assert len(bars) == 3
+    # the COLUMNS line still orders the fields
+    assert list(bars['open']) == [10.45, 10.5, 10.55]
+    assert list(bars['high']) == [10.6, 10.6, 10.7]
+    assert list(bars['low']) == [10.4, 10.5, 10.55]
+    assert list(bars['close']) == [10.5, 10.55, 10.6]
+    assert list(bars['volume']) == [1000., 500., 700.]
+
+
+def test_empty_body():
+    for payload in (_HEADER + 'DATA=\n', _HEADER, ''):
+        bars = parse_getprices(payload.encode(), 60)
+        assert bars.empty
+        assert isinstance(bars.index, pandas.DatetimeIndex)
+        assert bars.index.name == 'Date'
+
+
+def day_bars(days):
+    index = pandas.DatetimeIndex([pandas.Timestamp(day) + pandas.Timedelta(minutes=570 + minute)
+                                  for day in days for minute in range(3)], name='Date')
+    values = numpy.arange(len(index) * 5, dtype='float64').reshape(len(index), 5)
+    return pandas.DataFrame(values, index=index, columns=['open', 'high', 'low', 'close', 'volume'])
+
+
+@pytest.mark.parametrize('cached_days, expected_request', [
+    # the cache holds the window up to yesterday
+    (['2010-01-04', '2010-01-05', '2010-01-06', '2010-01-07'], 1),
+    # the cache is up to date but starts after the window
+    (['2010-01-06', '2010-01-07'], 5),
+])
+def test_cached_fetches_missing_window(tmp_path, monkeypatch, cached_days, expected_request):
+    today = datetime.date(2010, 1, 8)
+    requested = list()
+
+    def fetch(ticker, period=60, days=1, session=None, base_url=None):
+        requested.append(days)
+        return day_bars(numpy.busday_offset(today, numpy.arange(1 - days, 1), roll='backward'))
+
+    monkeypatch.setattr(intradaygoogle, 'get_google_finance_intraday', fetch)
+    cache = IntradayCache(str(tmp_path))
+    cache.write('XYZ', 60, day_bars(cached_days), today)
+    bars = get_intraday_cached('XYZ', 60, 5, None, cache=cache, today=today)
+    assert requested == [expected_request]
+    assert sorted(set(bars.index.date)) == [datetime.date(2010, 1, day) for day in range(4, 9)]
@@ -0,0 +1,70 @@
+import numpy
+import pytest
+
+from benchmarkstore import BenchmarkStoreWriter
+from montecarlo import QuantileSketch, RunningMoments, TargetStopStrategy, chunk_bounds, read_columns, simulate
+
+
+def test_running_moments_match_numpy():
+    values = numpy.random.default_rng(0).normal(3., 2., 1000)
+    values[::97] = numpy.nan
+    moments = RunningMoments()
+    for batch in numpy.split(values, [1, 10, 400, 401]):
+        moments.update(batch)
+
+    expected = values[~numpy.isnan(values)]
+    assert moments.count == len(expected)
+    assert moments.mean == pytest.approx(expected.mean())
+    assert moments.variance == pytest.approx(expected.var(ddof=1))
+
+
+def test_quantile_sketch_within_relative_accuracy():
+    rng = numpy.random.default_rng(1)
+    values = numpy.concatenate((rng.lognormal(0., 2., 3000), -rng.lognormal(1., 1., 2000), numpy.zeros(500)))
+    sketch = QuantileSketch(relative_accuracy=0.01)
+    other = QuantileSketch(relative_accuracy=0.01)
+    sketch.update(values[::2])
+    other.update(values[1::2])
+    sketch.merge(other)
+    assert sketch.count == len(values)
+    for q in (0., 0.01, 0.2, 0.3, 0.35, 0.5, 0.9, 0.99, 1.):
+        expected = numpy.quantile(values, q, method='lower')
+        assert abs(sketch.quantile(q) - expected) <= 0.01 * abs(expected) * (1 + 1e-9)
+
+
+def test_chunk_bounds_cap_padded_bytes():
+    lengths = numpy.array([10, 10, 50, 10, 10, 10, 200, 10])
+    bounds = chunk_bounds(lengths, max_paths=3, max_bytes=100 * 4 * 8)
+    assert bounds == [0, 2, 4, 6, 7, 8]
+    assert chunk_bounds(lengths[:0], max_paths=3, max_bytes=1) == [0]
+
+
+@pytest.fixture
+def store_path(tmp_path):
+    rng = numpy.random.default_rng(2)
+    with BenchmarkStoreWriter(str(tmp_path / 'store')) as writer:
+        for length in rng.integers(200, 400, size=12).tolist():
+            close = numpy.round(100. * numpy.cumprod(1. + rng.normal(0., 2e-3, length)), 3)
+            writer.append(numpy.column_stack((close, close + 0.02, close - 0.02, close)))
+
+    return str(tmp_path / 'store')
+
+
+@pytest.mark.parametrize('path_length', [None, 150])
+def test_simulate_does_not_depend_on_workers(store_path, tmp_path, path_length):
+    strategy = TargetStopStrategy(entry_bars=10, target=0.2, stop=0.3, resolution=3)
+    # a few paths per chunk
+    options = dict(seed=3, store_path=store_path, path_length=path_length, max_chunk_bytes=400 * 4 * 8 * 5)
+    statistics = simulate(strategy, 100, workers=1, records_path=str(tmp_path / 'serial'), **options)
+    parallel = simulate(strategy, 100, workers=2, records_path=str(tmp_path / 'parallel'), **options)
+    assert statistics == parallel
+    serial_records = read_columns(str(tmp_path / 'serial'))
+    parallel_records = read_columns(str(tmp_path / 'parallel'))
+    for name, values in serial_records.items():
+        numpy.testing.assert_array_equal(values, parallel_records[name])
+
+    numpy.testing.assert_array_equal(serial_records['path'], numpy.arange(100))
+    single_chunk = simulate(strategy, 100, **dict(options, max_chunk_bytes=10 ** 9))
+    assert single_chunk['target_hit_rate'] == statistics['target_hit_rate']
+    assert single_chunk['drawdown_quantiles'] == statistics['drawdown_quantiles']
+    assert single_chunk['profit_mean'] == pytest.approx(statistics['profit_mean'])
@@ -0,0 +1,43 @@
+import matplotlib
+import numpy
+import pandas
+
+import ichimoku
+import ohlcplot
+
+matplotlib.use('Agg')
+
+
+def random_ohlc(count, seed=0):
+    rng = numpy.random.default_rng(seed)
+    close = 100. + numpy.cumsum(rng.normal(0., 1., count))
+    ohlc = numpy.column_stack((close, close + 1., close - 1., close))
+    index = pandas.date_range('2010-01-01 09:01', periods=count, freq='min')
+    return pandas.DataFrame(ohlc, index=index, columns=['open', 'high', 'low', 'close'])
+
+
+def candle_x(ax):
+    wicks = ax.candle_renderer._collections[0]
+    return numpy.array([segment[0, 0] for segment in wicks.get_segments()])
+
+
+def test_overlay_follows_candle_bins():
+    ohlc_df = random_ohlc(5000)
+    ax = ohlcplot.plot_ohlc(ohlc_df, max_bars=100)
+    overlay = ohlcplot.plot_ichimoku(ax, ichimoku.components(ohlc_df))
+    tenkan = overlay._lines[0]
+    x = candle_x(ax)
+    numpy.testing.assert_array_equal(tenkan.get_xdata()[:len(x)], x)
+
+    bars_x = ohlcplot.time_axis(ohlc_df.index)
+    lower, upper = bars_x[1000], bars_x[1500]
+    ax.set_xlim(lower, upper)
+    zoomed = candle_x(ax)
+    assert len(zoomed) > 50
+    # finer bins after zooming, shared by candles and lines
+    assert numpy.diff(zoomed).max() < numpy.diff(x).min()
+    line_x = tenkan.get_xdata()
+    numpy.testing.assert_array_equal(line_x[:len(zoomed)], zoomed)
+    kumo_x = numpy.concatenate([path.vertices[:, 0] for collection in overlay._kumo
+                                for path in collection.get_paths()])
+    assert kumo_x.min() >= zoomed[0] and numpy.isin(kumo_x, line_x).all()
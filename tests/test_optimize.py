@@ -0,0 +1,23 @@
+import numpy
+import pytest
+
+from ichimoku import parameter_grid, rules_1_masks, sweep
+from ichimoku.optimize import long_short_pnl
+from ichimoku.panel import components_panel
+from test_walkforward import random_ohlc
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_sweep_matches_one_combination_at_a_time(workers):
+    ohlc = random_ohlc(3000, seed=2)
+    high, low, close = [ohlc[name].values for name in ('high', 'low', 'close')]
+    grid = parameter_grid(tenkan=(5, 9), kijun=(20, 26), senkou=(52,), displacement=(13, 26))
+    # a small cache budget forces evictions while the grid is swept
+    output = sweep(ohlc, grid, workers=workers, max_cache_bytes=close.nbytes)
+    assert sorted(map(tuple, output[['tenkan', 'kijun', 'senkou', 'displacement']].values.tolist())) == sorted(grid)
+    for tenkan, kijun, senkou, displacement, score in output.itertuples(index=False):
+        ichimoku_components = components_panel(high, low, close, tenkan=tenkan, kijun=kijun, senkou=senkou,
+                                               displacement=displacement)
+        bullish, bearish = rules_1_masks(high, low, close, ichimoku_components=ichimoku_components,
+                                         displacement=displacement)
+        assert score == pytest.approx(long_short_pnl(bullish, bearish, close))
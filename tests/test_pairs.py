@@ -0,0 +1,115 @@
+import numpy
+import pytest
+
+import pairs
+
+
+def random_log_prices(count_bars, count_instruments, seed):
+    rng = numpy.random.default_rng(seed)
+    common = numpy.cumsum(rng.normal(0., 1e-2, count_bars))
+    loadings = rng.uniform(0.5, 1.5, count_instruments)
+    # mean reverting idiosyncratic parts, so that some spreads cross the entry thresholds
+    noise = rng.normal(0., 1e-2, (count_bars, count_instruments))
+    idiosyncratic = numpy.zeros_like(noise)
+    for bar in range(1, count_bars):
+        idiosyncratic[bar] = 0.9 * idiosyncratic[bar - 1] + noise[bar]
+
+    return 4.6 + common[:, numpy.newaxis] * loadings + idiosyncratic
+
+
+def test_rolling_spreads_match_polyfit():
+    log_prices = random_log_prices(300, 4, 0)
+    first, second = pairs.candidate_pairs(4)
+    window, z_window = 50, 30
+    spreads = pairs.rolling_spreads(log_prices, first, second, window, z_window=z_window)
+    for pair in (0, 3, 5):
+        x, y = log_prices[:, second[pair]], log_prices[:, first[pair]]
+        expected_spread = numpy.full(len(x), numpy.nan)
+        for bar in range(window - 1, len(x)):
+            slope, intercept = numpy.polyfit(x[bar - window + 1:bar + 1], y[bar - window + 1:bar + 1], 1)
+            expected_spread[bar] = y[bar] - intercept - slope * x[bar]
+            if bar in (window - 1, 120, len(x) - 1):
+                assert spreads['beta'][bar, pair] == pytest.approx(slope, rel=1e-6)
+
+        numpy.testing.assert_allclose(spreads['spread'][:, pair], expected_spread, atol=1e-9)
+        for bar in (window + z_window - 2, 200, len(x) - 1):
+            recent = expected_spread[bar - z_window + 1:bar + 1]
+            expected = (expected_spread[bar] - recent.mean()) / recent.std()
+            assert spreads['zscore'][bar, pair] == pytest.approx(expected, rel=1e-6)
+
+        assert numpy.isnan(spreads['zscore'][:window + z_window - 2, pair]).all()
+
+
+def test_engle_granger_matches_explicit_fit():
+    log_prices = random_log_prices(500, 3, 1)
+    statistics = pairs.engle_granger(log_prices)
+    for pair, (first, second) in enumerate(zip(statistics['first'].tolist(), statistics['second'].tolist())):
+        x, y = log_prices[:, second], log_prices[:, first]
+        beta, alpha = numpy.polyfit(x, y, 1)
+        residuals = y - alpha - beta * x
+        lagged, deltas = residuals[:-1], numpy.diff(residuals)
+        gamma = (deltas @ lagged) / (lagged @ lagged)
+        residual_variance = ((deltas - gamma * lagged) ** 2).sum() / (len(deltas) - 1)
+        t_stat = gamma / numpy.sqrt(residual_variance / (lagged @ lagged))
+        assert statistics['beta'][pair] == pytest.approx(beta, rel=1e-9)
+        assert statistics['alpha'][pair] == pytest.approx(alpha, rel=1e-9)
+        assert statistics['t_stat'][pair] == pytest.approx(t_stat, rel=1e-6)
+        assert statistics['half_life'][pair] == pytest.approx(-numpy.log(2) / numpy.log(1 + gamma), rel=1e-6)
+
+
+def loop_regimes(zscore, entry, exit):
+    long_regime = numpy.zeros(zscore.shape, dtype=bool)
+    short_regime = numpy.zeros(zscore.shape, dtype=bool)
+    for pair in range(zscore.shape[1]):
+        is_long = is_short = False
+        for bar, value in enumerate(zscore[:, pair].tolist()):
+            if numpy.isnan(value):
+                is_long = is_short = False
+
+            else:
+                if value < -entry:
+                    is_long = True
+
+                elif value > -exit:
+                    is_long = False
+
+                if value > entry:
+                    is_short = True
+
+                elif value < exit:
+                    is_short = False
+
+            long_regime[bar, pair] = is_long
+            short_regime[bar, pair] = is_short
+
+    return long_regime, short_regime
+
+
+def test_spread_regimes_match_state_machine():
+    rng = numpy.random.default_rng(2)
+    zscore = numpy.cumsum(rng.normal(0., 0.5, (400, 6)), axis=0) % 6. - 3.
+    zscore[:20] = numpy.nan
+    zscore[rng.random(zscore.shape) < 0.02] = numpy.nan
+    for entry, exit in ((2., 0.5), (1., -0.5)):
+        long_regime, short_regime = pairs.spread_regimes(zscore, entry=entry, exit=exit)
+        expected_long, expected_short = loop_regimes(zscore, entry, exit)
+        numpy.testing.assert_array_equal(long_regime, expected_long)
+        numpy.testing.assert_array_equal(short_regime, expected_short)
+
+
+def test_pair_trades_do_not_depend_on_blocks():
+    log_prices = random_log_prices(600, 6, 3)
+    index = numpy.datetime64('2010-01-01T09:01') + numpy.arange(len(log_prices)) * numpy.timedelta64(1, 'm')
+    first, second = pairs.candidate_pairs(6)
+    trades = pairs.pair_trades(log_prices, index, first, second, 60, entry=1.5, exit=0.)
+    # room for a couple of pairs per block
+    blocked = pairs.pair_trades(log_prices, index, first, second, 60, entry=1.5, exit=0., max_bytes=8 * 8 * 600 * 2)
+    assert len(trades) == len(blocked) == len(first)
+    assert sum(len(long_trades) + len(short_trades) for long_trades, short_trades, _, _ in trades)
+    for pair_trades, pair_blocked in zip(trades, blocked):
+        for values, blocked_values in zip(pair_trades, pair_blocked):
+            numpy.testing.assert_array_equal(values, blocked_values)
+
+        long_trades, short_trades, long_open, short_open = pair_trades
+        numpy.testing.assert_array_equal(long_open, long_trades[:, 1] == index[-1])
+        numpy.testing.assert_array_equal(short_open, short_trades[:, 1] == index[-1])
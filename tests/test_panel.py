@@ -0,0 +1,39 @@
+import numpy
+import pandas
+import pytest
+
+import ichimoku
+from ichimoku.panel import COMPONENT_NAMES, components_panel
+
+
+def random_ohlc(count, seed):
+    rng = numpy.random.default_rng(seed)
+    close = 100. + numpy.cumsum(rng.normal(0., 1., count))
+    spread = rng.uniform(0., 2., size=(2, count))
+    ohlc = numpy.column_stack((close, close + spread[0], close - spread[1], close))
+    index = pandas.date_range('2010-01-01 09:01', periods=count, freq='min')
+    return pandas.DataFrame(ohlc, index=index, columns=['open', 'high', 'low', 'close'])
+
+
+@pytest.mark.parametrize('periods', [{}, {'tenkan': 5, 'kijun': 13, 'senkou': 40, 'displacement': 1}])
+def test_matches_components_per_symbol(periods):
+    frames = [random_ohlc(200, seed) for seed in (1, 2)]
+    high, low, close = [numpy.column_stack([frame[field].values for frame in frames])
+                        for field in ('high', 'low', 'close')]
+    panel = components_panel(high, low, close, **periods)
+    for symbol, frame in enumerate(frames):
+        expected = ichimoku.components(frame, **periods)[COMPONENT_NAMES].values
+        numpy.testing.assert_allclose(panel[:, :, symbol].T, expected, equal_nan=True)
+
+
+def test_multiindex_frame():
+    frames = {'AAA': random_ohlc(100, 3), 'BBB': random_ohlc(100, 4)}
+    panel_df = pandas.concat(frames, axis=1)
+    panel = components_panel(panel_df)
+    expected = ichimoku.components(frames['BBB'])[COMPONENT_NAMES].values
+    numpy.testing.assert_allclose(panel[:, :, 1].T, expected, equal_nan=True)
+
+
+def test_rejects_displacement_below_one():
+    with pytest.raises(ValueError):
+        components_panel(*[numpy.ones((60, 2))] * 3, displacement=0)
@@ -0,0 +1,17 @@
+import importlib.util
+import os
+
+_SCRIPTS_PATH = os.path.sep.join([os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scripts'])
+
+
+def load_script(name):
+    spec = importlib.util.spec_from_file_location(name.replace('-', '_'),
+                                                  os.path.sep.join([_SCRIPTS_PATH, name + '.py']))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_float_ticks_match_decimal():
+    # generated bars and target / stop backtest results of both price modes, sample by sample
+    assert load_script('compare-price-modes').compare(10, 30, 0) == 0
@@ -0,0 +1,17 @@
+import numpy
+
+from resample import Resampler
+
+
+def test_empty_updates_keep_dtypes():
+    timestamps = numpy.datetime64('2010-01-04T09:30') + numpy.arange(5) * numpy.timedelta64(20, 's')
+    resampler = Resampler(interval=numpy.timedelta64(1, 'm'))
+    completed = resampler.update(numpy.arange(5.), timestamps=timestamps)
+    empty = resampler.update(numpy.zeros(0), timestamps=timestamps[:0])
+    flushed = resampler.flush()
+    assert len(completed['open']) == 1 and len(flushed['open']) == 1 and not len(empty['open'])
+    for name, values in completed.items():
+        assert empty[name].dtype == values.dtype == flushed[name].dtype, name
+
+    assert not len(resampler.flush()['timestamp'])
+    assert resampler.flush()['timestamp'].dtype == completed['timestamp'].dtype
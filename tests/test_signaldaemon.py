@@ -0,0 +1,94 @@
+import asyncio
+import time
+
+import numpy
+import pytest
+
+from benchmarkstore import BenchmarkStoreWriter
+from signaldaemon import SignalDaemon, replay_store, ticks_from_lines
+
+_GAP = 0.3
+
+
+async def lines_with_gaps(arrivals, terminate=False):
+    """
+    Two ticks of two symbols, the second one arriving _GAP seconds after the first.
+    """
+    for minute in ('09:01', '09:02'):
+        for symbol in ('AAA', 'BBB'):
+            yield '2010-01-04T%s,%s,10,11,9,10.5\n' % (minute, symbol)
+
+        if terminate:
+            yield '\n'
+
+        arrivals.append(time.perf_counter())
+        await asyncio.sleep(_GAP)
+
+
+async def collect(flush_timeout, terminate=False):
+    arrivals = list()
+    ticks = list()
+    async for tick in ticks_from_lines(lines_with_gaps(arrivals, terminate=terminate), flush_timeout=flush_timeout):
+        ticks.append((tick, time.perf_counter()))
+
+    return arrivals, ticks
+
+
+def test_timeout_flushes_pending_tick():
+    arrivals, ticks = asyncio.run(collect(0.02))
+    assert [list(tick.symbols) for tick, emitted in ticks] == [['AAA', 'BBB'], ['AAA', 'BBB']]
+    first, emitted = ticks[0]
+    # emitted shortly after its last line, not when the next timestamp shows up
+    assert emitted - arrivals[0] < _GAP / 2
+    assert first.received <= arrivals[0]
+
+
+def test_blank_line_flushes_pending_tick():
+    arrivals, ticks = asyncio.run(collect(None, terminate=True))
+    assert len(ticks) == 2
+    assert ticks[0][1] - arrivals[0] < _GAP / 2
+
+
+def test_latency_counts_waiting_for_the_tick():
+    arrivals, ticks = asyncio.run(collect(None))
+    first, emitted = ticks[0]
+    # without timeout nor terminator the first tick waits for the next timestamp, and its latency shows it
+    assert emitted - first.received >= _GAP * 0.9
+
+
+def test_daemon_reports_ticks_over_budget():
+    async def serve(flush_timeout):
+        daemon = SignalDaemon(latency_budget=_GAP / 2)
+        return await daemon.run(ticks_from_lines(lines_with_gaps(list()), flush_timeout=flush_timeout),
+                                sink=lambda events: None)
+
+    # each tick waits for the following lines, or the end of the feed, _GAP seconds later
+    assert asyncio.run(serve(None))['end_to_end']['over_budget'] == 2
+    summary = asyncio.run(serve(0.02))
+    assert summary['ticks'] == 2
+    assert summary['end_to_end']['over_budget'] == 0
+    assert summary['end_to_end']['max'] < _GAP / 2
+
+
+def test_sink_error_stops_the_daemon(tmp_path):
+    rng = numpy.random.default_rng(0)
+    with BenchmarkStoreWriter(str(tmp_path)) as writer:
+        for sample in range(4):
+            close = 100. * numpy.cumprod(1. + rng.normal(0., 2e-3, 400))
+            writer.append(numpy.column_stack((close, close + 0.05, close - 0.05, close)))
+
+    batches = list()
+
+    def failing_sink(events):
+        batches.append(events)
+        raise RuntimeError('sink failure')
+
+    async def serve():
+        # single slot queues: without the sink draining the events, the processing and the feed would block
+        daemon = SignalDaemon(queue_size=1)
+        return await asyncio.wait_for(daemon.run(replay_store(str(tmp_path), symbols=20), sink=failing_sink), 5.)
+
+    with pytest.raises(RuntimeError, match='sink failure'):
+        asyncio.run(serve())
+
+    assert len(batches) == 1
@@ -0,0 +1,19 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+_ROOT_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.mark.parametrize('module', ['statarb', 'ichimoku'])
+def test_headless_import_is_lazy(module):
+    environment = dict(os.environ)
+    environment['PYTHONPATH'] = os.pathsep.join([os.path.sep.join([_ROOT_PATH, 'src']),
+                                                 os.path.sep.join([_ROOT_PATH, 'scripts'])])
+    code = 'import sys, %s; print(" ".join(sorted(sys.modules)))' % module
+    output = subprocess.run([sys.executable, '-c', code], env=environment, stdout=subprocess.PIPE, check=True)
+    imported = set(output.stdout.decode().split())
+    for heavy in ('pandas', 'matplotlib'):
+        assert heavy not in imported, '%s imports %s' % (module, heavy)
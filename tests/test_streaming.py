@@ -0,0 +1,67 @@
+import numpy
+import pandas
+import pytest
+
+import ichimoku
+from ichimoku.streaming import IchimokuState, RollingExtremum
+
+_COLUMNS = ['tenkan-sen', 'kijun-sen', 'senkou-span-a', 'senkou-span-b']
+
+
+def random_ohlc(count, seed, leading_nan=0):
+    rng = numpy.random.default_rng(seed)
+    close = 100. + numpy.cumsum(rng.normal(0., 1., count))
+    spread = rng.uniform(0., 2., size=(2, count))
+    ohlc = numpy.column_stack((close, close + spread[0], close - spread[1], close))
+    ohlc[:leading_nan] = numpy.nan
+    index = pandas.date_range('2010-01-01 09:01', periods=count, freq='min')
+    return pandas.DataFrame(ohlc, index=index, columns=['open', 'high', 'low', 'close'])
+
+
+def streamed(ohlc_df, **periods):
+    state = IchimokuState(**periods)
+    return numpy.array([state.update(*row) for row in ohlc_df[['open', 'high', 'low', 'close']].values])
+
+
+@pytest.mark.parametrize('count', [2, 8, 30, 51, 52, 53, 300])
+@pytest.mark.parametrize('leading_nan', [0, 5])
+def test_matches_components(count, leading_nan):
+    ohlc_df = random_ohlc(count, seed=count, leading_nan=min(leading_nan, count))
+    expected = ichimoku.components(ohlc_df).iloc[:count]
+    values = streamed(ohlc_df)
+    numpy.testing.assert_allclose(values[:, :4], expected[_COLUMNS].values, equal_nan=True)
+    # the streamed chikou of a bar is the offline chikou displacement bars back
+    chikou = numpy.full(count, numpy.nan)
+    chikou[26:] = expected['chikou'].values[:count - 26]
+    numpy.testing.assert_allclose(values[:, 4], chikou, equal_nan=True)
+
+
+def test_matches_components_custom_periods():
+    ohlc_df = random_ohlc(200, seed=7)
+    periods = {'tenkan': 5, 'kijun': 13, 'senkou': 40, 'displacement': 11}
+    expected = ichimoku.components(ohlc_df, **periods).iloc[:200]
+    numpy.testing.assert_allclose(streamed(ohlc_df, **periods)[:, :4], expected[_COLUMNS].values, equal_nan=True)
+
+
+def test_warm_up_is_nan():
+    values = streamed(random_ohlc(51, seed=1))
+    assert numpy.isnan(values[:8, 0]).all() and not numpy.isnan(values[8:, 0]).any()
+    assert numpy.isnan(values[:25, 1]).all() and not numpy.isnan(values[25:, 1]).any()
+    assert numpy.isnan(values[:, 3]).all()
+
+
+def test_nan_inside_the_window():
+    ohlc_df = random_ohlc(300, seed=3)
+    for row in (60, 61, 140, 200):
+        ohlc_df.iloc[row] = numpy.nan
+
+    expected = ichimoku.components(ohlc_df).iloc[:300]
+    numpy.testing.assert_allclose(streamed(ohlc_df)[:, :4], expected[_COLUMNS].values, equal_nan=True)
+
+
+def test_rolling_extremum_nan():
+    maximum = RollingExtremum(3)
+    values = [maximum.update(value) for value in [5., numpy.nan, 3., 1., 2., 0.]]
+    assert values[:2] == [None, None]
+    assert numpy.isnan(values[2]) and numpy.isnan(values[3])
+    assert values[4:] == [3., 2.]
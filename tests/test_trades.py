@@ -0,0 +1,39 @@
+import numpy
+import pytest
+
+import ichimoku
+from ichimoku.trades import trade_spans
+from test_panel import random_ohlc
+
+INDEX = numpy.arange(100, 106)
+
+
+@pytest.mark.parametrize('signal, expected_trades, expected_open', [
+    ([1, 1, 0, 0, 1, 0], [[100, 101], [104, 104]], [False, False]),
+    ([0, 0, 1, 0, 1, 1], [[102, 102], [104, 105]], [False, True]),
+    ([1, 1, 1, 1, 1, 1], [[100, 105]], [True]),
+    ([0, 0, 0, 0, 0, 1], [[105, 105]], [True]),
+])
+def test_regimes_at_the_edges(signal, expected_trades, expected_open):
+    trades, is_open = trade_spans(signal, INDEX)
+    numpy.testing.assert_array_equal(trades, expected_trades)
+    numpy.testing.assert_array_equal(is_open, expected_open)
+
+
+def test_no_regime():
+    trades, is_open = trade_spans(numpy.zeros(6, dtype=bool), INDEX)
+    assert trades.shape == (0, 2)
+    assert not len(is_open)
+
+
+def test_rules_1_trades_match_masks():
+    ohlc_df = random_ohlc(400, 5)
+    long_trades, short_trades, long_open, short_open = ichimoku.long_short_rules_1(ohlc_df)
+    bullish, bearish = ichimoku.rules_1_masks(ohlc_df['high'].values, ohlc_df['low'].values, ohlc_df['close'].values)
+    for mask, trades, is_open in ((bullish, long_trades, long_open), (bearish, short_trades, short_open)):
+        held = numpy.zeros(len(mask), dtype=bool)
+        for entry, exit in ohlc_df.index.get_indexer(trades.ravel()).reshape(-1, 2):
+            held[entry:exit + 1] = True
+
+        numpy.testing.assert_array_equal(held, mask)
+        assert is_open.tolist() == [exit == ohlc_df.index[-1] for exit in trades[:, 1]]
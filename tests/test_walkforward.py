@@ -0,0 +1,37 @@
+import numpy
+import pandas
+
+from ichimoku import parameter_grid
+from ichimoku.walkforward import TEST_START, fold_bounds, walk_forward
+
+_PARAMETERS = ['tenkan', 'kijun', 'senkou', 'displacement']
+
+
+def random_ohlc(count, seed=0):
+    rng = numpy.random.default_rng(seed)
+    close = 100. * numpy.cumprod(1. + rng.normal(0., 1e-3, count))
+    index = pandas.date_range('2010-01-01 09:01', periods=count, freq='min')
+    return pandas.DataFrame({'high': close + 0.05, 'low': close - 0.05, 'close': close}, index=index)
+
+
+def test_test_prices_do_not_leak_into_selection():
+    ohlc = random_ohlc(6000)
+    grid = parameter_grid(tenkan=(5, 9), kijun=(20, 26), senkou=(40, 52), displacement=(20, 26))
+    report, equity = walk_forward(ohlc, grid, train=2000, test=500)
+    for fold, test_start in enumerate(fold_bounds(len(ohlc), 2000, 500)[:, TEST_START].tolist()):
+        # the first test bar of the fold jumps far away from the last train bar
+        shocked = ohlc.copy()
+        shocked.iloc[test_start, shocked.columns.get_loc('close')] *= 1.5
+        shocked_report, shocked_equity = walk_forward(shocked, grid, train=2000, test=500)
+        assert shocked_report[_PARAMETERS].iloc[fold].tolist() == report[_PARAMETERS].iloc[fold].tolist()
+        assert shocked_report['train_score'].iloc[fold] == report['train_score'].iloc[fold]
+
+
+def test_workers_agree():
+    ohlc = random_ohlc(4000, seed=1)
+    grid = parameter_grid(tenkan=(7, 9), kijun=(22, 26), senkou=(52,), displacement=(26,))
+    report, equity = walk_forward(ohlc, grid, train=1500, test=500)
+    parallel_report, parallel_equity = walk_forward(ohlc, grid, train=1500, test=500, workers=2)
+    pandas.testing.assert_frame_equal(report, parallel_report)
+    pandas.testing.assert_series_equal(equity, parallel_equity)
+    numpy.testing.assert_allclose(equity.iloc[-1], report['test_score'].sum())